@@ -0,0 +1,319 @@
+import numpy as np
+import json
+import os
+import sys
+import threading
+import time
+
+# DATA_STORE: This class keeps the labelled data received from the devices (G, P, A, output) in binary form, replacing
+# the csv files in ML/data. The data is a list of segments - .npy files of n x 4 float64 rows, in a directory with a
+# manifest listing them. Segments are only ever added, never changed, and they are read through memory mapping, so
+# opening a year of data takes milliseconds instead of parsing text. The statistics the models are trained from are
+# worked out once per segment, when it is added, and kept in the manifest (see statistics). It has 7 functions:
+
+#   - __init__(self, directory): (public) Constructor.
+#   - append(self, rows, name): (public) Adds a segment holding rows (n x 4), labelled name (e.g. the file name given
+#                               by the device).
+#   - segments(self): (public) Returns the segments as read-only memory mapped arrays.
+#   - read(self): (public) Returns all the rows in one array.
+#   - names(self): (public) Returns the names of the segments.
+#   - statistics(self, decay, pending): (public) Returns the moments of the readings of all the segments (and of pending
+#                                       readings not added yet), split into training and testing readings.
+#   - import_csv(self, directory): (public) Adds the csv files of the directory (see ML/data) which have not been
+#                                  imported yet, one segment per file.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - The manifest (MANIFEST) has one line of JSON per segment: its file, number of rows, name and time added. A
+#          segment is written (under a temporary name, then renamed) before its line is added to the manifest, and
+#          the line is written in one append, so readers only ever see complete segments - also when several server
+#          processes share the directory.
+#
+#        - The columns are in the same order as in the csv files: G, P, A, output.
+#
+#        - Each line of the manifest also holds the moments (see the moments class below) of the distinct readings of
+#          its segment, for the training and the testing readings separately. The moments are of FEATURES columns: G, P,
+#          A, output and x = G*(P/100000)*A (the product linear regression is fitted on). One reading in TEST_FRACTION,
+#          chosen by a hash of the reading (so always the same ones), is a testing reading.
+#
+#        - What has been read of a manifest, and the moments of all its segments added together, are shared by all the
+#          data_store objects of the process: statistics() only reads the lines added since it was last called, so its
+#          cost does not grow with the data. Segments added before the moments were kept in the manifest are read (once
+#          per process) to work them out.
+#
+#        - Duplicate readings are only removed within a segment (and within the pending readings): a reading received
+#          again in a later segment counts again.
+#
+#        - To move the existing data over, run once from the Remote directory: python ML/data_store.py import
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class data_store:
+
+    MANIFEST = 'manifest.jsonl'
+    COLUMNS = 4
+    FEATURES = 5
+    TEST_FRACTION = 5
+
+    # segments added by this process, for unique file names.
+    __counter = 0
+    __counter_lock = threading.Lock()
+
+    # what has been read of the manifest in each directory, for the whole process: directory -> {'identity' of the file,
+    # 'offset' read up to, 'entries', 'totals' - moments (training, testing) of all the segments for each decay}.
+    __manifests = {}
+    __manifests_lock = threading.Lock()
+
+    # CONSTRUCTOR: directory is where the segments and the manifest are kept. It is created when the first segment is
+    # added.
+    def __init__(self, directory='ML/store'):
+        self.directory = directory
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # APPEND: Adds a segment holding rows (n x 4: G, P, A, output) under the given name. Nothing is added for no rows.
+    def append(self, rows, name=''):
+        rows = np.asarray(rows, dtype = '<f8').reshape(-1, self.COLUMNS)
+        if len(rows) == 0:
+            return
+        os.makedirs(self.directory, exist_ok = True)
+
+        with data_store.__counter_lock:
+            data_store.__counter += 1
+            filename = 'segment_%d_%d_%d.npy' % (time.time_ns(), os.getpid(), data_store.__counter)
+
+        path = os.path.join(self.directory, filename)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, rows)
+        os.replace(path + '.tmp', path)
+
+        train, test = segment_statistics(rows)
+        line = json.dumps({'file': filename, 'rows': len(rows), 'name': str(name), 'time': time.time(),
+                           'train': train.to_json(), 'test': test.to_json()}) + '\n'
+        with open(os.path.join(self.directory, self.MANIFEST), 'a') as f:
+            f.write(line)
+
+    # SEGMENTS: Returns the segments, in the order they were added, as read-only memory mapped arrays (n x 4).
+    def segments(self):
+        return [np.load(os.path.join(self.directory, entry['file']), mmap_mode = 'r') for entry in self.__entries()]
+
+    # READ: Returns the rows of all the segments in one array (n x 4).
+    def read(self):
+        return np.concatenate([np.empty(shape = (0, self.COLUMNS))] + self.segments(), axis = 0)
+
+    # NAMES: Returns the names of the segments, in the order they were added.
+    def names(self):
+        return [entry['name'] for entry in self.__entries()]
+
+    def __len__(self):
+        return sum(entry['rows'] for entry in self.__entries())
+
+    # STATISTICS: Returns the moments of the readings of all the segments, as a tuple (training, testing), with pending
+    # readings (n x 4, e.g. received but not added yet) added after the segments. With a decay below 1, every reading
+    # makes the ones before it count decay times less - at the granularity of segments: all the readings of a segment
+    # count as much as each other, decay**(number of distinct readings after the segment) as much as the newest ones.
+    def statistics(self, decay=1.0, pending=None):
+        with data_store.__manifests_lock:
+            totals = self.__manifest(decay)['totals'][decay]
+        if pending is not None and len(pending):
+            totals = combined(totals, segment_statistics(pending), decay)
+        return totals
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # IMPORT_CSV: Adds each csv file in directory (as written by np.savetxt, with a '#' header) as a segment named after
+    # the file, unless a segment of that name has already been imported. Returns the number of files imported.
+    def import_csv(self, directory='ML/data'):
+        imported = set(self.names())
+        count = 0
+        for file in sorted(os.listdir(directory)):
+            name = 'csv:' + str(file)
+            if name in imported:
+                continue
+            self.append(np.genfromtxt(os.path.join(directory, file), delimiter = ','), name)
+            count += 1
+        return count
+
+    # Returns the entries of the manifest (none if there is no manifest yet).
+    def __entries(self):
+        with data_store.__manifests_lock:
+            return list(self.__manifest()['entries'])
+
+    # Reads the lines added to the manifest since it was last read, and adds their segments to the totals. Starts again
+    # from the beginning if the manifest has been replaced, or for a decay not worked out yet. Returns what has been read
+    # of the manifest (see __manifests). Called with __manifests_lock held.
+    def __manifest(self, decay=1.0):
+        path = os.path.join(self.directory, self.MANIFEST)
+        key = os.path.abspath(self.directory)
+        manifest = data_store.__manifests.get(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            f = None
+        status = os.fstat(f.fileno()) if f is not None else None
+        identity = (status.st_dev, status.st_ino) if f is not None else None
+
+        if manifest is None or manifest['identity'] != identity or decay not in manifest['totals'] or \
+                (status is not None and status.st_size < manifest['offset']):
+            decays = set(manifest['totals']) if manifest is not None else set()
+            decays.add(decay)
+            manifest = {'identity': identity, 'offset': 0, 'entries': [],
+                        'totals': {d: (moments(self.FEATURES), moments(self.FEATURES)) for d in decays}}
+            data_store.__manifests[key] = manifest
+        if f is None:
+            return manifest
+
+        with f:
+            f.seek(manifest['offset'])
+            data = f.read()
+        # a line being written by another process is not complete yet.
+        data = data[:data.rfind(b'\n') + 1]
+        manifest['offset'] += len(data)
+
+        for line in data.splitlines():
+            entry = json.loads(line)
+            if 'train' in entry:
+                statistics = (moments.from_json(entry.pop('train')), moments.from_json(entry.pop('test')))
+            else:
+                # added before the moments were kept in the manifest.
+                statistics = segment_statistics(np.load(os.path.join(self.directory, entry['file']), mmap_mode = 'r'))
+            manifest['entries'].append(entry)
+            for d, totals in manifest['totals'].items():
+                manifest['totals'][d] = combined(totals, statistics, d)
+        return manifest
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# MOMENTS: the weighted sums kept for a set of readings - number of readings (count), their total weight, weighted
+# means of the columns, weighted sums of the products of the deviations of the columns from their means, and smallest and
+# largest value of each column. Only add() changes an object, the other functions return new ones.
+class moments:
+
+    def __init__(self, columns):
+        self.count = 0
+        self.weight = 0.0
+        self.mean = np.zeros(columns)
+        self.comoments = np.zeros((columns, columns))
+        self.minimum = np.full(columns, np.inf)
+        self.maximum = np.full(columns, -np.inf)
+
+    # ADD: adds readings (one row each, weight 1), combining their sums with the ones so far (Chan et al.).
+    def add(self, rows):
+        if len(rows) == 0:
+            return
+        mean = np.mean(rows, axis = 0)
+        deviations = rows - mean
+        self.__combine(len(rows), len(rows), mean, deviations.T @ deviations)
+        self.minimum = np.minimum(self.minimum, np.min(rows, axis = 0))
+        self.maximum = np.maximum(self.maximum, np.max(rows, axis = 0))
+
+    # DECAYED: returns these moments with the weight of every reading multiplied by factor.
+    def decayed(self, factor):
+        result = self.select(slice(None))
+        result.weight *= factor
+        result.comoments = result.comoments*factor
+        return result
+
+    # MERGED: returns the moments of these readings and other's together.
+    def merged(self, other):
+        result = moments(len(self.mean))
+        for part in (self, other):
+            result.__combine(part.count, part.weight, part.mean, part.comoments)
+        result.minimum = np.minimum(self.minimum, other.minimum)
+        result.maximum = np.maximum(self.maximum, other.maximum)
+        return result
+
+    # SELECT: returns the moments of the given columns only (a list of indices), in that order.
+    def select(self, columns):
+        result = moments(len(self.mean[columns]))
+        result.count, result.weight = self.count, self.weight
+        result.mean = self.mean[columns].copy()
+        result.comoments = self.comoments[columns][:, columns].copy()
+        result.minimum, result.maximum = self.minimum[columns].copy(), self.maximum[columns].copy()
+        return result
+
+    # TO_JSON / FROM_JSON: the moments as a dictionary of plain numbers and lists, and back.
+    def to_json(self):
+        return {'count': int(self.count), 'weight': float(self.weight), 'mean': self.mean.tolist(),
+                'comoments': self.comoments.tolist(), 'minimum': self.minimum.tolist(), 'maximum': self.maximum.tolist()}
+
+    @staticmethod
+    def from_json(values):
+        result = moments(len(values['mean']))
+        result.count, result.weight = values['count'], values['weight']
+        result.mean = np.array(values['mean'], dtype = float)
+        result.comoments = np.array(values['comoments'], dtype = float).reshape(len(result.mean), len(result.mean))
+        result.minimum = np.array(values['minimum'], dtype = float)
+        result.maximum = np.array(values['maximum'], dtype = float)
+        return result
+
+    def __combine(self, count, weight, mean, comoments):
+        if weight == 0:
+            self.count += count
+            return
+        total = self.weight + weight
+        delta = mean - self.mean
+        self.comoments = self.comoments + comoments + np.outer(delta, delta)*self.weight*weight/total
+        self.mean = self.mean + delta*weight/total
+        self.weight = total
+        self.count += count
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# SCALED_PRODUCT: Returns x = P*A*G, scaled down by 100000 (P*A*G is very large).
+def scaled_product(G, P, A):
+    SCALING_FACTOR = 100000
+    return G*(P/SCALING_FACTOR)*A
+
+# HELD_OUT: Returns which of the readings (n x 4) are testing readings - one in TEST_FRACTION, chosen by a hash of the
+# bits of the reading, so a reading is always on the same side.
+def held_out(rows):
+    bits = np.ascontiguousarray(rows, dtype = '<f8').view('<u8').reshape(-1, data_store.COLUMNS)
+    hashes = np.zeros(len(bits), dtype = np.uint64)
+    for column in bits.T:
+        hashes = (hashes ^ column)*np.uint64(0x9E3779B97F4A7C15)
+        hashes ^= hashes >> np.uint64(29)
+    return hashes % np.uint64(data_store.TEST_FRACTION) == 0
+
+# SEGMENT_STATISTICS: Returns the moments (training, testing) of the FEATURES columns of the distinct readings (n x 4).
+def segment_statistics(rows):
+    rows = np.unique(np.asarray(rows, dtype = float).reshape(-1, data_store.COLUMNS), axis = 0)
+    features = np.column_stack((rows, scaled_product(rows[:, 0], rows[:, 1], rows[:, 2])))
+    test = held_out(rows)
+    train_moments, test_moments = moments(data_store.FEATURES), moments(data_store.FEATURES)
+    train_moments.add(features[~test])
+    test_moments.add(features[test])
+    return train_moments, test_moments
+
+# COMBINED: Returns the moments (training, testing) of the readings of old followed by those of new, with every reading of
+# new making the ones of old count decay times less.
+def combined(old, new, decay=1.0):
+    factor = decay**(new[0].count + new[1].count)
+    return tuple(before.decayed(factor).merged(after) for before, after in zip(old, new))
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# Command line interface, from the Remote directory:
+#       python ML/data_store.py import [CSV DIRECTORY]      imports the csv files (default: ML/data) into ML/store.
+#       python ML/data_store.py info                        prints the segments of ML/store.
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'info'):
+        print("usage: python ML/data_store.py import [CSV DIRECTORY] | info")
+        sys.exit(1)
+
+    store = data_store()
+    if sys.argv[1] == 'import':
+        start_time = time.perf_counter()
+        count = store.import_csv(sys.argv[2] if len(sys.argv) > 2 else 'ML/data')
+        print(str(count) + " files imported in " + str(round(time.perf_counter() - start_time, 2)) + " s")
+
+    for name, segment in zip(store.names(), store.segments()):
+        print(name.ljust(40) + str(len(segment)) + " rows")
+    print("total: " + str(len(store)) + " rows")
+    sys.exit(0)
@@ -1,136 +1,107 @@
-from sklearn import linear_model
-from sklearn.metrics import r2_score
-from sklearn.preprocessing import StandardScaler
+from ML.data_store import data_store
 
-import pandas as pd
-import os
+import numpy as np
 
 from math import sqrt
 
 # MR_predictor: This class is used to predict the required gas aperture size using multiple regression with
 # the relevant variables i.e. supply pressure (P), air aperture (A) and expected output (output). It essentially finds
 # the best coefficients (which may be positive or negative) for a*P + b*A + c*output predicting G (gas aperture size).
-# It has three functions:
-#       -  __init__(self): (public, line) CONSTRUCTOR.
-#       -  use_mr(self): (public, line 30) indicates to main program if we can use linear regression or not
+# It has five functions:
+#       -  __init__(self, half_life): (public, line 44) CONSTRUCTOR.
+#       -  use_mr(self): (public, line 63) indicates to main program if we can use linear regression or not
 #          (based on availability of data).
-#       -  collect_data(self): (public, line 45) Collects and prepares data for multiple regression.
-#       -  train_and_test(self): (public, line 85): generates multiple regression model, tests it for accuracy.
+#       -  train_and_test(self, pending): (public, line 73): generates multiple regression model, tests it for accuracy.
 #       -  predict(self, P, A, output): called by main program to perform prediction.
+#       -  parameters(self): returns the parameters of the model, so that the local device can make predictions itself.
 
 #---------------------------------------------------------------------------------------------------
 
-# NOTES:   - We use pandas because we want to deal with separate columns of data here.
-#          - We will only return valid values in tuple if the r score is higher than set thresholds.
+# NOTES:   - We will only return valid values in tuple if the r score is higher than set thresholds.
 #          - This module offers more sophisticated and accurate prediction than the LR module.
+#          - The model is the authority for the predictions: the local device only evaluates copies of its parameters.
+#            The version number goes up every time the model is trained, so copies can be told apart.
+#          - Rather than reading all the data again for every training, the model is solved from the weighted means and
+#            the sums of products of deviations from the means (the normal equations, centred) of the distinct readings,
+#            which the data store (ML/data_store.py) keeps for its segments and adds up for the whole server. Training
+#            solves a 3x3 system however much data there is. The scaler (means and variances) is the same as a
+#            StandardScaler fitted on all the readings, and the coefficients the same as a LinearRegression fitted on the
+#            training readings (up to rounding). Duplicate readings are removed within each segment.
+#          - One reading in data_store.TEST_FRACTION (chosen from a hash of the reading, so always the same ones) is held
+#            out for testing, and the R² of the model on them is also worked out from their sums.
+#          - With a half_life, every reading received makes the older ones count a little less: a reading counts half
+#            as much half_life readings later. The model then follows a burner whose behaviour drifts over months. The
+#            readings of a segment of the data store all count the same (see data_store.statistics).
 
 #---------------------------------------------------------------------------------------------------
 
 class MR_predictor:
 
-    # CONSTRUCTOR: we initialise two objects needed for data scaling and multiple regression - both included in sklearn module.
-    def __init__(self):
-        # Used to perform data scaling through standardisation method.
-        self.__scale = StandardScaler()
-        # Used to perform actual multiple regression prediction.
-        self.__regr = linear_model.LinearRegression()
+    # R² the model must reach on the testing readings.
+    MIN_R2 = 0.75
+
+    # CONSTRUCTOR: half_life is the number of readings after which a reading counts half as much (None for no decay).
+    def __init__(self, half_life=None):
+        self.__decay = 0.5**(1/half_life) if half_life else 1.0
+
+        # Parameters of the model: means and variances of P, A and output (the scaler), and coefficients and intercept
+        # of the regression on the scaled data.
+        self.__mean = np.zeros(3)
+        self.__var = np.ones(3)
+        self.__coef = np.zeros(3)
+        self.__intercept = 0.0
         # This variable is set to true if the model passes all prediction tests and can make good predictions.
         # False if not.
         self.__model_available = None
+        # Number of times the model has been trained.
+        self.__version = 0
 
     #------------------------------------------------------------------------------------------------
 
     # USE_LR: This simple function indicates to the main program whether data is available to do
     # multiple regression or not.
     def use_mr(self):
-        # check if directory is empty
-        if len(os.listdir('ML/data')) == 0:
+        # check if the data store is empty
+        if len(data_store()) == 0:
             return False
         # if not return true.
         return True
 
     #------------------------------------------------------------------------------------------------
-
-    # COLLECT_DATA: This function iterates through csv files in the data subdirectory and puts all
-    # the data together into a single pandas data frame. It then removes duplicate rows, scales the
-    # data according to standardisation method and returns the data frames as output.
-    def collect_data(self):
-        # Define pandas data frame that will accumulate data from csv files.
-        accum_df = pd.DataFrame(columns=['# G', 'P', 'A', 'output'])
-
-        # Iterate over files in data directory
-        for file in os.listdir('ML/data'):
-
-            # receive data from a csv file into a 4-column padas dataframe.
-            filename = 'ML/data/' + str(file)
-            new_df = pd.read_csv(filename)
-
-            # concatenate data frame to accumulator data frame defined above
-            frames = [accum_df, new_df]
-            accum_df = pd.concat(frames, sort = False)
-
-        # remove duplicate rows
-        accum_df = pd.DataFrame.drop_duplicates(accum_df)
-
-        # sort out indices in data frame
-        accum_df.reset_index(drop=True, inplace=True)
-
-        # Data scaling of X data.
-        x_data = accum_df[['P', 'A', 'output']]
-        #------------------------OUTPUT STATEMENTS--------------------#
-        #print("X DATA: ")
-        #print(x_data)
-        #print()
-        #--------------------------------------------------------------#
-        scaled_x_data = self.__scale.fit_transform(x_data)
-        #------------------------OUTPUT STATEMENTS--------------------#
-        #print("MEAN")
-        #print(self.__scale.mean_)
-        #print("VARIANCE")
-        #print(self.__scale.var_)
-        #print("SCALED DATA")
-        #print(scaled_x_data)
-        #print()
-        #--------------------------------------------------------------#
-
-        # the y_data dataframe stores data that will need to be predicted.
-        y_data = accum_df['# G']
-
-        # return scaled_x_data, y_data by reference
-        return scaled_x_data, y_data
-
-    #------------------------------------------------------------------------------------------------
-    # TRAIN_AND_TEST: Split data into training and testing, develop model with training data and then
-    # test it.
-    def train_and_test(self):
-        # Get the data
-        x_data, y_data = self.collect_data()
-
-        # 80% of data is for training, 20% is for testing.
-        train_x = x_data[:80]
-        train_y = y_data[:80]
-
-        test_x = x_data[80:]
-        test_y = y_data[80:]
-
-        # Fit training data to multiple regression model.
-        self.__regr.fit(train_x, train_y)
-        #------------------------OUTPUT STATEMENTS--------------------#
-        #print("COEFFS:")
-        #print(self.__regr.coef_)
-        #print()
-        #-------------------------------------------------------------#
+    # TRAIN_AND_TEST: Solve for the coefficients on the training readings, then test the model on the
+    # held out readings. pending are readings (n x 4: G, P, A, output) received but not added to the data store yet.
+    def train_and_test(self, pending=None):
+        # sums of the readings in the order P, A, output, G.
+        train, test = (part.select([1, 2, 3, 0]) for part in data_store().statistics(self.__decay, pending))
+
+        # The scaler is fitted on all the readings, the regression on the training readings.
+        everything = train.merged(test)
+        if everything.count == 0:
+            raise ValueError("No data to train multiple regression on.")
+        self.__mean = everything.mean[:3].copy()
+        self.__var = everything.comoments.diagonal()[:3]/everything.weight
+        # like StandardScaler, features which do not vary are not scaled.
+        self.__var = np.where(self.__var == 0, 1.0, self.__var)
+
+        # Least squares on the training readings (minimum norm if the features are not independent): b = Cxx⁻¹ Cxy on
+        # the unscaled features, so the coefficient of a scaled feature is b times its standard deviation.
+        C = train.comoments
+        b = np.linalg.lstsq(C[:3, :3], C[:3, 3], rcond = None)[0] if train.count else np.zeros(3)
+        self.__coef = b*np.sqrt(self.__var)
+        self.__intercept = float(train.mean[3] - b @ (train.mean[:3] - self.__mean)) if train.count else 0.0
+        self.__version += 1
 
         # We can only test the data for correctness if we have enough of it.
         # This is expected to be the case most of the time.
-        if len(test_x) > 2:
-            # Now make predictions on test x data so that we can test.
-            test_prediction = self.__regr.predict(test_x)
-
-            # Compare prediction with the actual values to see how good the model is.
-            r2score = r2_score(test_y, test_prediction)
-
-            if r2score > 0.75:
+        if test.count > 2:
+            # Compare predictions with the actual values to see how good the model is, from the sums of the
+            # testing readings: the residual sum of squares and the total sum of squares around their mean.
+            T = test.comoments
+            offset = test.mean[3] - (self.__intercept + b @ (test.mean[:3] - self.__mean))
+            residual = T[3, 3] - 2*b @ T[:3, 3] + b @ T[:3, :3] @ b + test.weight*offset**2
+            r2score = 1 - residual/T[3, 3] if T[3, 3] > 0 else 0.0
+
+            if r2score > self.MIN_R2:
                 self.__model_available = True
             else:
                 self.__model_available = False
@@ -147,13 +118,31 @@ class MR_predictor:
             self.train_and_test()
 
         if self.__model_available == True:
-            scaled_P = (P - self.__scale.mean_[0])/sqrt(self.__scale.var_[0])
-            scaled_A = (A - self.__scale.mean_[1])/sqrt(self.__scale.var_[1])
-            scaled_output = (output - self.__scale.mean_[2])/sqrt(self.__scale.var_[2])
-            data = [[scaled_P, scaled_A, scaled_output]]
-
-            # NOTE: Prediction is a 1 dimensional numpy array.
-            prediction = self.__regr.predict(data)
-            return prediction[0]
+            prediction = self.__intercept
+            for value, mean, var, coef in zip((P, A, output), self.__mean, self.__var, self.__coef):
+                prediction += coef*((value - mean)/sqrt(var))
+            return prediction
         else:
             return 0.0
+
+    #------------------------------------------------------------------------------------------------
+    # PARAMETERS: Returns the parameters of the model as a dictionary of plain numbers/lists (so that it can be sent as
+    # JSON): the version of the model, whether it can be used, the means and variances of the scaler (P, A, output),
+    # and the coefficients and intercept of the regression on the scaled data. predict() gives
+    # intercept + sum(coef[i]*(x[i] - mean[i])/sqrt(var[i])).
+    def parameters(self):
+
+        if self.__model_available is None:
+            self.train_and_test()
+
+        return {
+                    'version': self.__version,
+                    'available': bool(self.__model_available),
+                    'mean': [float(value) for value in self.__mean],
+                    'var': [float(value) for value in self.__var],
+                    'coef': [float(value) for value in self.__coef],
+                    'intercept': float(self.__intercept)
+        }
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
@@ -0,0 +1,66 @@
+import numpy as np
+
+# DATA_BUFFER: This class holds the readings received by the server in a preallocated numpy array, which grows by
+# doubling its capacity when it is full. Appending a reading (or a batch of them) is therefore O(1) per reading on
+# average, instead of copying everything received so far for every reading. It has 6 functions:
+
+#   - __init__(self, columns, capacity): (public) Constructor.
+#   - append(self, row): (public) Adds one row.
+#   - extend(self, rows): (public) Adds several rows (a 2-dimensional array) at once.
+#   - data(self): (public) Returns the rows added so far.
+#   - nbytes(self): (public) Memory used by the array, in bytes.
+#   - __len__(self): (public) Number of rows added so far.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - The array is at most twice as large as the rows held in it (plus the initial capacity), and it only ever
+#          grows - a day of readings from one device is a few MB.
+#
+#        - data() returns a view of the array, without copying it. The view should not be kept after more rows have
+#          been added (the array may have been replaced by a larger one).
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class data_buffer:
+
+    def __init__(self, columns=4, capacity=1024):
+        self.__array = np.empty(shape = (capacity, columns))
+        self.__size = 0
+
+    # APPEND: Adds one row (a sequence of one value per column).
+    def append(self, row):
+        if self.__size == len(self.__array):
+            self.__grow(self.__size + 1)
+        self.__array[self.__size] = row
+        self.__size += 1
+
+    # EXTEND: Adds the rows of a 2-dimensional array (one column per column of the buffer).
+    def extend(self, rows):
+        size = self.__size + len(rows)
+        if size > len(self.__array):
+            self.__grow(size)
+        self.__array[self.__size:size] = rows
+        self.__size = size
+
+    # DATA: Returns the rows added so far (a view of the array).
+    def data(self):
+        return self.__array[:self.__size]
+
+    # NBYTES: Returns the memory used by the array (its capacity, not only the rows added so far), in bytes.
+    def nbytes(self):
+        return self.__array.nbytes
+
+    def __len__(self):
+        return self.__size
+
+    # Replaces the array with one of at least the required number of rows, doubling its capacity.
+    def __grow(self, required):
+        capacity = max(1, len(self.__array))
+        while capacity < required:
+            capacity *= 2
+        array = np.empty(shape = (capacity, self.__array.shape[1]))
+        array[:self.__size] = self.__array[:self.__size]
+        self.__array = array
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
@@ -2,8 +2,13 @@ from flask import Flask, request, jsonify
 from flask_restful import Api
 from ML.multiple_regression import MR_predictor
 from ML.linear_regression import LR_predictor
+from ML.data_store import data_store
+from data_buffer import data_buffer
+from session_store import session_store
 
 import numpy as np
+import re
+import threading
 
 # This module serves as an external interface for the machine learning modules to communicate with the edge device.
 # The main program on the edge device can train the ML modules remotely and provide data to receive the precdictions
@@ -11,6 +16,10 @@ import numpy as np
 
 # This interface uses high level HTTP implemented with the help of flask.
 
+# Each device has its own session on the server (its own datastore and models), chosen by the
+# device ID it sends in the X-Device-ID header. Devices which do not send one share the session
+# of DEFAULT_DEVICE. See session_store.py for how idle sessions are evicted.
+
 app = Flask(__name__)
 api = Api(app)
 
@@ -18,14 +27,29 @@ api = Api(app)
 # First we define a class to perform the basic ML related and file writing functions
 class external_interface:
 
-    # Constructor initialises class variables and sets up csv files
+    # Number of readings after which a reading counts half as much in multiple regression, so
+    # that the model follows a burner which drifts (None to weigh all the readings the same).
+    MR_HALF_LIFE = None
+
+    # Constructor initialises class variables and the data buffer
     def __init__(self):
         # Create object of linear regression predictor class.
         self.__lr_p = LR_predictor()
         # Create object of multiple regression predictor class.
-        self.__mr_p = MR_predictor()
-        # Create numpy array to store new data (1 row, 4 columns).
-        self.__datastore = np.empty(shape = (1,4))
+        self.__mr_p = MR_predictor(self.MR_HALF_LIFE)
+        # Create buffer to store new data (4 columns), which grows as the data arrives.
+        self.__datastore = data_buffer(4)
+        # Number of rows of the datastore already saved to the data store.
+        self.__saved = 0
+        # Held while a request of the device is handled, so that requests of the same
+        # device running in different threads do not interfere.
+        self.lock = threading.Lock()
+
+#-------------------------------------------------------------------------------
+    # Returns the memory used by the data of this session, in bytes. This is all in the data buffer: the
+    # models keep no readings of their own (their statistics are kept by the data store, for all the sessions).
+    def nbytes(self):
+        return self.__datastore.nbytes()
 
 #-------------------------------------------------------------------------------
     # This function is used to find out if it is possible to use ML (based on availability of data)
@@ -33,14 +57,17 @@ class external_interface:
         return self.__lr_p.use_lr()
 
 #-------------------------------------------------------------------------------
-    # Trains the ML models, returns coefficients of linear regression.
+    # Trains the ML models, returns coefficients of linear regression and the parameters
+    # of multiple regression (so that the edge device can evaluate it locally).
     def EI_train_models(self):
+        # Readings received but not saved to the data store yet.
+        pending = self.__datastore.data()[self.__saved:]
         # Train LR.
-        LR_m, LR_c = self.__lr_p.find_line()
+        LR_m, LR_c = self.__lr_p.find_line(pending)
         # Train MR.
-        self.__mr_p.train_and_test()
-        # Return line coefficients.
-        return {"LR_m": LR_m, "LR_c": LR_c}
+        self.__mr_p.train_and_test(pending)
+        # Return line coefficients and MR parameters.
+        return {"LR_m": LR_m, "LR_c": LR_c, "MR": self.__mr_p.parameters()}
 
 #-------------------------------------------------------------------------------
     # Make predictions using multiple regression.
@@ -51,20 +78,28 @@ class external_interface:
     # Save provided readings into local numpy array - for performance we only
     # write to the file after all the data has been sent.
     def EI_add_data(self, G, P, A, output):
-        # store new data as numpy array.
-        newdata = np.array([[G, P, A, output]])
-        self.__datastore = np.concatenate((self.__datastore, newdata), axis = 0)
+        self.__datastore.append((G, P, A, output))
+
+#-------------------------------------------------------------------------------
+    # Save a batch of readings (one array per column) into local numpy array, with
+    # a single copy for the whole batch.
+    def EI_add_batch(self, G, P, A, output):
+        self.__datastore.extend(np.column_stack((G, P, A, output)))
+
+#-------------------------------------------------------------------------------
+    # Save a batch of readings given as a 4 x n array (rows G, P, A, output, e.g. the
+    # columns of a binary batch) into local numpy array, with a single copy.
+    def EI_add_columns(self, columns):
+        self.__datastore.extend(columns.T)
 
 #-------------------------------------------------------------------------------
-    # This function is used to close the csv file when writing is complete.
+    # This function is used to save the data received when writing is complete. The rows
+    # received since the last save are added to the data store (ML/data_store.py) as a
+    # segment labelled with the given filename.
     def EI_end_of_data(self, filename='labelled_data'):
-        fname = 'ML/data/' + filename + '.csv'
-        # note that in the beginning we declared datastore as an empty matrix,
-        # so now there will be an unwanted row of zeroes at the top of our
-        # matrix. We get rid of it here.
-        self.__datastore = np.delete(self.__datastore, (0), axis=0)
-        # now save to csv file.
-        np.savetxt(fname, self.__datastore, delimiter = ',', header = 'G,P,A,output')
+        data = self.__datastore.data()
+        data_store().append(data[self.__saved:], filename)
+        self.__saved = len(data)
 
 #-------------------------------------------------------------------------------
 #-------------------------------------------------------------------------------
@@ -77,16 +112,36 @@ class external_interface:
 
 #-------------------------------------------------------------------------------
 
-# define variable to hold object of external interface class
-EX_INF = None
+# Header holding the device ID, device ID of devices which do not send one, and maximum memory
+# (in bytes) used by the data of the sessions before idle ones are evicted.
+DEVICE_HEADER = 'X-Device-ID'
+DEFAULT_DEVICE = 'default'
+MAX_SESSION_BYTES = 512*1024*1024
+
+# define variable to hold the sessions (external interface objects) of the devices
+SESSIONS = session_store(external_interface, MAX_SESSION_BYTES)
+
+# Returns the device ID of the request. It is used in file names, so only letters, digits,
+# '-' and '_' are allowed.
+def device_id():
+    device = request.headers.get(DEVICE_HEADER, DEFAULT_DEVICE)
+    if not re.fullmatch('[A-Za-z0-9_-]{1,64}', device):
+        raise ValueError("Invalid device ID.")
+    return device
+
+# Returns the session of the device making the request.
+def session():
+    EX_INF = SESSIONS.get(device_id())
+    if EX_INF is None:
+        raise LookupError("Device not initialised.")
+    return EX_INF
 
 #-------------------------------------------------------------------------------
 # Initialise above class.
 @app.route("/initialise" , methods = ['GET'])
 def API_initialise():
     try:
-        global EX_INF
-        EX_INF = external_interface()
+        SESSIONS.create(device_id())
         return "Initialisation Successful.", 200
     # Account for Exception
     except Exception as e:
@@ -97,7 +152,10 @@ def API_initialise():
 @app.route("/check_ML" , methods = ['GET'])
 def API_check_ML():
     try:
-        if EX_INF.EI_check_ML():
+        EX_INF = session()
+        with EX_INF.lock:
+            can_use_ML = EX_INF.EI_check_ML()
+        if can_use_ML:
             return "ML can be used.", 200
         else:
             return "ML cannot be used - no data", 501
@@ -110,7 +168,9 @@ def API_check_ML():
 @app.route("/train" , methods = ['GET'])
 def API_train_ML():
     try:
-        response = EX_INF.EI_train_models()
+        EX_INF = session()
+        with EX_INF.lock:
+            response = EX_INF.EI_train_models()
         # Check that LR was trained successfully.
         if response['LR_m'] == 0 and response['LR_m'] == 0:
             return "LR does not satisfy requirements", 500
@@ -131,7 +191,9 @@ def API_MR_prediction():
         output = float(request.json["output"])
 
         # generate and return result
-        result = EX_INF.EI_predict_MR(P, A, output)
+        EX_INF = session()
+        with EX_INF.lock:
+            result = EX_INF.EI_predict_MR(P, A, output)
         if result == 0.0:
             return "MR Prediction does not satisfy requirements.", 500
         else:
@@ -152,18 +214,65 @@ def API_add_data():
         G = float(request.json["gas_aperture"])
         output = float(request.json["output"])
 
-        EX_INF.EI_add_data(G, P, A, output)
+        EX_INF = session()
+        with EX_INF.lock:
+            EX_INF.EI_add_data(G, P, A, output)
+        return "Data add successful.", 200
+    # Account for Exception
+    except Exception as e:
+        return str(e), 404
+
+#-------------------------------------------------------------------------------
+# This function is remotely called to provide a batch of new data to the ML system. It receives
+# the readings in JSON format, one list per column, and passes them to the EI object.
+@app.route("/newdata_batch" , methods = ['POST'])
+def API_add_batch():
+    try:
+        # Receive json data.
+        P = np.asarray(request.json["supply_pressure"], dtype = float)
+        A = np.asarray(request.json["air_aperture"], dtype = float)
+        G = np.asarray(request.json["gas_aperture"], dtype = float)
+        output = np.asarray(request.json["output"], dtype = float)
+        if not (len(P) == len(A) == len(G) == len(output)):
+            return "Columns of the batch have different lengths.", 400
+
+        EX_INF = session()
+        with EX_INF.lock:
+            EX_INF.EI_add_batch(G, P, A, output)
+        return "Data add successful.", 200
+    # Account for Exception
+    except Exception as e:
+        return str(e), 404
+
+#-------------------------------------------------------------------------------
+# This function is remotely called to provide a batch of new data to the ML system in binary form.
+# The body holds the readings as 4 columns (gas aperture, supply pressure, air aperture, output)
+# one after the other, each as little-endian float64 values - 32 bytes per reading (the values
+# the device measured, exactly), and no JSON to parse.
+@app.route("/newdata_binary" , methods = ['POST'])
+def API_add_binary():
+    try:
+        body = request.get_data()
+        if len(body) % 32:
+            return "Batch is not a whole number of readings.", 400
+
+        columns = np.frombuffer(body, dtype = '<f8').reshape(4, -1)
+        EX_INF = session()
+        with EX_INF.lock:
+            EX_INF.EI_add_columns(columns)
         return "Data add successful.", 200
     # Account for Exception
     except Exception as e:
         return str(e), 404
 
 #-------------------------------------------------------------------------------
-# This function is used to save accumulated data into csv file.
+# This function is used to save accumulated data into the data store.
 @app.route("/finishdata/<filename>" , methods = ['GET'])
 def API_end_of_data(filename):
     try:
-        EX_INF.EI_end_of_data(filename)
+        EX_INF = session()
+        with EX_INF.lock:
+            EX_INF.EI_end_of_data(filename)
         return "data saved successfully", 200
     # Account for Exception
     except Exception as e:
@@ -172,7 +281,7 @@ def API_end_of_data(filename):
 #---------------------------------------------------------------------------------------------------
 # Run the web app to act as the server i.e. external interface
 if __name__ == '__main__':
-    app.run(port ='8000', debug = True)
+    app.run(port ='8000', debug = True, threaded = True)
 
 #--------------------------------------------------------------
 #END#
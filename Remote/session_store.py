@@ -0,0 +1,89 @@
+import threading
+import time
+
+# SESSION_STORE: This class keeps one session (an external_interface object, with its own datastore and models) per
+# device connected to the server, keyed by the device ID sent by the device. It is safe to use from several threads at
+# once, and when the sessions hold more than max_bytes of data, the ones which have been idle longest are saved and
+# evicted. It has 4 functions:
+
+#   - __init__(self, factory, max_bytes, idle_timeout): (public) Constructor.
+#   - create(self, device_id): (public) Starts a new session for the device (replacing its previous one) and returns it.
+#   - get(self, device_id): (public) Returns the session of the device, None if it has none.
+#   - __len__(self): (public) Number of sessions.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - factory() creates a session. A session must have a lock (used to run one request of the device at a time),
+#          nbytes() (memory used by its data) and EI_end_of_data(filename) (saves its data, see external_interface).
+#          nbytes() must count everything the session holds which grows with its data, or the cap does not bound the
+#          memory of the server - the sessions of external_interface keep their readings in a data buffer, and nothing
+#          else which grows (the models are trained from statistics shared by all the sessions, see ML/data_store.py).
+#
+#        - Eviction first saves the data of a session (as '<device ID>_evicted'), so it is not lost. Sessions idle for
+#          less than idle_timeout seconds, and the session being used, are never evicted - the cap can be exceeded
+#          while all the devices are active.
+#
+#        - The sessions live in the memory of one server process. With several worker processes, the requests of a
+#          device must always go to the same worker (e.g. by hashing the device ID header at the load balancer).
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class session_store:
+
+    def __init__(self, factory, max_bytes=512*1024*1024, idle_timeout=600):
+        self.__factory = factory
+        self.__max_bytes = max_bytes
+        self.__idle_timeout = idle_timeout
+        # device ID -> [session, time of last use], in order of last use (oldest first).
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    # CREATE: Starts a new session for the device, replacing its previous one, and returns it.
+    def create(self, device_id):
+        session = self.__factory()
+        with self.__lock:
+            self.__sessions.pop(device_id, None)
+            self.__sessions[device_id] = [session, time.monotonic()]
+        self.__evict(device_id)
+        return session
+
+    # GET: Returns the session of the device (None if it has none) and marks it as used now.
+    def get(self, device_id):
+        with self.__lock:
+            entry = self.__sessions.pop(device_id, None)
+            if entry is None:
+                return None
+            entry[1] = time.monotonic()
+            self.__sessions[device_id] = entry
+        self.__evict(device_id)
+        return entry[0]
+
+    def __len__(self):
+        return len(self.__sessions)
+
+    # Saves and removes the sessions idle longest while the data of all the sessions is over max_bytes.
+    def __evict(self, current):
+        with self.__lock:
+            total = sum(session.nbytes() for session, _ in self.__sessions.values())
+            if total <= self.__max_bytes:
+                return
+            now = time.monotonic()
+            evicted = []
+            for device_id, (session, last_use) in list(self.__sessions.items()):
+                if total <= self.__max_bytes or now - last_use < self.__idle_timeout:
+                    break
+                if device_id != current:
+                    del self.__sessions[device_id]
+                    total -= session.nbytes()
+                    evicted.append((device_id, session))
+
+        # save outside the store lock, so the other devices are not held up by the disk.
+        for device_id, session in evicted:
+            with session.lock:
+                try:
+                    session.EI_end_of_data(str(device_id) + '_evicted')
+                except Exception as e:
+                    print("Session of " + str(device_id) + " evicted without saving its data: " + str(e))
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
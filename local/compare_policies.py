@@ -0,0 +1,89 @@
+from memory_prediction.memory_predictor import memory_predictor
+from memory_prediction.memory_cache import memory_cache
+from memory_prediction.eviction_policies import POLICIES
+from controller import controller
+import testing.reading_generator as r_g
+
+import contextlib
+import io
+import sys
+
+import numpy as np
+
+# This script compares the cache eviction policies (see memory_prediction/eviction_policies.py). For each policy, it
+# replays a run of the controller against the testing framework, without the remote server and without waiting between
+# iterations. The testing schedule is played CYCLES times in a row, so the burner keeps going back to the same setpoints,
+# and the cache is kept small so that entries have to be evicted. For each policy it prints:
+#
+#   - hit rate: the percentage of cache searches by the memory predictor which found a "close enough" estimate.
+#   - convergence: the average number of iterations taken to bring the output within FUEL_ACCURACY of the required
+#                  output after it changes, and the number of setpoints which were never reached.
+#
+# Run from the local directory. Policy names can be provided as arguments (default: all policies), e.g.
+#       python compare_policies.py lru arc
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# configurable parameters: size of the cache, number of times the schedule is played, length of an iteration (s).
+MAX_SIZE = 10
+CYCLES = 20
+DELAY = 0.5
+
+# csv file from where the reading generator reads the testing schedule - we need the total time it covers.
+SCHEDULE = 'testing/schedule.csv'
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# REPLAY: runs the controller with the provided policy and returns (hit rate, average convergence iterations, number of
+# setpoints not reached).
+def replay(policy):
+    cache = memory_cache(MAX_SIZE, policy = policy)
+    m_p = memory_predictor()
+    c = controller(cache, m_p)
+
+    # the schedule is played again once its total time has passed.
+    schedule_time = np.sum(np.genfromtxt(SCHEDULE, delimiter = ',', skip_header = 1)[:, 3])
+    count = int(CYCLES*schedule_time/DELAY)
+
+    # iterations taken to converge on each setpoint, and setpoints not reached before the next change.
+    convergence = []
+    not_reached = 0
+    # required output we are converging on and iterations spent so far (None once reached).
+    target, spent = None, None
+
+    for iterations in range(count):
+        sensordata = r_g.return_reading((iterations*DELAY) % schedule_time, c.gas_aperture)
+        if not sensordata['on']:
+            continue
+
+        required_output = sensordata['required_output']
+        if required_output != target:
+            if spent is not None:
+                not_reached += 1
+            target, spent = required_output, 0
+
+        if spent is not None:
+            if abs(sensordata['current_output'] - required_output)/required_output < m_p.FUEL_ACCURACY:
+                convergence.append(spent)
+                spent = None
+            else:
+                spent += 1
+
+        c.step(sensordata)
+
+    hit_rate = 100*m_p.hits/m_p.searches if m_p.searches else 0
+    return hit_rate, (np.mean(convergence) if convergence else float('nan')), not_reached
+
+#---------------------------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    policies = sys.argv[1:] if len(sys.argv) > 1 else list(POLICIES)
+
+    print("POLICY      HIT RATE (%)   CONVERGENCE (iterations)   NOT REACHED")
+    for policy in policies:
+        # the controller and the memory predictor record events (see event_log.py), which are printed as no event log
+        # is installed here. We do not need them.
+        with contextlib.redirect_stdout(io.StringIO()):
+            hit_rate, convergence, not_reached = replay(policy)
+        print(policy.ljust(12) + str(round(hit_rate, 1)).ljust(15) + str(round(convergence, 2)).ljust(27) +
+              str(not_reached))
@@ -0,0 +1,156 @@
+from memory_prediction.memory_predictor import memory_predictor
+import event_log
+
+import contextlib
+
+# CONTROLLER: This class holds the state of the control loop for one burner and carries out the decision part of an
+# iteration of the loop in main.py: it adds the latest readings to the memory cache and works out the new gas aperture,
+# using linear regression, multiple regression or memory prediction. Reading the sensors, sending data to the remote
+# server and timing the loop are left to the caller, so the same controller can be run by main.py, by simulations and
+# by test harnesses. It has 2 functions:
+
+#   - __init__(self, cache, ...): (public) Constructor.
+#   - step(self, sensordata): (public) Performs one iteration for the provided sensor readings and returns the new
+#                             gas aperture.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - If the required output value changes at any time, then for these iterations only we will use linear regression
+#          to get faster convergence. In all other cases we will use memory prediction.
+#
+#        - However, if memory prediction does not generate a result after a set threshold of tries, we use multiple
+#          regression as a last resort. Multiple regression predictions come from the mr_predict function provided to
+#          the constructor (e.g. external_interface.predict), so that the controller does not depend on how they are made.
+#          If it has no prediction to give (e.g. a prediction fetched in the background has not arrived), we carry on
+#          with memory prediction and try again on the next iteration.
+#
+#        - step() is only called while the burner is on. The gas aperture is kept as it is while the burner is off.
+#
+#        - If a latency_histograms object (latency.py) is provided, the time taken by the cache ('cache') and by each kind
+#          of prediction ('lr_predict', 'mr_predict', 'actuator_predict') is recorded in it.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class controller:
+
+    # CONSTRUCTOR: receives the memory cache of the burner (cache) and optionally:
+    #   - m_p: memory_predictor object to use (a new one is created by default).
+    #   - use_ML, LR_m, LR_c: whether ML can be used and the coefficients of the linear regression line.
+    #   - mr_predict: function taking (P, A, output) which returns the multiple regression prediction, or None if it has
+    #                 no prediction for these readings (yet). None if multiple regression is not available at all (e.g.
+    #                 there is no connection to the server).
+    #   - miss_threshold: number of misses before we use multiple regression.
+    #   - latency: latency_histograms object recording the time taken by each stage (None to not record it).
+    def __init__(self, cache, m_p=None, use_ML=False, LR_m=0, LR_c=0, mr_predict=None, miss_threshold=8, latency=None):
+        self.cache = cache
+        self.m_p = m_p if m_p is not None else memory_predictor()
+        self.use_ML = use_ML
+        self.LR_m, self.LR_c = LR_m, LR_c
+        self.mr_predict = mr_predict
+        self.miss_threshold = miss_threshold
+        self.latency = latency
+
+        # Define variable to record number of misses when using memory prediction.
+        self.misses = 0
+
+        # Define variable to hold required output of system. We also need to record the required output on the previous
+        # iteration as we compare the two to determine if we use ML or not.
+        self.required_output = 0
+        self.old_required_output = 0
+
+        # Define initial gas aperture. It must be closed (off) to begin with, so 0
+        self.gas_aperture = 0
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # STEP: Performs one iteration of the control loop. sensordata is the dictionary returned by the sensors (see
+    # reading_generator.return_reading) for the current gas aperture. Returns the new gas aperture.
+    def step(self, sensordata):
+        gas_aperture = self.gas_aperture
+        supply_pressure = sensordata['supply_pressure']
+        air_aperture = sensordata['air_aperture']
+        current_output = sensordata['current_output']
+
+        # we need to record the old value of required output so that we can compare with the new value.
+        # if the values are different, when we compare, we will use ML.
+        self.old_required_output = self.required_output
+        # receive new required output value
+        self.required_output = required_output = sensordata['required_output']
+
+    #-----------------------------------------------------------------------------------------------------------------
+        # Now we have to add the received data values to our cache. The cache evicts data by itself once maximum size is
+        # reached, and the new data becomes the most recently used entry.
+
+        with self.__timer('cache'):
+            # First check if the received data already exists in the cache
+            index = self.cache.lookup(gas_aperture, supply_pressure, air_aperture, current_output)
+
+            # In case there is no repeat
+            if index == -1:
+                self.cache.insert(gas_aperture, supply_pressure, air_aperture, current_output)
+
+            # In case there is repeated data, we need only move this repeated data back to the front
+            else:
+                self.cache.touch(index)
+
+    #-----------------------------------------------------------------------------------------------------------------
+        # make predictions
+        # if ML is available and there is a change in required output, we will use the ML to make a prediction.
+        # Note required_output = LR_m*supply_pressure*air_aperture*gas_aperture/100000 + LR_c. We want to find gas_aperture.
+        if self.use_ML and required_output != self.old_required_output:
+            with self.__timer('lr_predict'):
+                new_aperture = ((required_output - self.LR_c)*100000)/(self.LR_m*supply_pressure*air_aperture)
+
+            # round to 2 and check that prediction falls in valid range
+            if new_aperture >= 0 and new_aperture <= 100:
+                event_log.record(event_log.INFO, event_log.LR_ADJUSTMENT, a = new_aperture - gas_aperture)
+                gas_aperture = round(new_aperture, 2)
+            else:
+                event_log.record(event_log.WARNING, event_log.LR_ABORTED)
+
+        # If the miss threshold is breached we use multiple regression as a last resort.
+        elif self.use_ML and self.mr_predict is not None and self.misses >= self.miss_threshold and \
+                (new_aperture := self.__timed_mr_predict(supply_pressure, air_aperture, required_output)) is not None:
+            self.misses = 0
+
+            if new_aperture >= 0 and new_aperture <= 100:
+                event_log.record(event_log.INFO, event_log.MR_ADJUSTMENT, a = new_aperture - gas_aperture)
+                gas_aperture = round(new_aperture, 2)
+            else:
+                event_log.record(event_log.WARNING, event_log.MR_ABORTED)
+
+        # else we use memory prediction.
+        else:
+            context = {
+                        'gas_aperture': gas_aperture,
+                        'supply_pressure': supply_pressure,
+                        'air_aperture': air_aperture,
+                        'current_output': current_output
+            }
+
+            # if the adjustment is non-zero, then this means it is a miss and we need to update misses.
+            with self.__timer('actuator_predict'):
+                adjustment = self.m_p.actuator_predict(context, required_output, self.cache)
+            if adjustment == 0:
+                self.misses = 0
+            else:
+                self.misses += 1
+            gas_aperture += adjustment
+            #round to two decimal places
+            gas_aperture = round(gas_aperture, 2)
+
+        self.gas_aperture = gas_aperture
+        return gas_aperture
+
+    # Returns the context manager timing a stage, or one which does nothing if the latency is not recorded.
+    def __timer(self, stage):
+        if self.latency is None:
+            return contextlib.nullcontext()
+        return self.latency.timer(stage)
+
+    def __timed_mr_predict(self, P, A, output):
+        with self.__timer('mr_predict'):
+            return self.mr_predict(P, A, output)
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
@@ -0,0 +1,221 @@
+import os
+import struct
+import sys
+import threading
+import time
+
+# EVENT_LOG: This module records the events of the control loop (adjustments, iterations, connection failures, ...) in
+# a preallocated binary ring buffer, instead of printing them to the console. Recording an event packs a few numbers
+# into the buffer; a background thread drains the buffer to a file or socket, where the events can be decoded and
+# followed with the command line interface at the bottom of this module. It has 3 functions and a class:
+
+#   - record(level, code, n, a): (public) Records an event in the installed event log. If no event log is installed,
+#                                the event is printed as before (e.g. for scripts which do not install one).
+#   - install(log): (public) Makes log (an event_log object, or None) the one record() uses.
+#   - format_event(code, n, a): (public) Returns the text of an event.
+#   - event_log: (public) The ring buffer and its drain thread (see the class below).
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - Each event is a record of RECORD.size (24) bytes: wall-clock time, level, code, an integer (n) and a number
+#          (a). The codes and the text they stand for are in MESSAGES. The file written by the drain is a plain sequence
+#          of records.
+#
+#        - Events below the level of the log are dropped straight away. Levels are the same as in the logging module.
+#
+#        - If more than capacity events are recorded between two drains, the oldest ones are overwritten. The drain
+#          counts them in dropped.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+# time, level, (padding), code, n, a
+RECORD = struct.Struct('<dBxHid')
+
+# event codes
+VALUE_FOUND = 1
+ADJUSTMENT = 2
+LR_ADJUSTMENT = 3
+LR_ABORTED = 4
+MR_ADJUSTMENT = 5
+MR_ABORTED = 6
+ITERATION = 7
+SWITCHED_OFF = 8
+END_OF_SCHEDULE = 9
+PREDICTION_FAILED = 10
+PREDICTION_UNREACHABLE = 11
+SEND_FAILED = 12
+SEND_UNREACHABLE = 13
+BATCH_FAILED = 14
+BATCH_UNREACHABLE = 15
+
+# text of each event: {n} is replaced by the integer and {a} by the number of the event.
+MESSAGES = {
+    VALUE_FOUND: "value found",
+    ADJUSTMENT: "ADJUSTMENT: {a}",
+    LR_ADJUSTMENT: "LR ADJUSTMENT: {a}",
+    LR_ABORTED: "LR ADJUSTMENT ABORTED - OUT OF RANGE VALUE",
+    MR_ADJUSTMENT: "MR ADJUSTMENT: {a}",
+    MR_ABORTED: "MR ADJUSTMENT ABORTED - OUT OF RANGE VALUE",
+    ITERATION: "iteration: {n}, gas_aperture: {a}",
+    SWITCHED_OFF: "switched off.",
+    END_OF_SCHEDULE: "end of schedule.",
+    PREDICTION_FAILED: "PREDICTION UNSUCESSFUL - server side exception",
+    PREDICTION_UNREACHABLE: "UNABLE TO CONNECT TO SERVER. Prediction failed.",
+    SEND_FAILED: "Data send unsuccesful - server side exception.",
+    SEND_UNREACHABLE: "UNABLE TO CONNECT TO SERVER. Unable to send current data.",
+    BATCH_FAILED: "Batch send unsuccesful - server side exception ({n} readings).",
+    BATCH_UNREACHABLE: "UNABLE TO CONNECT TO SERVER. Unable to send batch of data ({n} readings).",
+}
+
+# the event log used by record(), None if there is none.
+_installed = None
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# RECORD: Records an event with the given level and code, an integer n (e.g. the iteration) and a number a (e.g. the
+# adjustment).
+def record(level, code, n=0, a=0.0):
+    if _installed is None:
+        print(format_event(code, n, a))
+    else:
+        _installed.record(level, code, n, a)
+
+# INSTALL: Makes log the event log used by record() (None to print the events again).
+def install(log):
+    global _installed
+    _installed = log
+
+# FORMAT_EVENT: Returns the text of an event.
+def format_event(code, n=0, a=0.0):
+    return MESSAGES.get(code, "UNKNOWN EVENT " + str(code)).format(n = n, a = a)
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class event_log:
+
+    # CONSTRUCTOR: capacity is the number of events held in the buffer, level the lowest level recorded. sink is where
+    # the events are drained to: a filename (the file is appended to), a socket (anything with sendall) or a binary file
+    # object. Every drain_period seconds the new events are written to the sink (and printed if echo is True).
+    def __init__(self, sink, capacity=4096, level=INFO, drain_period=0.5, echo=False):
+        self.level = level
+        self.__capacity = capacity
+        self.__buffer = bytearray(capacity*RECORD.size)
+        self.__echo = echo
+        self.__drain_period = drain_period
+
+        # number of events recorded, and drained, since the start.
+        self.__head = 0
+        self.__drained = 0
+        self.dropped = 0
+        # record() may be called from several threads (e.g. the telemetry uploader).
+        self.__lock = threading.Lock()
+
+        if isinstance(sink, (str, bytes, os.PathLike)):
+            self.__file = open(sink, 'ab')
+            self.__write = self.__file.write
+        else:
+            self.__file = None
+            self.__write = sink.sendall if hasattr(sink, 'sendall') else sink.write
+
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # RECORD: Packs an event into the next record of the buffer.
+    def record(self, level, code, n=0, a=0.0):
+        if level < self.level:
+            return
+        with self.__lock:
+            RECORD.pack_into(self.__buffer, (self.__head % self.__capacity)*RECORD.size, time.time(), level, code, n, a)
+            self.__head += 1
+
+    # CLOSE: Drains the last events and stops the drain thread.
+    def close(self):
+        self.__stop.set()
+        self.__thread.join()
+        self.__drain()
+        if self.__file is not None:
+            self.__file.close()
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # Drain thread.
+    def __run(self):
+        while not self.__stop.wait(self.__drain_period):
+            self.__drain()
+
+    # Writes the events recorded since the last drain to the sink.
+    def __drain(self):
+        with self.__lock:
+            head = self.__head
+            start = max(self.__drained, head - self.__capacity)
+            self.dropped += start - self.__drained
+            # copy the records out of the buffer (in up to two pieces, as the buffer wraps around).
+            first, last = start % self.__capacity, head % self.__capacity
+            if head == start:
+                data = b''
+            elif first < last:
+                data = bytes(self.__buffer[first*RECORD.size:last*RECORD.size])
+            else:
+                data = bytes(self.__buffer[first*RECORD.size:]) + bytes(self.__buffer[:last*RECORD.size])
+            self.__drained = head
+
+        if data:
+            self.__write(data)
+            if self.__file is not None:
+                self.__file.flush()
+            if self.__echo:
+                for _, _, code, n, a in decode(data):
+                    print(format_event(code, n, a))
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# DECODE: Returns the events in a sequence of records as (time, level, code, n, a) tuples.
+def decode(data):
+    return list(RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]))
+
+def _print_events(data, level):
+    for t, event_level, code, n, a in decode(data):
+        if event_level >= level:
+            print(time.strftime('%H:%M:%S', time.localtime(t)) + ('%.3f' % (t % 1))[1:] + ' ' +
+                  LEVEL_NAMES.get(event_level, str(event_level)).ljust(8) + format_event(code, n, a))
+
+# Command line interface, from the local directory:
+#       python event_log.py decode FILE [LEVEL]     prints all the events in the file.
+#       python event_log.py tail FILE [LEVEL]       prints the last 20 events and then the new ones as they arrive.
+# LEVEL (DEBUG, INFO, WARNING or ERROR) is the lowest level printed.
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('decode', 'tail'):
+        print("usage: python event_log.py decode|tail FILE [LEVEL]")
+        sys.exit(1)
+    command, filename = sys.argv[1], sys.argv[2]
+    level = {name: value for value, name in LEVEL_NAMES.items()}[sys.argv[3].upper()] if len(sys.argv) > 3 else DEBUG
+
+    with open(filename, 'rb') as f:
+        data = f.read()
+        if command == 'decode':
+            _print_events(data, level)
+            sys.exit(0)
+
+        # tail: start from the last 20 records, then keep reading whole records as they are appended.
+        whole = len(data) - len(data) % RECORD.size
+        _print_events(data[max(0, whole - 20*RECORD.size):whole], level)
+        f.seek(whole)
+        pending = b''
+        try:
+            while True:
+                pending += f.read()
+                whole = len(pending) - len(pending) % RECORD.size
+                _print_events(pending[:whole], level)
+                pending = pending[whole:]
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            sys.exit(0)
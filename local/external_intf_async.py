@@ -0,0 +1,169 @@
+from external_intf_http import external_interface
+from telemetry_uploader import telemetry_uploader
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# This class is the asyncio version of external_interface (external_intf_http.py), for the control loop in
+# main_async.py. The HTTP requests are still made by an external_interface object, but in worker threads, so that the
+# event loop (and hence the control loop) never waits on the network during an iteration. It has 9 functions:
+
+#   - __init__(self, url, device_id, client): (public) Constructor.
+#   - initialise(self), use_lr(self), train_models(self): (public, async) Same as in external_interface. These are only
+#                                                          called before the loop starts, so they are awaited.
+#   - mr_model(self): (public, property) Same as external_interface.mr_model.
+#   - send_readings(self, G, P, A, output): (public) Queues the readings to be sent to the server in the background
+#                                           (by the telemetry_uploader of its client, see telemetry_uploader.py).
+#   - request_prediction(self, P, A, output): (public) Starts fetching the multiple regression prediction in the
+#                                             background, ahead of the iteration which needs it.
+#   - prediction(self, P, A, output): (public) Returns the prefetched multiple regression prediction for these readings,
+#                                     or None if it is not available (yet). Never waits.
+#   - end_data(self, filename): (public, async) Waits for the queued readings to be sent, then closes the data stream.
+
+#-------------------------------------------------------------------------------------
+
+# NOTES: - Readings are sent in batches by the thread of the telemetry uploader, and the other requests are made by a
+#          separate worker thread, so a slow upload does not hold up predictions.
+#
+#        - A prefetched prediction is used for readings within READING_ACCURACY of the ones it was requested for (the
+#          same window the memory predictor uses), for the same required output. The latest PREDICTIONS_KEPT predictions
+#          are kept, so that one interface can be shared by several burners.
+#
+#        - The connection to the server (HTTP session, worker thread and uploader) is a shared_client, see below.
+#          Several interfaces (e.g. one per burner, each with its own device ID, see orchestrator.py) can share one by
+#          being given the same client, which is then left open by end_data() - the uploads have to be ended with
+#          shared_client.end_uploads() before the data streams are closed, and the client closed after that.
+
+#-------------------------------------------------------------------------------------
+
+# SHARED_CLIENT: The connection to the server of one or more async_external_interface objects: one requests.Session
+# (so one pool of connections to the server), one worker thread for the requests other than uploads, and one
+# telemetry_uploader (so one upload thread and one spill file), which sends the readings of each interface in batches
+# tagged with its device ID.
+class shared_client:
+
+    # spill_file is the spill file of the uploader (see telemetry_uploader.py).
+    def __init__(self, url='http://127.0.0.1:8000', spill_file='telemetry_spill.dat'):
+        self.session = requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.uploader = None
+        self.__sender = external_interface(url, session = self.session)
+        self.__spill_file = spill_file
+
+    # Starts the uploader, once the server has been initialised.
+    def start_uploads(self):
+        if self.uploader is None:
+            self.uploader = telemetry_uploader(self.__sender, spill_file = self.__spill_file)
+
+    # Waits for the readings still queued to be sent (or spilled to disk) and stops the uploader.
+    async def end_uploads(self):
+        if self.uploader is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.uploader.close)
+            self.uploader = None
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+#-------------------------------------------------------------------------------------
+
+class async_external_interface:
+
+    READING_ACCURACY = 0.05
+    PREDICTIONS_KEPT = 64
+
+#----------------------------------------------------------------------------
+    # Define constructor (We initialise object with base URL of server and the ID of the device, see
+    # external_interface). client is the shared_client to connect to the server with, if it is shared with other
+    # interfaces (None for one of its own). Must be created while the event loop is running.
+    def __init__(self, url='http://127.0.0.1:8000', device_id=None, client=None):
+        self.__own_client = client is None
+        self.__client = shared_client(url) if client is None else client
+        self.__device_id = device_id
+        self.__e_i = external_interface(url, device_id, self.__client.session)
+        self.__loop = asyncio.get_running_loop()
+
+        # readings (P, A, output) of the predictions being fetched, and of the latest predictions received (oldest first)
+        # mapped to their values.
+        self.__requested = set()
+        self.__predictions = OrderedDict()
+
+#------------------------------------------------------------------------------
+    # Runs a function (of the external_interface object) in the worker thread.
+    def __run(self, function, *args):
+        return self.__loop.run_in_executor(self.__client.executor, function, *args)
+
+    async def initialise(self):
+        initialised = await self.__run(self.__e_i.initialise)
+        if initialised:
+            self.__client.start_uploads()
+        return initialised
+
+    async def use_lr(self):
+        return await self.__run(self.__e_i.use_lr)
+
+    async def train_models(self):
+        return await self.__run(self.__e_i.train_models)
+
+    # Local copy of the multiple regression model received by train_models() (see mr_model.py), None if there is none.
+    @property
+    def mr_model(self):
+        return self.__e_i.mr_model
+
+#-------------------------------------------------------------------------------
+    # Queues readings to be sent to the server.
+    def send_readings(self, G, P, A, output):
+        self.__client.uploader.enqueue(G, P, A, output, self.__device_id)
+
+#-------------------------------------------------------------------------------
+    # Starts fetching the multiple regression prediction for the given readings, unless a prediction which can be used
+    # for them is already available or being fetched.
+    def request_prediction(self, P, A, output):
+        if any(self.__matches(readings, P, A, output) for readings in self.__requested):
+            return
+        if self.prediction(P, A, output) is not None:
+            return
+
+        readings = (P, A, output)
+        self.__requested.add(readings)
+        future = self.__run(self.__e_i.predict, P, A, output)
+        future.add_done_callback(lambda f: self.__received(readings, f))
+
+    # Stores a prediction once it has been received.
+    def __received(self, readings, future):
+        self.__requested.discard(readings)
+        if not future.cancelled() and future.exception() is None:
+            self.__predictions[readings] = future.result()
+            self.__predictions.move_to_end(readings)
+            if len(self.__predictions) > self.PREDICTIONS_KEPT:
+                self.__predictions.popitem(last=False)
+
+    # Returns the prefetched prediction for the given readings (the latest one if several match), None if there is none.
+    # Used as the mr_predict function of the controller.
+    def prediction(self, P, A, output):
+        for readings in reversed(self.__predictions):
+            if self.__matches(readings, P, A, output):
+                return self.__predictions[readings]
+        return None
+
+    def __matches(self, readings, P, A, output):
+        return (readings[2] == output and abs(readings[0] - P)/P < self.READING_ACCURACY and
+                abs(readings[1] - A)/A < self.READING_ACCURACY)
+
+#-------------------------------------------------------------------------------
+    # Waits for the readings still queued to be sent (or spilled to disk), then signals the end of the data stream. With
+    # a shared client, the uploads have to be ended beforehand (see notes above).
+    async def end_data(self, filename='labelled_data'):
+        if self.__own_client:
+            await self.__client.end_uploads()
+        result = await self.__run(self.__e_i.end_data, filename)
+
+        if self.__own_client:
+            self.__client.close()
+        return result
+
+#--------------------------------------------------------------------------------
+# END
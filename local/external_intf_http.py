@@ -1,3 +1,7 @@
+from mr_model import mr_model
+import event_log
+
+import numpy as np
 import requests
 
 # This class is used to send data to the server that runs the ML programs. This is
@@ -10,16 +14,25 @@ class external_interface:
 
 #----------------------------------------------------------------------------
     # Define constructor (We initialise object with base URL of server)
-    # Default value is port 5003 on localhost (for testing)
-    def __init__(self, url='http://127.0.0.1:8000'):
+    # Default value is port 5003 on localhost (for testing). device_id identifies this device
+    # to the server, which keeps separate data and models for each device (None to use the
+    # server's default session). session is the requests.Session to make the requests with, if
+    # it is shared with other interfaces (None for one of its own), so that they share its
+    # connections to the server.
+    def __init__(self, url='http://127.0.0.1:8000', device_id=None, session=None):
         self.__url = url
+        self.__headers = self.__device_headers(device_id)
+        self.__session = requests.Session() if session is None else session
+        # Local copy of the multiple regression model (see mr_model.py), received when the models
+        # are trained. None if we do not have one.
+        self.mr_model = None
 
 #------------------------------------------------------------------------------
     # Initialise communciation with server.
     def initialise(self):
         try:
             # Send get request to necessary URL.
-            response = requests.get(self.__url + '/initialise')
+            response = self.__session.get(self.__url + '/initialise', headers = self.__headers)
             # Check result based on status code
             if response.status_code == 200:
                 print(response.text)
@@ -38,7 +51,7 @@ class external_interface:
     def use_lr(self):
         try:
             # Send get request to necessary URL.
-            response = requests.get(self.__url + '/check_ML')
+            response = self.__session.get(self.__url + '/check_ML', headers = self.__headers)
             # Check result based on status code
             print(response.text)
             if response.status_code == 200:
@@ -55,7 +68,7 @@ class external_interface:
     def train_models(self):
         try:
             # Send get request to necessary URL.
-            response = requests.get(self.__url + '/train')
+            response = self.__session.get(self.__url + '/train', headers = self.__headers)
             # return of function based on status code
             #---------------------------------------
             # Here, training of LR is successful. Since MR is handled differently,
@@ -64,6 +77,9 @@ class external_interface:
             if response.status_code == 200:
                 # Store response as dictionary
                 coeffs = response.json()
+                # Keep a copy of the multiple regression model, if the server sent one.
+                if 'MR' in coeffs:
+                    self.mr_model = mr_model(coeffs['MR'])
                 # The last return value indicates whether the model should be used.
                 return coeffs['LR_m'], coeffs['LR_c'], True
             # Here the model generated was not accurate enough.
@@ -77,6 +93,8 @@ class external_interface:
 
 #-------------------------------------------------------------------------------
     # This function is used to obtain the multiple regression prediction from the remote server.
+    # (If the server sent its model when it was trained, mr_model.predict gives the same prediction
+    # without a request.)
     def predict(self, P, A, output):
         try:
             # Prepare data for POST request.
@@ -86,17 +104,17 @@ class external_interface:
                 "output": output
             }
             # Send POST request to necessary URL.
-            response = requests.post(self.__url + '/MR_predict', json = readings)
+            response = self.__session.post(self.__url + '/MR_predict', json = readings, headers = self.__headers)
             # return of function based on status code
             if response.status_code == 200:
                 return float(response.text)
             else:
-                print("PREDICTION UNSUCESSFUL - server side exception")
+                event_log.record(event_log.WARNING, event_log.PREDICTION_FAILED)
                 return 0.0
         # If we are unable to connect to the server, return 0.0 to handle the error
         # 0.0 will not be accepted by the main system.
         except requests.exceptions.ConnectionError as c:
-            print("UNABLE TO CONNECT TO SERVER. Prediction failed.")
+            event_log.record(event_log.WARNING, event_log.PREDICTION_UNREACHABLE)
             return 0.0
 
 #-------------------------------------------------------------------------------
@@ -111,16 +129,40 @@ class external_interface:
                 "output": output
             }
             # Send POST request to necessary URL.
-            response = requests.post(self.__url + '/newdata', json = readings)
+            response = self.__session.post(self.__url + '/newdata', json = readings, headers = self.__headers)
             # return of function based on status code
             if response.status_code == 200:
                 return True
             else:
-                print("Data send unsuccesful - server side exception.")
+                event_log.record(event_log.WARNING, event_log.SEND_FAILED)
                 return False
         # If we are unable to connect to the server, return False to handle the error
         except requests.exceptions.ConnectionError as c:
-            print("UNABLE TO CONNECT TO SERVER. Unable to send current data.")
+            event_log.record(event_log.WARNING, event_log.SEND_UNREACHABLE)
+            return False
+
+#-------------------------------------------------------------------------------
+    # This function sends a batch of sensor readings to the server in one request. rows holds
+    # the readings of the batch, each as (G, P, A, output). device_id is the device they were
+    # taken by, if it is not the device of this interface (see telemetry_uploader.py).
+    def send_batch(self, rows, device_id=None):
+        try:
+            # Prepare data for POST request - the 4 columns one after the other as little-endian
+            # float64 values (see /newdata_binary on the server).
+            readings = np.asarray(rows, dtype = '<f8').reshape(-1, 4).T.tobytes()
+            # Send POST request to necessary URL.
+            headers = self.__headers if device_id is None else self.__device_headers(device_id)
+            response = self.__session.post(self.__url + '/newdata_binary', data = readings,
+                                           headers = {**headers, 'Content-Type': 'application/octet-stream'})
+            # return of function based on status code
+            if response.status_code == 200:
+                return True
+            else:
+                event_log.record(event_log.WARNING, event_log.BATCH_FAILED, n = len(rows))
+                return False
+        # If we are unable to connect to the server, return False to handle the error
+        except requests.exceptions.ConnectionError as c:
+            event_log.record(event_log.WARNING, event_log.BATCH_UNREACHABLE, n = len(rows))
             return False
 
 #-------------------------------------------------------------------------------
@@ -128,7 +170,7 @@ class external_interface:
         try:
             # Send get request to necessary URL.
             print('URL: ' + self.__url + '/finishdata/' + filename)
-            response = requests.get(self.__url + '/finishdata/' + filename)
+            response = self.__session.get(self.__url + '/finishdata/' + filename, headers = self.__headers)
             # Check result based on status code
             if response.status_code == 200:
                 print("DATA STREAM CLOSED.")
@@ -141,5 +183,10 @@ class external_interface:
             print("UNABLE TO CONNECT TO SERVER. Unable to end data stream, matter will be rectified.")
             return False
 
+#-------------------------------------------------------------------------------
+    # Headers identifying the device to the server.
+    def __device_headers(self, device_id):
+        return {'X-Device-ID': device_id} if device_id is not None else {}
+
 #--------------------------------------------------------------------------------
 # END
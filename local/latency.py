@@ -0,0 +1,134 @@
+import json
+import os
+from time import perf_counter_ns
+
+# LATENCY_HISTOGRAMS: This class measures how long each stage of an iteration of the control loop takes (reading the
+# sensors, sending telemetry, the memory cache, memory prediction, LR/MR prediction). The time of each stage is added
+# to a histogram, from which the median (p50), 99th percentile (p99) and maximum are reported. It has 6 functions:
+
+#   - __init__(self): (public) Constructor.
+#   - timer(self, stage): (public) Returns a context manager which times the code in its 'with' block for the stage.
+#   - record(self, stage, ns): (public) Adds a time in nanoseconds to the histogram of the stage.
+#   - stats(self): (public) Returns a dictionary of statistics (count, p50, p99, max, mean in seconds) by stage.
+#   - report(self): (public) Returns the statistics as lines of text.
+#   - export(self, filename): (public) Writes the statistics to a JSON file.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - The histograms have 4 buckets per power of two of nanoseconds, so a percentile is reported with an error of
+#          at most 25% (the upper end of its bucket is reported). The maximum and the mean are exact.
+#
+#        - Recording a time is a few integer operations, and timing a stage with timer() costs one or two microseconds,
+#          so the measurements can be left on all the time. The histograms have a fixed size and are never reset, so
+#          the statistics cover the whole run.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# number of buckets: covers times up to 2^62 ns.
+BUCKETS = 4*62
+
+
+# Context manager returned by latency_histograms.timer(). Not re-entrant: a stage cannot be timed inside itself.
+class _stage_timer:
+
+    __slots__ = ('histograms', 'stage', 'start')
+
+    def __init__(self, histograms, stage):
+        self.histograms = histograms
+        self.stage = stage
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograms.record(self.stage, perf_counter_ns() - self.start)
+        return False
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class latency_histograms:
+
+    # CONSTRUCTOR: stages are added as they are first recorded, in that order.
+    def __init__(self):
+        # by stage: [bucket counts, number of times, total ns, max ns].
+        self.__stages = {}
+        self.__timers = {}
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # TIMER: Returns the context manager timing the stage, e.g. with latency.timer('cache'): ...
+    def timer(self, stage):
+        if stage not in self.__timers:
+            self.__timers[stage] = _stage_timer(self, stage)
+        return self.__timers[stage]
+
+    # RECORD: Adds a time in nanoseconds to the histogram of the stage.
+    def record(self, stage, ns):
+        entry = self.__stages.get(stage)
+        if entry is None:
+            entry = self.__stages[stage] = [[0]*BUCKETS, 0, 0, 0]
+        entry[0][self.__bucket(ns)] += 1
+        entry[1] += 1
+        entry[2] += ns
+        if ns > entry[3]:
+            entry[3] = ns
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # STATS: Returns {stage: {'count', 'p50', 'p99', 'max', 'mean'}}, times in seconds.
+    def stats(self):
+        stats = {}
+        for stage, (counts, n, total, maximum) in self.__stages.items():
+            stats[stage] = {
+                                'count': n,
+                                'p50': self.__percentile(counts, n, maximum, 0.5)/1e9,
+                                'p99': self.__percentile(counts, n, maximum, 0.99)/1e9,
+                                'max': maximum/1e9,
+                                'mean': total/n/1e9
+            }
+        return stats
+
+    # REPORT: One line per stage, times in microseconds.
+    def report(self):
+        lines = []
+        for stage, s in self.stats().items():
+            lines.append("LATENCY " + stage + ": " + str(s['count']) + " times, p50 " + str(round(s['p50']*1e6, 1)) +
+                         " us, p99 " + str(round(s['p99']*1e6, 1)) + " us, max " + str(round(s['max']*1e6, 1)) + " us")
+        return "\n".join(lines)
+
+    # EXPORT: Writes the statistics to a JSON file. The file is replaced in one step, so a reader never sees half of it.
+    def export(self, filename):
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self.stats(), f, indent = 2)
+        os.replace(filename + '.tmp', filename)
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # Bucket of a time in ns: times below 4 ns have a bucket each, then each power of two is split into 4 buckets.
+    @staticmethod
+    def __bucket(ns):
+        if ns < 4:
+            return max(ns, 0)
+        bits = ns.bit_length()
+        return min((bits - 2)*4 + ((ns >> (bits - 3)) & 3), BUCKETS - 1)
+
+    # Upper end (ns) of the bucket holding the given fraction of the times, no more than the maximum time.
+    @staticmethod
+    def __percentile(counts, n, maximum, fraction):
+        rank = fraction*n
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count:
+                if bucket < 4:
+                    upper = bucket
+                else:
+                    shift = bucket//4 - 1
+                    upper = ((5 + bucket % 4) << shift) - 1
+                return min(upper, maximum)
+        return maximum
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
@@ -1,25 +1,30 @@
 from memory_prediction.memory_predictor import memory_predictor
+from memory_prediction.memory_cache import memory_cache
+from controller import controller
+from scheduler import deadline_scheduler, virtual_clock
 from external_intf_http import external_interface
+from telemetry_uploader import telemetry_uploader
+from latency import latency_histograms
 import testing.reading_generator as r_g
+import event_log
 
-import numpy as np
-import time
+from time import perf_counter_ns
 
 # DOCUMENTATION: Central program which coordinates the various programs in the project (memory based,
 # ML based, actuator communication). Loops for a set period of time every day. During an iteration,
-# utilises outputs from ML-based and memory-based position calculation. Updates CSV file to provide
-# labelled data to the ML program.
+# utilises outputs from ML-based and memory-based position calculation (through the controller class in controller.py).
+# Updates CSV file to provide labelled data to the ML program.
 #
-# Below there is also a 'search' functionn which is used to ensure that data in the LRU cache is not repeated
+# The LRU cache is a memory_cache object, which is also used to ensure that data in the cache is not repeated
 # (before adding data to the cache, the cache is searched to make sure the data is not already there)
 
 #-----------------------------------------------------------------------------------------------------
 
-# NOTES: - The latest data is sent via HTTPS to the remote server on every iteration.
+# NOTES: - The latest data is sent via HTTPS to the remote server in batches, by the telemetry uploader running in the
+#          background (telemetry_uploader.py). Data which cannot be sent is kept on disk and sent later.
 #
-#        - If the cache is not at full capacity, new data is appended to it. If it is at full capacity, the least
-#          recently used data is discarded, all elements are shifted one place to the right and the new data is
-#          inserted in the beginning indices.
+#        - If the cache is not at full capacity, new data is added to it. If it is at full capacity, the least
+#          recently used data is discarded and the new data takes its place as the most recently used entry.
 #
 #        - This component is likely to communicate with sensors and other processing devices through other
 #          Python modules like external_intf_http.py.
@@ -29,37 +34,55 @@ import time
 #
 #        - However, if memory prediction does not generate a result after a set threshold of tries, we use multiple
 #          regression as a last resort.
+#
+#        - The time taken by each stage of an iteration is measured (see latency.py) and written to LATENCY_FILE every
+#          LATENCY_PERIOD iterations: 'sensor_read', 'telemetry', the stages of the controller (see controller.py) and
+#          'decision' (from reading the sensors to the new gas aperture).
+#
+#        - The events of the loop (adjustments, iterations, ...) are not printed but recorded in an event log (see
+#          event_log.py), which is written to EVENT_FILE in the background. To follow it, run
+#          python event_log.py tail events.log. To print the events as well, pass echo=True (or --echo on the command
+#          line).
+#
+#        - In simulation mode (simulate=True, or --simulate on the command line) the loop runs on a virtual clock: it does
+#          not wait between iterations, so long schedules can be replayed in seconds. Everything else is the same as in
+#          real time, so the results are identical.
 
 #------------------------------------------------------------------------------------------------------
 
-def main():
-    # Set number of iterations
-    count = 165
+# count is the number of iterations. If simulate is True, the loop does not wait between iterations, and if echo is True
+# the events are printed (see NOTES).
+def main(count=165, simulate=False, echo=False):
 
-    # Initialise a numpy array to act as memory cache for memory prediction.
-    cache = np.array([[], [], [], []])
-
-    #define maximum size of above data structure to limit memory usage
+    #define maximum size of memory cache to limit memory usage
     MAX_SIZE = 100
 
+    # Define file in which the cache is kept between runs, and how often (in iterations) we make sure it is written to disk.
+    CACHE_FILE = 'cache_snapshot.npy'
+    SNAPSHOT_PERIOD = 20
+
+    # Define resolution of the readings (G, P, A, output) when checking whether they are already in the cache - readings
+    # which only differ by less than this (sensor noise) are treated as the same data.
+    RESOLUTION = (0.01, 10, 0.5, 0.1)
+
+    # Initialise the LRU cache for memory prediction. If the cache file exists from a previous run, the cache starts with
+    # the data stored there (warm start).
+    cache = memory_cache(MAX_SIZE, CACHE_FILE, resolution = RESOLUTION)
+
     #define threshold of misses before we need to use multiple regression.
     MISS_THRESHOLD = 8
 
-    # INDEX 0 - absolute position of actuator (gas aperture size) is the first array in cache
-    # INDEX 1 - measured fuel gas supply pressure is the second array in cache
-    # INDEX 2 - air aperture size is the third array in cache
-    # INDEX 3 - corresponding output value is third array in cache
-    GAS_APERTURE, PRESSURE, AIR_APERTURE, OUTPUT = 0, 1, 2, 3
-
     # Define URL of remote server.
     SERVER_URL = 'http://127.0.0.1:8000'
+    # Define ID of this device on the server, which keeps separate data and models for each device.
+    DEVICE_ID = 'burner0'
 
     #------------------------------------------------------------------------------------------------
 
     # Instantiate object of memory_predictor class.
     m_p = memory_predictor()
     # Instantiate object of external_interface class (linear regression).
-    e_i = external_interface(SERVER_URL)
+    e_i = external_interface(SERVER_URL, DEVICE_ID)
     # Initialise listener class on server by sending signal to do so. It returns true/false based on
     # whether initialisation was successful.
     init_server = e_i.initialise()
@@ -69,6 +92,7 @@ def main():
     # The use_lr function indicates if it is possible to use ML, based on availability of data
     # Hence if initialisation is successful, use_ML is set to True.
     use_ML = False
+    LR_m, LR_c = 0, 0
     if init_server:
         use_ML = e_i.use_lr()
 
@@ -81,143 +105,106 @@ def main():
 
     #----------------------------------------------------------------------------------------------
 
+    # The readings are sent to the server in batches in the background - the loop only adds them to a queue.
+    if init_server:
+        uploader = telemetry_uploader(e_i)
+
+    #----------------------------------------------------------------------------------------------
+
     # Define time delay in seconds between successive loop iterations
     DELAY = 0.5
 
     # Define variable to hold number of iterations
     iterations = 0
 
-    # Define variable to record number of misses when using memory prediction.
-    misses = 0
-
-    # Define variable to hold required output of system. In the loop below, we will also need to record
-    # the required output on the previous iteration as we compare the two to determine if we use ML or not.
-    required_output = 0
-    old_required_output = 0
-
-    # Define initial gas aperture. It must be closed (off) to begin with, so 0
-    gas_aperture = 0
+    # Define file to which the latency of each stage is written, and how often (in iterations).
+    LATENCY_FILE = 'latency.json'
+    LATENCY_PERIOD = 100
+    latency = latency_histograms()
+
+    # Define file to which the events are written, and the lowest level of the events recorded.
+    EVENT_FILE = 'events.log'
+    EVENT_LEVEL = event_log.INFO
+    events = event_log.event_log(EVENT_FILE, level = EVENT_LEVEL, echo = echo)
+    event_log.install(events)
+
+    # Multiple regression predictions are made with the copy of the model sent by the server when it was trained, or if
+    # there is none, requested from the server (if it is listening).
+    mr_predict = e_i.predict if init_server else None
+    if e_i.mr_model is not None:
+        mr_predict = e_i.mr_model.predict
+
+    # The controller holds the state of the control loop (misses, required output, gas aperture) and decides on the
+    # adjustments.
+    c = controller(cache, m_p, use_ML, LR_m, LR_c, mr_predict, MISS_THRESHOLD, latency)
+
+    # We time the loop to make sure that each iteration takes exactly DELAY seconds - the scheduler sleeps until the
+    # start of the next iteration.
+    if simulate:
+        clock = virtual_clock()
+        scheduler = deadline_scheduler(DELAY, clock.now, clock.sleep)
+    else:
+        scheduler = deadline_scheduler(DELAY)
 
     while iterations < count:
 
-        # We time the loop to make sure that each iteration takes exactly DELAY seconds.
-        start_time = time.time()
+        start = perf_counter_ns()
 
         # Receive Sensor Data
-        sensordata = r_g.return_reading(iterations*DELAY, gas_aperture)
+        with latency.timer('sensor_read'):
+            sensordata = r_g.return_reading(iterations*DELAY, c.gas_aperture)
+
+        # An empty dictionary means the end of the testing schedule has been reached.
+        if not sensordata:
+            event_log.record(event_log.INFO, event_log.END_OF_SCHEDULE)
+            break
 
         # If the device is off, we do not need to continue with the remaining contents of the loop.
         if not sensordata['on']:
-            print("switched off.")
+            event_log.record(event_log.INFO, event_log.SWITCHED_OFF)
             # we keep the delay and iterations to keep track of the passage of time.
             iterations += 1
-            time.sleep(DELAY)
+            scheduler.wait()
             continue
 
-        supply_pressure = sensordata['supply_pressure']
-        air_aperture = sensordata['air_aperture']
-        current_output = sensordata['current_output']
-
         # IMPORTANT: SEND SENSOR DATA TO THE REMOTE SERVER IF LISTENING----------------------------------------------------------------
         if init_server:
-            e_i.send_readings(G=gas_aperture, P=supply_pressure, A=air_aperture, output=current_output)
-
-        # recieve data into 4x1 numpy array to concatenate to memory_prediction cache.
-        newdata = np.array([[gas_aperture], [supply_pressure], [air_aperture], [current_output]])
-
-        # we need to record the old value of required output so that we can compare with the new value.
-        # if the values are different, when we compare, we will use ML.
-        if iterations > 0:
-            old_required_output = required_output
-        # receive new required output value
-        required_output = sensordata['required_output']
+            with latency.timer('telemetry'):
+                uploader.enqueue(G=c.gas_aperture, P=sensordata['supply_pressure'], A=sensordata['air_aperture'],
+                                 output=sensordata['current_output'])
 
     #---------------------------------------------------------------------------------------------------------------------------------
-        # Now we have to add the received data values to our cache. If the current size of the subarrays in the cache is less
-        # than the maximum allowed size, we append the data to the end of the numpy array, increasing the size. If maximum size is
-        # reached, replace the last value with our new data. In both cases, the data added to the end will be moved to the beginning when
-        # we call the memory_predict function (from which we call the shuffle function to do this).
-
-        # First check if the received data already exists in the cache
-        index = search(cache, newdata)
-
-        # In case there is no repeat
-        if index == -1:
-
-            # Case 1: Size of subarrays in cache < maximum allowed Size
-            # - we just add the new element at the beginning, increasing the array size
-            if len(cache[OUTPUT]) < MAX_SIZE:
-                # concatenate newdata with cache, row wise
-                cache = np.concatenate((newdata, cache), axis = 1)
-
-            # Case 2: Size equals maximum allowed size
-            # - we insert new data at the end, replacing LRU data.
-            else:
-                cache[OUTPUT, MAX_SIZE - 1] = newdata[OUTPUT, 0]
-                cache[AIR_APERTURE, MAX_SIZE - 1] = newdata[AIR_APERTURE, 0]
-                cache[PRESSURE, MAX_SIZE - 1] = newdata[PRESSURE, 0]
-                cache[GAS_APERTURE, MAX_SIZE - 1] = newdata[GAS_APERTURE, 0]
-
-                # then we shuffle the newly added data to the beginning
-                m_p.shuffle(cache, MAX_SIZE - 1)
-
-        # In case there is repeated data, we need only shuffle this repeated data back to the beginning
-        else:
-            m_p.shuffle(cache, index)
-
-    #---------------------------------------------------------------------------------------------------------------------------------------------
-        # make predictions
-        # if ML is available and there is a change in required output, we will use the ML to make a prediction.
-        # Note required_output = LR_m*supply_pressure*air_aperture*gas_aperture/100000 + LR_c. We want to find gas_aperture.
-        if use_ML and required_output != old_required_output:
-            new_aperture = ((required_output - LR_c)*100000)/(LR_m*supply_pressure*air_aperture)
-
-            # round to 2 and check that prediction falls in valid range
-            if new_aperture >= 0 and new_aperture <= 100:
-                print("LR ADJUSTMENT: " + str(new_aperture - gas_aperture))
-                gas_aperture = round(new_aperture, 2)
-            else:
-                print("LR ADJUSTMENT ABORTED - OUT OF RANGE VALUE")
-
-        # If the miss threshold is breached we use multiple regression as a last resort.
-        elif use_ML and init_server and misses >= MISS_THRESHOLD:
-            new_aperture = e_i.predict(supply_pressure, air_aperture, required_output)
-            misses = 0
-
-            if new_aperture >= 0 and new_aperture <= 100:
-                print("MR ADJUSTMENT: " + str(new_aperture - gas_aperture))
-                gas_aperture = round(new_aperture, 2)
-            else:
-                print("MR ADJUSTMENT ABORTED - OUT OF RANGE VALUE")
-
-        # else we use memory prediction.
-        else:
-            context = {
-                        'gas_aperture': gas_aperture,
-                        'supply_pressure': supply_pressure,
-                        'air_aperture': air_aperture,
-                        'current_output': current_output
-            }
-
-            # if the adjustment is non-zero, then this means it is a miss and we need to update misses.
-            adjustment = m_p.actuator_predict(context, required_output, cache)
-            if adjustment == 0:
-                misses = 0
-            else:
-                misses += 1
-            gas_aperture += adjustment
-            #round to two decimal places
-            gas_aperture = round(gas_aperture, 2)
-
-        print("iteration: " + str(iterations) + ", gas_aperture: " + str(gas_aperture))
+        # Add the readings to the cache and make predictions (see controller.py).
+        gas_aperture = c.step(sensordata)
+        latency.record('decision', perf_counter_ns() - start)
+
+        event_log.record(event_log.INFO, event_log.ITERATION, iterations, gas_aperture)
         # increment count
         iterations += 1
 
-        # wait until we are DELAY seconds adead of loop start time
-        while time.time() - start_time < DELAY:
-            pass
+        # periodically write the cache to disk, so that a restart continues from recent data.
+        if iterations % SNAPSHOT_PERIOD == 0:
+            cache.flush()
+        if iterations % LATENCY_PERIOD == 0:
+            latency.export(LATENCY_FILE)
+
+        # wait until the start of the next iteration
+        scheduler.wait()
+
+    # write the last events to the file.
+    event_log.install(None)
+    events.close()
+
+    print(scheduler.report())
+    print(latency.report())
+    latency.export(LATENCY_FILE)
+
+    # save the cache for the next run.
+    cache.flush()
 
     if init_server:
+        # Send the readings still queued (or keep them on disk for the next run).
+        uploader.close()
         # Signal end of data stream - server will therefore save data in the given filename.
         FILENAME = 'labelled_data'
         e_i.end_data(FILENAME)
@@ -227,54 +214,16 @@ def main():
 
 
 
-#--------------------------------------------------------------------------------------------------------------------------------------------------
-#---------------------------------------------------------------------------------------------------------------------------------------------------
-
-#####VERIFIED#####
-# (Some more testing before removing output statements)
-
-# NOTES ON SEARCH FUNCTION: - Function takes two parameters - arr : the 2 dimensional array to be searched & check: a 4x1 matrix
-#                             which we want to check exists in arr.
-#                           - we essentially need to find instances in which data values in the rows of the numpy array are all
-#                             the same.
-#                           - if only one parameter is different, we would need to change this parameter to the new value.
-#                           - the function returns the index of the repeated data. Else it returns -1.
-#                           - It takes two parameters - the numpy array to be searched and another numpy array containing
-#                             the parameters to be checked
-
-#---------------------------------------------------------------------------------------------------------------------------------------------------
-
-def search(arr, check):
-
-    for i in range(0, len(arr[0])):
-        # First check if output values in row 3 are the same
-        if check[3, 0] == arr[3, i]:
-            # Next check other parameters
-            matching_parameters = 0
-            for j in range(0, 3):
-                if check[j, 0] == arr[j, i]:
-                    matching_parameters += 1
-
-            # in case of a perfect match
-            if matching_parameters == 3:
-                return i
-
-            # in case only one parameter is different, we have to replace the values
-            elif matching_parameters == 2:
-                arr[0, i] = check[0, 0]
-                arr[1, i] = check[1, 0]
-                arr[2, i] = check[2, 0]
-                return i
-
-    # else return -1
-    return -1
-
-
 #------------------------------------------------------------------------------------------------------------------------------------------------
 #------------------------------------------------------------------------------------------------------------------------------------------------
 
 # Declare main() as the main function
 if __name__ == "__main__":
     import sys
-    ret=main()
+    # usage: python main.py [--simulate] [--echo] [number of iterations]
+    args = sys.argv[1:]
+    simulate = '--simulate' in args
+    echo = '--echo' in args
+    args = [arg for arg in args if arg not in ('--simulate', '--echo')]
+    ret=main(int(args[0]), simulate, echo) if args else main(simulate=simulate, echo=echo)
     sys.exit(ret)
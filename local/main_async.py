@@ -0,0 +1,148 @@
+from memory_prediction.memory_predictor import memory_predictor
+from memory_prediction.memory_cache import memory_cache
+from controller import controller
+from scheduler import deadline_scheduler
+from external_intf_async import async_external_interface
+import testing.reading_generator as r_g
+import event_log
+
+import asyncio
+
+# DOCUMENTATION: asyncio version of the central program (main.py). The loop does the same as in main.py, but talks to the
+# remote server through async_external_interface (external_intf_async.py):
+#
+#   - The readings are sent to the server in batches in the background, so the loop does not wait for POST requests.
+#   - The multiple regression prediction is made locally with the copy of the model sent by the server when it was
+#     trained. If the server did not send one, it is requested ahead of time, PREFETCH_MARGIN misses before the miss
+#     threshold is reached. When the threshold is reached the controller uses the prediction if it has arrived,
+#     otherwise it carries on with memory prediction until it does.
+#
+# Hence the time taken by an iteration only depends on local computation (sensors, cache, memory prediction), however
+# slow the server is. The server is only waited on before the loop starts (initialisation, training) and after it ends
+# (end of data stream). As in main.py, the events are recorded in an event log (see event_log.py) written to
+# EVENT_FILE.
+
+#------------------------------------------------------------------------------------------------------
+
+async def main_async():
+    # Set number of iterations
+    count = 165
+
+    #define maximum size of memory cache to limit memory usage
+    MAX_SIZE = 100
+
+    # Define file in which the cache is kept between runs, and how often (in iterations) we make sure it is written to disk.
+    CACHE_FILE = 'cache_snapshot.npy'
+    SNAPSHOT_PERIOD = 20
+
+    # Define resolution of the readings (G, P, A, output) when checking whether they are already in the cache.
+    RESOLUTION = (0.01, 10, 0.5, 0.1)
+
+    cache = memory_cache(MAX_SIZE, CACHE_FILE, resolution = RESOLUTION)
+
+    #define threshold of misses before we need to use multiple regression, and how many misses earlier we request it.
+    MISS_THRESHOLD = 8
+    PREFETCH_MARGIN = 2
+
+    # Define URL of remote server.
+    SERVER_URL = 'http://127.0.0.1:8000'
+    # Define ID of this device on the server, which keeps separate data and models for each device.
+    DEVICE_ID = 'burner0'
+
+    #------------------------------------------------------------------------------------------------
+
+    m_p = memory_predictor()
+    e_i = async_external_interface(SERVER_URL, DEVICE_ID)
+    init_server = await e_i.initialise()
+
+    use_ML = False
+    LR_m, LR_c = 0, 0
+    if init_server:
+        use_ML = await e_i.use_lr()
+
+    if use_ML:
+        LR_m, LR_c, use_ML = await e_i.train_models()
+
+    #----------------------------------------------------------------------------------------------
+
+    # Define time delay in seconds between successive loop iterations
+    DELAY = 0.5
+
+    # Define variable to hold number of iterations
+    iterations = 0
+
+    # The controller uses the local copy of the multiple regression model, or else the prediction prefetched by the
+    # interface, if there is one.
+    prefetch = init_server and e_i.mr_model is None
+    mr_predict = e_i.prediction if init_server else None
+    if e_i.mr_model is not None:
+        mr_predict = e_i.mr_model.predict
+    c = controller(cache, m_p, use_ML, LR_m, LR_c, mr_predict, MISS_THRESHOLD)
+
+    scheduler = deadline_scheduler(DELAY)
+
+    EVENT_FILE = 'events.log'
+    events = event_log.event_log(EVENT_FILE, level = event_log.INFO)
+    event_log.install(events)
+
+    while iterations < count:
+
+        # Receive Sensor Data
+        sensordata = r_g.return_reading(iterations*DELAY, c.gas_aperture)
+
+        # An empty dictionary means the end of the testing schedule has been reached.
+        if not sensordata:
+            event_log.record(event_log.INFO, event_log.END_OF_SCHEDULE)
+            break
+
+        # If the device is off, we do not need to continue with the remaining contents of the loop.
+        if not sensordata['on']:
+            event_log.record(event_log.INFO, event_log.SWITCHED_OFF)
+            iterations += 1
+            await scheduler.async_wait()
+            continue
+
+        # queue the sensor data to be sent to the remote server if listening.
+        if init_server:
+            e_i.send_readings(G=c.gas_aperture, P=sensordata['supply_pressure'], A=sensordata['air_aperture'],
+                              output=sensordata['current_output'])
+
+        gas_aperture = c.step(sensordata)
+
+        # if memory prediction keeps missing, request the multiple regression prediction before it is needed.
+        if use_ML and prefetch and c.misses >= MISS_THRESHOLD - PREFETCH_MARGIN:
+            e_i.request_prediction(sensordata['supply_pressure'], sensordata['air_aperture'], c.required_output)
+
+        event_log.record(event_log.INFO, event_log.ITERATION, iterations, gas_aperture)
+        iterations += 1
+
+        if iterations % SNAPSHOT_PERIOD == 0:
+            cache.flush()
+
+        # wait until the start of the next iteration - the background requests run in the meantime.
+        await scheduler.async_wait()
+
+    event_log.install(None)
+    events.close()
+
+    print(scheduler.report())
+    cache.flush()
+
+    if init_server:
+        # Signal end of data stream once the queued readings have been sent.
+        FILENAME = 'labelled_data'
+        await e_i.end_data(FILENAME)
+
+    # zero return code indicates successful completion
+    return 0
+
+
+
+#------------------------------------------------------------------------------------------------------------------------------------------------
+#------------------------------------------------------------------------------------------------------------------------------------------------
+
+# Declare main_async() as the main function
+if __name__ == "__main__":
+    import sys
+    ret=asyncio.run(main_async())
+    sys.exit(ret)
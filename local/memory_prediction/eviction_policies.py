@@ -0,0 +1,232 @@
+import math
+from collections import OrderedDict
+
+# EVICTION POLICIES: The classes in this module decide which entry the memory cache (memory_cache.py) discards when it
+# is full. The cache keeps the entries themselves; a policy only keeps track of slots (the cache column holding an entry)
+# and, where it needs them, keys (the (G, P, A, output) readings of an entry). Every policy has the same 4 functions:
+
+#   - __init__(self, max_size): Constructor. max_size is the maximum number of entries held in the cache.
+#   - admit(self, slot, key): A new entry has been stored in the given slot.
+#   - hit(self, slot, key): The entry in the given slot has been used (key holds its current readings).
+#   - victim(self, key): Chooses the entry to discard to make room for an entry with the given key (None if there is no
+#                        new entry, e.g. memory_cache.evict()), stops tracking it and returns its slot (-1 if there are
+#                        no entries).
+
+# There are 4 policies, which can be selected by name through POLICIES:
+
+#   - lru_policy ('lru'): Discards the least recently used entry.
+#   - lfu_policy ('lfu'): Discards the least frequently used entry (least recently used in case of a tie).
+#   - arc_policy ('arc'): Adaptive Replacement Cache - balances recently and frequently used entries, adapting the
+#                         balance to the workload using the keys of recently discarded entries.
+#   - coverage_policy ('coverage'): Like LRU, but avoids discarding the only entry for a region of (P, A).
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - All the functions are O(1) (coverage_policy looks at no more than COVERAGE_WINDOW entries when choosing).
+#
+#        - Our burners cycle through the same handful of setpoints. After a long steady period, LRU discards the entries
+#          for the other setpoints, which are exactly the ones we need next. LFU, ARC and the coverage policy keep them.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class lru_policy:
+
+    def __init__(self, max_size):
+        # Slots ordered from least recently used (first) to most recently used (last).
+        self.__order = OrderedDict()
+
+    def admit(self, slot, key):
+        self.__order[slot] = None
+
+    def hit(self, slot, key):
+        self.__order.move_to_end(slot)
+
+    def victim(self, key):
+        if not self.__order:
+            return -1
+        slot, _ = self.__order.popitem(last = False)
+        return slot
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class lfu_policy:
+
+    def __init__(self, max_size):
+        # Number of uses of each slot, and slots grouped by number of uses (each group ordered from least to most
+        # recently used). min_count is the lowest number of uses of any slot.
+        self.__counts = {}
+        self.__groups = {}
+        self.__min_count = 0
+
+    def admit(self, slot, key):
+        self.__counts[slot] = 1
+        self.__groups.setdefault(1, OrderedDict())[slot] = None
+        self.__min_count = 1
+
+    def hit(self, slot, key):
+        count = self.__counts[slot]
+        group = self.__groups[count]
+        del group[slot]
+        if not group:
+            del self.__groups[count]
+            if self.__min_count == count:
+                self.__min_count = count + 1
+
+        self.__counts[slot] = count + 1
+        self.__groups.setdefault(count + 1, OrderedDict())[slot] = None
+
+    def victim(self, key):
+        if not self.__counts:
+            return -1
+
+        group = self.__groups[self.__min_count]
+        slot, _ = group.popitem(last = False)
+        del self.__counts[slot]
+        if not group:
+            del self.__groups[self.__min_count]
+            # the number of distinct counts is small, so finding the next lowest one is cheap.
+            self.__min_count = min(self.__groups) if self.__groups else 0
+        return slot
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# ARC keeps the entries in two lists: T1 (used once recently) and T2 (used at least twice). It also remembers the keys of
+# entries recently discarded from each list (the 'ghost' lists B1 and B2). A new entry whose key is in B1 means T1 should
+# have been larger, one in B2 means T2 should have been larger - the target size of T1 (p) is adjusted accordingly.
+# See Megiddo & Modha, "ARC: A Self-Tuning, Low Overhead Replacement Cache" (2003).
+class arc_policy:
+
+    def __init__(self, max_size):
+        self.__c = max_size
+        self.__p = 0
+        # T1 and T2 map slot to key, B1 and B2 hold keys. All are ordered from least (first) to most recently used.
+        self.__T1, self.__T2 = OrderedDict(), OrderedDict()
+        self.__B1, self.__B2 = OrderedDict(), OrderedDict()
+        # key for which p was adapted by victim(), so that admit() does not adapt it again.
+        self.__adapted = None
+
+    def admit(self, slot, key):
+        # a key found in a ghost list goes straight to T2, since it has been used before.
+        if key in self.__B1 or key in self.__B2:
+            if self.__adapted != key:
+                self.__adapt(key)
+            if key in self.__B1:
+                del self.__B1[key]
+            else:
+                del self.__B2[key]
+            self.__T2[slot] = key
+        else:
+            self.__T1[slot] = key
+            # keep the total number of entries and ghosts within 2*c, and T1 and B1 together within c.
+            if len(self.__T1) + len(self.__B1) > self.__c and self.__B1:
+                self.__B1.popitem(last = False)
+            if len(self.__T1) + len(self.__T2) + len(self.__B1) + len(self.__B2) > 2*self.__c and self.__B2:
+                self.__B2.popitem(last = False)
+        self.__adapted = None
+
+    def hit(self, slot, key):
+        if slot in self.__T1:
+            del self.__T1[slot]
+        else:
+            del self.__T2[slot]
+        self.__T2[slot] = key
+
+    def victim(self, key):
+        if not self.__T1 and not self.__T2:
+            return -1
+
+        # a key in a ghost list adapts p before choosing.
+        if key is not None and (key in self.__B1 or key in self.__B2):
+            self.__adapt(key)
+            self.__adapted = key
+
+        # discard from T1 if it is larger than its target size, otherwise from T2.
+        if self.__T1 and (len(self.__T1) > self.__p or (key in self.__B2 and len(self.__T1) == self.__p) or not self.__T2):
+            slot, old_key = self.__T1.popitem(last = False)
+            self.__B1[old_key] = None
+        else:
+            slot, old_key = self.__T2.popitem(last = False)
+            self.__B2[old_key] = None
+
+        # the ghost lists only need to remember as many keys as the cache holds.
+        if len(self.__B1) > self.__c:
+            self.__B1.popitem(last = False)
+        if len(self.__B2) > self.__c:
+            self.__B2.popitem(last = False)
+        return slot
+
+    # Adjusts the target size of T1 for a key found in a ghost list.
+    def __adapt(self, key):
+        if key in self.__B1:
+            self.__p = min(self.__c, self.__p + max(len(self.__B2)/len(self.__B1), 1))
+        else:
+            self.__p = max(0, self.__p - max(len(self.__B1)/len(self.__B2), 1))
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# The coverage policy divides the (P, A) plane into regions REGION_WIDTH wide on a logarithmic scale (5%, the accuracy
+# window of the memory predictor). It counts the entries in each region and, starting from the least recently used
+# entry, discards the first one which is not the only entry for its region. If all of the COVERAGE_WINDOW least recently
+# used entries are alone in their regions, the least recently used entry is discarded.
+class coverage_policy:
+
+    REGION_WIDTH = 0.05
+    COVERAGE_WINDOW = 64
+
+    def __init__(self, max_size):
+        # Slots ordered from least recently used (first) to most recently used (last), mapped to their regions.
+        self.__order = OrderedDict()
+        self.__counts = {}
+        self.__log_width = math.log(1 + self.REGION_WIDTH)
+
+    def admit(self, slot, key):
+        region = self.__region(key)
+        self.__order[slot] = region
+        self.__counts[region] = self.__counts.get(region, 0) + 1
+
+    def hit(self, slot, key):
+        # the readings of an entry may have been replaced (see memory_cache.lookup), so the region may have changed.
+        region = self.__region(key)
+        if region != self.__order[slot]:
+            self.__uncount(self.__order[slot])
+            self.__counts[region] = self.__counts.get(region, 0) + 1
+            self.__order[slot] = region
+        self.__order.move_to_end(slot)
+
+    def victim(self, key):
+        if not self.__order:
+            return -1
+
+        chosen = None
+        for i, (slot, region) in enumerate(self.__order.items()):
+            if i >= self.COVERAGE_WINDOW:
+                break
+            if self.__counts[region] > 1:
+                chosen = slot
+                break
+        if chosen is None:
+            chosen = next(iter(self.__order))
+
+        self.__uncount(self.__order.pop(chosen))
+        return chosen
+
+    def __region(self, key):
+        P, A = key[1], key[2]
+        if not (P > 0 and A > 0):
+            return None
+        return math.floor(math.log(P)/self.__log_width), math.floor(math.log(A)/self.__log_width)
+
+    def __uncount(self, region):
+        self.__counts[region] -= 1
+        if self.__counts[region] == 0:
+            del self.__counts[region]
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# Policies by name, as accepted by memory_cache.
+POLICIES = {
+    'lru': lru_policy,
+    'lfu': lfu_policy,
+    'arc': arc_policy,
+    'coverage': coverage_policy,
+}
@@ -0,0 +1,538 @@
+import numpy as np
+import math
+import os
+from bisect import bisect_left, bisect_right
+
+from memory_prediction.eviction_policies import POLICIES
+
+# MEMORY_CACHE: This class implements the cache used for memory prediction. The entries are stored column-wise in a
+# preallocated 4 row numpy array (same layout as the old cache array), they are found through hash tables rather than
+# by searching the array, and which entry is discarded when the cache is full is decided by an eviction policy (LRU by
+# default, see eviction_policies.py). The entries are also indexed by supply pressure and air aperture so that the
+# memory predictor can find its upper and lower bounds without scanning the whole cache. Moving an entry to the front is
+# O(1), lookup is O(1) apart from going through the entries with the same key (see notes below), and insertion and
+# eviction are O(1) in Python plus a shift of the spatial index, a memmove of up to max_size slots (O(max_size), but
+# about 10 microseconds for 10000 slots). It has 11 functions:
+
+#   - __init__(self, max_size, filename, policy, resolution): (public) Constructor.
+#   - __len__(self): (public) Number of entries currently held in the cache.
+#   - max_size (property): (public) Maximum number of entries held in the cache.
+#   - data (property): (public) 4 row numpy array holding the cache slots (read by the memory predictor).
+#   - lookup(self, G, P, A, output): (public) Finds an entry matching the provided readings, replacing the values of a
+#                                    near match (same as the old 'search' function in main.py).
+#   - insert(self, G, P, A, output): (public) Adds new readings as the most recently used entry, evicting if full.
+#   - touch(self, slot): (public) Marks the entry in the given slot as the most recently used.
+#   - evict(self): (public) Removes the entry chosen by the eviction policy.
+#   - neighbours(self, P, A, accuracy, output): (public) Finds the entries with the closest outputs above and below the
+#                                               provided output, among entries with similar P and A.
+#   - flush(self): (public) Writes the cache to its snapshot file on disk (if it has one).
+#   - __restore(self, indexed): (private) Recovers the recency order from a snapshot file and rebuilds the eviction
+#                               policy (O(n)), and the hash tables and spatial index if they were not saved with it.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - Entries never move once written. The column an entry is stored in (its 'slot') is what the other functions
+#          receive and return. Evicted slots are filled with NaN (so any comparison against them fails and scans over
+#          'data' skip them naturally) and reused by the next insertion.
+#
+#        - An entry matches new readings when the output values are the same and at least two of the three other
+#          parameters (G, P, A) are the same. Hence we keep three hash tables, one for each pair of parameters, keyed on
+#          (output, parameter 1, parameter 2). If only one parameter is different, the entry takes the new values. The
+#          hash tables are numpy arrays of slots (open addressing with linear probing, at most half full), so that they
+#          can be kept in a file - the key of a slot is worked out from its quantised values, which are kept as well.
+#          Several entries can have the same key (e.g. same output and P, different G and A), so each hash table holds
+#          the last entry added with a key, and the entries with the same key are chained through an array of the next
+#          slot of each slot. Removing an entry only unlinks its own slot from the chain, so the others are still found.
+#
+#        - Readings are compared after quantising them to the resolution given for each parameter (G, P, A, output) on
+#          instantiation, so that readings which only differ by sensor noise match the same entry instead of filling the
+#          cache with near duplicates. A quantised value is the nearest multiple of the resolution; a resolution of None
+#          or 0 means the values have to be exactly the same. The hash tables are keyed on quantised values, and when
+#          new readings match an entry, the entry takes the values of the new readings (the latest measurement).
+#          The eviction policy also receives quantised readings as keys.
+#
+#        - If several entries match, the most recently used one is returned, as the old linear search (which went
+#          through the cache from the front) would have done. For this we record a usage stamp for every slot, and
+#          lookup goes through the chains of the three keys of the readings for the highest stamp.
+#
+#        - The spatial index divides the (P, A) plane into cells which are CELL_WIDTH wide on a logarithmic scale (i.e. a
+#          cell spans a fixed percentage of the value, like the accuracy windows used by the memory predictor). It is an
+#          array of the slots sorted by cell and then by output (with arrays of their cells and outputs alongside), so a
+#          bound is found by a bisect in each of the few cells that overlap the accuracy window, instead of a scan over
+#          all entries. Adding or removing an entry shifts the entries after it (a memmove of at most max_size slots).
+#          Entries with P or A <= 0 are never within the accuracy window of a reading, so they are not indexed.
+#
+#        - If a filename is provided, the slots and usage stamps are kept in a memory-mapped .npy file (rows 0-3 are the
+#          slots, row 4 the stamps) rather than in memory, so the file is always a snapshot of the cache. flush() makes
+#          sure it has reached the disk. On the next start, the file is mapped again without being parsed or copied, and
+#          the recency order is recovered from the stamps. If the file was written with a different maximum size, the
+#          most recently used entries are carried over into a new file. The eviction policy is rebuilt by admitting the
+#          entries from least to most recently used, so any other state it had (e.g. LFU use counts) starts afresh.
+#          This is the one part of a restart which is O(n) in Python, as the policies keep their state in Python
+#          structures rather than arrays (about 2 ms for 1000 entries, 10 ms for 10000 and 70 ms for 100000 - see
+#          test_memory_cache.py).
+#
+#        - The hash tables and the spatial index are kept in a second memory-mapped file next to the snapshot
+#          ('<name>.index.npy'), and mapped again on the next start as well. Its header records whether it was saved by
+#          flush() with no change since: if not (e.g. the program stopped in between), or if it was written for a
+#          different maximum size, snapshot file or version of Python (the hash tables use Python's hash of the keys),
+#          they are rebuilt in one pass over the entries instead.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class memory_cache:
+
+    # INDEX 0 - absolute position of actuator (gas aperture size) is the first array in cache
+    # INDEX 1 - measured fuel gas supply pressure is the second array in cache
+    # INDEX 2 - air aperture size is the third array in cache
+    # INDEX 3 - corresponding output value is third array in cache
+    GAS_APERTURE, PRESSURE, AIR_APERTURE, OUTPUT = 0, 1, 2, 3
+
+    # Pairs of parameters for which we keep a hash table (see notes above).
+    PAIRS = ((GAS_APERTURE, PRESSURE), (GAS_APERTURE, AIR_APERTURE), (PRESSURE, AIR_APERTURE))
+
+    # Relative width of the cells of the spatial index (2%) - finer than the 5% accuracy window of the memory predictor.
+    CELL_WIDTH = 0.02
+
+    # Layout of the index file: a header of INDEX_HEADER values (INDEX_VERSION, maximum size, HASH_CHECK, whether it was
+    # saved by flush(), number of indexed entries), then the hash tables, the spatial index (slots, cells and outputs),
+    # the quantised values of the slots and the chains of slots with the same key.
+    INDEX_VERSION = 2
+    INDEX_HEADER = 8
+    VERSION, SIZE, HASH, CLEAN, INDEXED = 0, 1, 2, 3, 4
+    HASH_CHECK = hash((0.5, 100000.0, -2.25))
+
+#--------------------------------------------------------------------------------------------------------------------
+    # CONSTRUCTOR: max_size is the maximum number of entries held in the cache. filename is the snapshot file used to keep
+    # the cache across restarts (None to keep the cache in memory only). policy is the eviction policy - a name from
+    # eviction_policies.POLICIES or a policy class. resolution is a tuple of the resolutions of (G, P, A, output) used to
+    # match readings (see notes above) - None to match exact values only.
+    def __init__(self, max_size, filename=None, policy='lru', resolution=None):
+        self.__max_size = max_size
+        self.__resolution = tuple(resolution) if resolution is not None else (None, None, None, None)
+        # Preallocated storage for the entries (rows 0-3) and their usage stamps (row 4). Unused slots hold NaN. The
+        # higher the stamp, the more recently the slot was used.
+        self.__storage, restored = self.__open(filename)
+        # (plain arrays - slicing a memmap object is slow - sharing the memory of the storage.)
+        self.__data = self.__storage.view(np.ndarray)[:4]
+        self.__stamps = self.__storage.view(np.ndarray)[4]
+        self.__clock = 0
+        # Number of slots written so far (slots beyond this have never been used) and slots freed by eviction.
+        self.__used = 0
+        self.__free = []
+        # Eviction policy, and number of entries currently held.
+        self.__policy = POLICIES.get(policy, policy)(max_size)
+        self.__count = 0
+        self.__log_width = math.log(1 + self.CELL_WIDTH)
+
+        # Hash tables and spatial index (see notes above), in memory or memory-mapped from the index file.
+        self.__table_size = 1 << max(1, 2*max_size - 1).bit_length()
+        self.__index, indexed = self.__open_index(filename, restored)
+        index = self.__index.view(np.ndarray)
+        self.__header = index[:self.INDEX_HEADER]
+        end = self.INDEX_HEADER + 3*self.__table_size
+        # One hash table per pair of parameters: the slot of each key (output, parameter 1, parameter 2), -1 if empty.
+        self.__keys = index[self.INDEX_HEADER:end].reshape(3, self.__table_size)
+        # Indexed slots, sorted by (cell, output, slot), and the cell and output of each one.
+        self.__order = index[end:end + max_size]
+        self.__order_cells = index[end + max_size:end + 2*max_size]
+        self.__order_outputs = index[end + 2*max_size:end + 3*max_size].view(np.float64)
+        # Quantised values of the slots.
+        self.__quantised = index[end + 3*max_size:end + 7*max_size].view(np.float64).reshape(4, max_size)
+        # For each hash table, the next slot with the same key as each slot (-1 at the end of the chain).
+        self.__chains = index[end + 7*max_size:].reshape(3, max_size)
+        # whether the index file has not changed since it was saved by flush().
+        self.__clean = indexed
+        # memoryviews of the arrays, which are much faster than numpy for reading or writing one value at a time.
+        self.__key_views = [memoryview(table) for table in self.__keys]
+        self.__quantised_views = [memoryview(row) for row in self.__quantised]
+        self.__chain_views = [memoryview(chain) for chain in self.__chains]
+        self.__order_view = memoryview(self.__order)
+        self.__cells_view = memoryview(self.__order_cells)
+        self.__outputs_view = memoryview(self.__order_outputs)
+        self.__data_views = [memoryview(row) for row in self.__data]
+
+        # if the snapshot file already holds entries, pick up where we left off.
+        if filename is not None:
+            self.__restore(indexed)
+        else:
+            self.__reset_index()
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    def __len__(self):
+        return self.__count
+
+    @property
+    def max_size(self):
+        return self.__max_size
+
+    # Only the slots written so far are returned. This is a view, so writing to it changes the cache.
+    @property
+    def data(self):
+        return self.__data[:, :self.__used]
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # LOOKUP: Returns the slot of the entry matching the provided readings or -1 if there is no such entry. If the entry
+    # only matches on two of the parameters G, P and A, its values are replaced with the provided ones. The entry is not
+    # moved to the front - call touch() for that.
+    def lookup(self, G, P, A, output):
+        values = (G, P, A, output)
+        slot = -1
+
+        stamps = self.__stamps
+        for pair, key in enumerate(self.__pair_keys(values)):
+            found = self.__key_views[pair][self.__find(pair, key)]
+            chain = self.__chain_views[pair]
+            # in case several entries match, keep the most recently used
+            while found >= 0:
+                if slot < 0 or stamps[found] > stamps[slot]:
+                    slot = found
+                found = chain[found]
+
+        # in case only one parameter is different (or the values are only the same once quantised), we have to replace
+        # the values
+        if slot >= 0 and (self.__data[self.GAS_APERTURE, slot] != G or self.__data[self.PRESSURE, slot] != P or
+                          self.__data[self.AIR_APERTURE, slot] != A or self.__data[self.OUTPUT, slot] != output):
+            self.__remove_entry(slot)
+            self.__data[:, slot] = values
+            self.__add_entry(slot)
+
+        return slot
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # INSERT: Stores the provided readings in the cache as the most recently used entry and returns its slot. If the
+    # cache is full, the entry chosen by the eviction policy is evicted to make room.
+    def insert(self, G, P, A, output):
+        if self.__count >= self.__max_size:
+            self.__discard(self.__policy.victim(self.__quantise((G, P, A, output))))
+
+        # reuse a freed slot if there is one, otherwise take the next unused one.
+        if self.__free:
+            slot = self.__free.pop()
+        else:
+            slot = self.__used
+            self.__used += 1
+
+        self.__data[:, slot] = (G, P, A, output)
+        self.__add_entry(slot)
+        self.__count += 1
+        self.__policy.admit(slot, self.__quantise((G, P, A, output)))
+        self.__stamp(slot)
+        return slot
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # TOUCH: Moves the entry in the provided slot to the front of the cache (most recently used).
+    def touch(self, slot):
+        self.__policy.hit(slot, self.__quantise(self.__data[:, slot].tolist()))
+        self.__stamp(slot)
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # EVICT: Removes the entry chosen by the eviction policy (for LRU, the least recently used entry) and returns its
+    # (now free) slot. Returns -1 if the cache is empty.
+    def evict(self):
+        return self.__discard(self.__policy.victim(None))
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # NEIGHBOURS: Among the entries whose supply pressure and air aperture are within the provided relative accuracy of P
+    # and A, finds the entry with the lowest output above the provided output and the entry with the highest output below
+    # it. Returns the slots of these two entries as a tuple (upper, lower), with -1 for an entry that does not exist.
+    # Ties are resolved in favour of the lowest slot, so the result is the same as scanning 'data' from the first slot.
+    def neighbours(self, P, A, accuracy, output):
+        upper, lower = None, None
+
+        # a reading with P or A <= 0 cannot have any entries within its accuracy window.
+        if not (P > 0 and A > 0):
+            return -1, -1
+
+        # find the range of cells overlapping the accuracy window (widened very slightly so that rounding in the
+        # logarithms can never leave out a cell).
+        P_cells = range(self.__cell(P*(1 - accuracy)*(1 - 1e-9)), self.__cell(P*(1 + accuracy)*(1 + 1e-9)) + 1)
+        A_cells = range(self.__cell(A*(1 - accuracy)*(1 - 1e-9)), self.__cell(A*(1 + accuracy)*(1 + 1e-9)) + 1)
+
+        cells, order, outputs = self.__cells_view, self.__order_view, self.__outputs_view
+        pressures, apertures = self.__data_views[self.PRESSURE], self.__data_views[self.AIR_APERTURE]
+        count = int(self.__header[self.INDEXED])
+
+        for P_cell in P_cells:
+            # the cells of P_cell within A_cells are next to each other in the spatial index.
+            first = bisect_left(cells, self.__cell_number(P_cell, A_cells[0]), 0, count)
+            end = bisect_right(cells, self.__cell_number(P_cell, A_cells[-1]), first, count)
+
+            # entries first to last of each cell (sorted by (output, slot)).
+            while first < end:
+                last = bisect_right(cells, cells[first], first, end)
+
+                # Upper bound: walk up from the first entry with a higher output until one is within the window.
+                # Since entries are sorted by (output, slot), the first one found is the best in this cell.
+                for i in range(bisect_right(outputs, output, first, last), last):
+                    slot = order[i]
+                    if self.__within(pressures[slot], apertures[slot], P, A, accuracy):
+                        if upper is None or (outputs[i], slot) < upper:
+                            upper = (outputs[i], slot)
+                        break
+
+                # Lower bound: walk down from the last entry with a lower output until one is within the window. Entries
+                # with the same output further down have lower slots, so we keep going while the output stays the same.
+                best = None
+                for i in range(bisect_left(outputs, output, first, last) - 1, first - 1, -1):
+                    if best is not None and outputs[i] != best[0]:
+                        break
+                    slot = order[i]
+                    if self.__within(pressures[slot], apertures[slot], P, A, accuracy):
+                        best = (outputs[i], slot)
+                if best is not None and (lower is None or (-best[0], best[1]) < (-lower[0], lower[1])):
+                    lower = best
+
+                first = last
+
+        return (upper[1] if upper is not None else -1), (lower[1] if lower is not None else -1)
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # FLUSH: Writes any changes to the cache that are still in memory to the snapshot file and the index file, and marks
+    # the index file as saved. Nothing to do if there is no snapshot file.
+    def flush(self):
+        if isinstance(self.__storage, np.memmap):
+            self.__storage.flush()
+            self.__index.flush()
+            # only once everything else has reached the disk.
+            self.__header[self.CLEAN] = 1
+            self.__index.flush()
+            self.__clean = True
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # Opens (or creates) the storage for the cache - in memory, or memory-mapped from the snapshot file. Returns the
+    # storage and whether it was mapped from an existing snapshot file.
+    def __open(self, filename):
+        shape = (5, self.__max_size)
+        if filename is None:
+            storage = np.full(shape, np.nan)
+            storage[4] = 0
+            return storage, False
+
+        old = None
+        if os.path.exists(filename):
+            storage = np.load(filename, mmap_mode = 'r+')
+            if storage.shape == shape and storage.dtype == np.float64:
+                return storage, True
+            # the maximum size has changed - read the old snapshot into memory before it is overwritten below.
+            old = np.array(storage, dtype = np.float64)
+            del storage
+
+        storage = np.lib.format.open_memmap(filename, mode = 'w+', dtype = np.float64, shape = shape)
+        storage[:4] = np.nan
+        storage[4] = 0
+
+        if old is not None and old.shape[0] == 5:
+            # carry over the most recently used entries (highest stamps) of the old snapshot.
+            slots = np.flatnonzero(~np.isnan(old[self.OUTPUT]))
+            slots = slots[np.argsort(old[4, slots], kind = 'stable')][-self.__max_size:]
+            storage[:, :len(slots)] = old[:, slots]
+
+        storage.flush()
+        return storage, False
+
+    # Opens (or creates) the index file of the snapshot file (in memory if there is no snapshot file). Returns the index
+    # and whether it can be used as it is - saved by flush() for this snapshot file (restored from an existing file), the
+    # same maximum size and the same hash function. Otherwise it has to be reset and rebuilt.
+    def __open_index(self, filename, restored):
+        size = self.INDEX_HEADER + 3*self.__table_size + 10*self.__max_size
+        if filename is None:
+            return np.zeros(size, dtype = np.int64), False
+
+        path = os.path.splitext(filename)[0] + '.index.npy'
+        if restored and os.path.exists(path):
+            index = np.load(path, mmap_mode = 'r+')
+            if index.shape == (size,) and index.dtype == np.int64:
+                header = index[:self.INDEX_HEADER]
+                return index, bool(header[self.VERSION] == self.INDEX_VERSION and header[self.SIZE] == self.__max_size and
+                                   header[self.HASH] == self.HASH_CHECK and header[self.CLEAN] == 1)
+            del index
+        return np.lib.format.open_memmap(path, mode = 'w+', dtype = np.int64, shape = (size,)), False
+
+    # Empties the hash tables and the spatial index.
+    def __reset_index(self):
+        self.__header[:] = 0
+        self.__header[self.VERSION] = self.INDEX_VERSION
+        self.__header[self.SIZE] = self.__max_size
+        self.__header[self.HASH] = self.HASH_CHECK
+        self.__keys[:] = -1
+        self.__quantised[:] = np.nan
+        self.__chains[:] = -1
+        self.__clean = False
+
+    # RESTORE (private): recovers everything that is not kept in the snapshot file and the index file (see notes above).
+    # indexed tells whether the index file could be used as it is.
+    def __restore(self, indexed):
+        slots = np.flatnonzero(~np.isnan(self.__data[self.OUTPUT]))
+        # the index should hold exactly the entries with P and A > 0.
+        if indexed and int(self.__header[self.INDEXED]) != np.count_nonzero(
+                (self.__data[self.PRESSURE, slots] > 0) & (self.__data[self.AIR_APERTURE, slots] > 0)):
+            indexed = False
+        if not indexed:
+            self.__reset_index()
+        if len(slots) == 0:
+            return
+
+        self.__used = int(slots[-1]) + 1
+        # slots below the last one in use which hold NaN were freed by eviction.
+        in_use = np.zeros(self.__used, dtype = bool)
+        in_use[slots] = True
+        self.__free = np.flatnonzero(~in_use).tolist()
+
+        # least recently used first, same as if the entries had been inserted in that order.
+        slots = slots[np.argsort(self.__stamps[slots], kind = 'stable')]
+        if not indexed:
+            for slot in slots.tolist():
+                self.__add_entry(slot)
+        # the quantised values of the slots are in the index.
+        for slot, key in zip(slots.tolist(), self.__quantised[:, slots].T.tolist()):
+            self.__policy.admit(slot, tuple(key))
+        self.__count = len(slots)
+        self.__clock = int(self.__stamps[slots].max())
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # Helper functions to maintain the usage stamps, the hash tables and the spatial index.
+    def __stamp(self, slot):
+        self.__clock += 1
+        self.__stamps[slot] = self.__clock
+
+    # removes the entry in a slot chosen by the eviction policy, freeing the slot.
+    def __discard(self, slot):
+        if slot < 0:
+            return -1
+        self.__remove_entry(slot)
+        self.__data[:, slot] = np.nan
+        self.__free.append(slot)
+        self.__count -= 1
+        return slot
+
+    # quantised readings - each value rounded to the nearest multiple of its resolution.
+    def __quantise(self, values):
+        return tuple(value if not res else round(value/res)*res for value, res in zip(values, self.__resolution))
+
+    def __pair_keys(self, values):
+        values = self.__quantise(values)
+        return [(values[self.OUTPUT], values[a], values[b]) for a, b in self.PAIRS]
+
+    def __add_entry(self, slot):
+        self.__modified()
+        values = self.__data[:, slot].tolist()
+        self.__quantised[:, slot] = self.__quantise(values)
+        for pair, key in enumerate(self.__pair_keys(values)):
+            # goes in front of the chain of entries which already have the key (if any)
+            position = self.__find(pair, key)
+            self.__chain_views[pair][slot] = self.__key_views[pair][position]
+            self.__key_views[pair][position] = slot
+
+        cell = self.__cell_key(values)
+        if cell is not None:
+            count = int(self.__header[self.INDEXED])
+            start = bisect_left(self.__cells_view, cell, 0, count)
+            end = bisect_right(self.__cells_view, cell, start, count)
+            # position of the entry in the cell, sorted by (output, slot).
+            output = values[self.OUTPUT]
+            i = bisect_left(self.__outputs_view, output, start, end)
+            while i < end and self.__outputs_view[i] == output and self.__order_view[i] < slot:
+                i += 1
+            for array, value in ((self.__order, slot), (self.__order_cells, cell), (self.__order_outputs, output)):
+                array[i + 1:count + 1] = array[i:count]
+                array[i] = value
+            self.__header[self.INDEXED] = count + 1
+
+    def __remove_entry(self, slot):
+        self.__modified()
+        values = self.__data[:, slot].tolist()
+        for pair, key in enumerate(self.__pair_keys(values)):
+            # unlink the slot from the chain of its key, leaving the other entries with the key in place.
+            position = self.__find(pair, key)
+            table, chain = self.__key_views[pair], self.__chain_views[pair]
+            if table[position] == slot:
+                if chain[slot] >= 0:
+                    table[position] = chain[slot]
+                else:
+                    self.__delete(pair, position)
+            else:
+                previous = table[position]
+                while chain[previous] != slot:
+                    previous = chain[previous]
+                chain[previous] = chain[slot]
+
+        cell = self.__cell_key(values)
+        if cell is not None:
+            count = int(self.__header[self.INDEXED])
+            start = bisect_left(self.__cells_view, cell, 0, count)
+            end = bisect_right(self.__cells_view, cell, start, count)
+            i = bisect_left(self.__outputs_view, values[self.OUTPUT], start, end)
+            while self.__order_view[i] != slot:
+                i += 1
+            for array in (self.__order, self.__order_cells, self.__order_outputs):
+                array[i:count - 1] = array[i + 1:count]
+            self.__header[self.INDEXED] = count - 1
+
+    # Returns the position of the key in the hash table of the given pair, or the empty position where it would go.
+    def __find(self, pair, key):
+        a, b = self.PAIRS[pair]
+        table = self.__key_views[pair]
+        outputs, first, second = (self.__quantised_views[i] for i in (self.OUTPUT, a, b))
+        mask = self.__table_size - 1
+        position = hash(key) & mask
+        while True:
+            slot = table[position]
+            if slot < 0 or (outputs[slot] == key[0] and first[slot] == key[1] and second[slot] == key[2]):
+                return position
+            position = (position + 1) & mask
+
+    # Empties a position of the hash table of the given pair, moving back the slots after it which would otherwise no
+    # longer be found (so that the table needs no markers for removed keys).
+    def __delete(self, pair, position):
+        a, b = self.PAIRS[pair]
+        table = self.__key_views[pair]
+        outputs, first, second = (self.__quantised_views[i] for i in (self.OUTPUT, a, b))
+        mask = self.__table_size - 1
+        hole = position
+        position = (position + 1) & mask
+        while table[position] >= 0:
+            slot = table[position]
+            home = hash((outputs[slot], first[slot], second[slot])) & mask
+            # the slot can fill the hole unless the hole comes before its home position.
+            if (position - home) & mask >= (position - hole) & mask:
+                table[hole] = slot
+                hole = position
+            position = (position + 1) & mask
+        table[hole] = -1
+
+    # marks the index file as changed since it was saved.
+    def __modified(self):
+        if self.__clean:
+            self.__header[self.CLEAN] = 0
+            self.__clean = False
+
+    def __cell(self, value):
+        return math.floor(math.log(value)/self.__log_width)
+
+    # the cells of P and A as one number, in the same order as (P cell, A cell) - the number of cells of A is well below
+    # 2**20 for any positive float.
+    def __cell_number(self, P_cell, A_cell):
+        return P_cell*2**20 + A_cell + 2**19
+
+    def __cell_key(self, values):
+        P, A = values[self.PRESSURE], values[self.AIR_APERTURE]
+        if not (P > 0 and A > 0):
+            return None
+        return self.__cell_number(self.__cell(P), self.__cell(A))
+
+    # Same check as the memory predictor carries out on the readings: relative error in P and A below the accuracy.
+    def __within(self, entry_P, entry_A, P, A, accuracy):
+        return abs(entry_P - P)/P < accuracy and abs(entry_A - A)/A < accuracy
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
@@ -1,15 +1,22 @@
 import numpy as np
 
+from memory_prediction.memory_cache import memory_cache
+import event_log
+
 #####VERIFIED#####
 
 # MEMORY_PREDICTOR: This class is intended to predict the reauired fuel gas aperture size (i.e. actuator position) for
-# a given required output with the help of an LRU cache (implemented with a numpy array). It has 3 functions:
+# a given required output with the help of an LRU cache (implemented in memory_cache.py). It has 4 functions:
+
+#   - __init(self, search_method, fuel_accuracy, reading_accuracy)__ : Constructor.
 
-#   - __init(self)__ : (line 25) Constructor.
+#   - actuator_predict(self, context, req_output, cache): (public): Performs the actual prediction and cache manipulation
 
-#   - actuator_predict(self, context, req_output, data): (public, line 32): Performs the actual prediction and cache manipulation
+#   - batch_actuator_predict(self, contexts, req_outputs, caches): (public): Performs the prediction for several
+#                                                                  burners at once with numpy array operations.
 
-#   - shuffle(self, data, index): (public, line 180): Helper function for manipulating cache.
+#   - __vector_bounds(self, data, P, A, req_output, ...): (private): Finds the upper and lower bounds with numpy
+#                                                         array operations.
 
 #---------------------------------------------------------------------------------------------------------------------
 
@@ -21,25 +28,45 @@ import numpy as np
 #        - No sudden changes are expected in the other parameters. They will be flagged in the main program if there is
 #          sudden change/ they fall below a particular threshold value.
 
+#        - There are two ways of finding the upper and lower bounds in the cache, selected on instantiation. 'index' uses
+#          the spatial index of the cache, whose cost does not grow with cache size. 'vector' scans all the cache slots at
+#          once with numpy array operations. Both give the same results as scanning the slots one by one.
+
 #--------------------------------------------------------------------------------------------------------------------
 
 class memory_predictor:
 
-#--------------------------------------------------------------------------------------------------------------------
-    # CONSTRUCTOR : There are no instance variables to initialise.
-    def __init__(self):
-        pass
+    #we know required accuracy in fuel apeture and other readings is 5% and set it as below:
+    FUEL_ACCURACY = 0.05
+    READING_ACCURACY = 0.05
 
+#--------------------------------------------------------------------------------------------------------------------
+    # CONSTRUCTOR : search_method selects how the upper and lower bounds are found in the cache - 'index' (default)
+    # or 'vector' (see notes above). fuel_accuracy and reading_accuracy replace the default accuracies above for this
+    # predictor (e.g. when tuning them with sweep.py).
+    def __init__(self, search_method='index', fuel_accuracy=None, reading_accuracy=None):
+        if search_method not in ('index', 'vector'):
+            raise ValueError("search_method must be 'index' or 'vector'")
+        self.__search_method = search_method
+        if fuel_accuracy is not None:
+            self.FUEL_ACCURACY = fuel_accuracy
+        if reading_accuracy is not None:
+            self.READING_ACCURACY = reading_accuracy
+
+        # Statistics: number of times the cache was searched (the output was not already in the required range), and how
+        # many of these found a "close enough" estimate in the cache (cache hits).
+        self.searches = 0
+        self.hits = 0
 
 #--------------------------------------------------------------------------------------------------------------------
 
     # ACTUATOR PREDICTOR: function receives required output value (req_output), current contextual values
     # (context, containing supply pressure, air aperture size, and fuel gas aperture size controlled by actuator)
-    # and the LRU cache (data - a 4 row numpy array with max 1000 columns) by reference and returns required
-    # adjustment of the size of the aperture supplying fuel gas by searching the cache. Required accuracy in output
-    # is 5%. In case there isn't a good enough match, linear extrapolation is employed between the two nearest
-    # guesses (upper and lower) in the cache.
-    def actuator_predict(self, context, req_output, data):
+    # and the LRU cache (cache - a memory_cache object) by reference and returns required adjustment of the size
+    # of the aperture supplying fuel gas by searching the cache. Required accuracy in output is 5%. In case there
+    # isn't a good enough match, linear extrapolation is employed between the two nearest guesses (upper and lower)
+    # in the cache.
+    def actuator_predict(self, context, req_output, cache):
 
         # INDEX 0 - absolute position of actuator (gas aperture size) is the first array in cache
         # INDEX 1 - measured fuel gas supply pressure is the second array in cache
@@ -50,9 +77,9 @@ class memory_predictor:
         #define maximum size of above data structures to limit memory usage
         MAX_SIZE = 1000
 
-        #we know required accuracy in fuel apeture and other readings is 5% and set it as below:
-        FUEL_ACCURACY = 0.05
-        READING_ACCURACY = 0.05
+        #required accuracy in fuel apeture and other readings (see top of class)
+        FUEL_ACCURACY = self.FUEL_ACCURACY
+        READING_ACCURACY = self.READING_ACCURACY
 
         # store values of context in variables for ease:
         gas_aperture = context['gas_aperture']
@@ -60,17 +87,21 @@ class memory_predictor:
         air_aperture = context['air_aperture']
 
         current_output = context['current_output']
+
+        # the cache slots, in the same 4 row layout as described above (NaN in slots which are not in use).
+        data = cache.data
     #-----------------------------------------------------------------------------------------
         # First, we will check if the output value falls in the required range, and if so indicate no adjustment is needed.
         if abs(current_output - req_output)/req_output < FUEL_ACCURACY:
-            print("value found")
+            event_log.record(event_log.DEBUG, event_log.VALUE_FOUND)
             return 0
 
+        self.searches += 1
+
         #---------------------------------------------------------------------------
-        # If not, we iterate over OUTPUT row in the numpy array to find if a close enough approximation to the
-        # required output exists. To do this, we find the stored positions of actuator that will give closest
-        # approximation of output - upper and lower bound. If the closest of these two falls within the required
-        # accuracy, then this is the position we return.
+        # If not, we search the cache to find if a close enough approximation to the required output exists. To do this,
+        # we find the stored positions of actuator that will give closest approximation of output - upper and lower bound.
+        # If the closest of these two falls within the required accuracy, then this is the position we return.
         # Else, we assume a linear scale between upper and lower bound to calculate required actuator position
 
         # If no values are stored in the array, the upper and lower bound of position will be 100 and 0 respectively.
@@ -79,33 +110,21 @@ class memory_predictor:
         # We set bounds on the output. We select a large value for the output that will not ever be surpassed.
         output_upper_bound, output_lower_bound = 1000000, 0
 
-        # We want indices of the upper and lower bounds of position/output. -1 at the end of all iterations
-        # indicates that the data structure currently has no data.
-        upper_bound_index, lower_bound_index = -1, -1
+        # We want indices of the upper and lower bounds of position/output, i.e. the entries with the closest outputs
+        # above and below the required output among those with similar measured conditions (supply pressure and air
+        # aperture within READING_ACCURACY). -1 indicates there is no such entry.
+        if self.__search_method == 'vector':
+            upper_bound_index, lower_bound_index = self.__vector_bounds(data, supply_pressure, air_aperture, req_output,
+                                                                        READING_ACCURACY, output_upper_bound, output_lower_bound)
+        else:
+            upper_bound_index, lower_bound_index = cache.neighbours(supply_pressure, air_aperture, READING_ACCURACY, req_output)
 
-        # we store the error of our best estimate in 'out_error'. We initialise it to 'req_output' as this is the maximum possible value
-        # it can hold.
-        out_error = req_output
-
-        # iterate over elements in data structure
-        for i in range(0, len(data[OUTPUT])):
-            # find errors in data structure values wrt input parameters
-            pressure_error = abs(data[PRESSURE, i] - supply_pressure)
-            air_error = abs(data[AIR_APERTURE, i] - air_aperture)
-
-            # first check if measured conditions are similar
-            if pressure_error/supply_pressure < READING_ACCURACY and air_error/air_aperture < READING_ACCURACY:
-
-                #---------------------------------------
-                # Set index of best upper bound
-                if data[OUTPUT, i] > req_output and data[OUTPUT, i] < output_upper_bound:
-                    output_upper_bound = data[OUTPUT, i]
-                    upper_bound_index = i
-                #----------------------------------------
-                # Set index of best lower bound
-                elif data[OUTPUT, i] < req_output and data[OUTPUT, i] > output_lower_bound:
-                    output_lower_bound = data[OUTPUT, i]
-                    lower_bound_index = i
+            # the closest entries must also fall within the output bounds set above.
+            if upper_bound_index >= 0 and data[OUTPUT, upper_bound_index] >= output_upper_bound:
+                upper_bound_index = -1
+
+            if lower_bound_index >= 0 and data[OUTPUT, lower_bound_index] <= output_lower_bound:
+                lower_bound_index = -1
 
         # at this point, we have the lower and upper bounds. We initialise upper and lower bound errors to ridiculously large
         # values so that in case the data structure is empty we will go into case 3 below.
@@ -125,34 +144,31 @@ class memory_predictor:
         if upper_bound_error/req_output < FUEL_ACCURACY and upper_bound_error < lower_bound_error:
             #store required position and flow rate in variables (prepare to reshuffle data structures)
             req_position = data[GAS_APERTURE, upper_bound_index]
-            #call shuffle function defined below to ensure we follow the LRU algorithm
-            self.shuffle(data, upper_bound_index)
+            #move entry to the front of the cache to ensure we follow the LRU algorithm
+            cache.touch(upper_bound_index)
+            self.hits += 1
         #----------------------------------------------------
 
         #CASE 2: DATA STRUCTURE HAS A "CLOSE ENOUGH" ESTIMATE AND THE LOWER BOUND IS CLOSEST
         elif lower_bound_error/req_output < FUEL_ACCURACY:
             #store required position and flow rate in variables (prepare to reshuffle data structures)
             req_position = data[GAS_APERTURE, lower_bound_index]
-            #call shuffle function defined below to ensure we follow the LRU algorithm
-            self.shuffle(data, lower_bound_index)
+            #move entry to the front of the cache to ensure we follow the LRU algorithm
+            cache.touch(lower_bound_index)
+            self.hits += 1
         #----------------------------------------------------
 
         #CASE 3: DATA STRUCTURE DOES NOT HAVE A GOOD ENOUGH ESTIMATE
         else:
             if upper_bound_index >= 0:
                 max_position = data[GAS_APERTURE, upper_bound_index]
-                # Call shuffle function to ensure we follow the LRU algorithm.
-                self.shuffle(data, upper_bound_index)
-
-            # since we shuffled we may need to add 1 to the lower bound index to
-            # ensure it points to the same required values
-            if lower_bound_index >= 0 and lower_bound_index < upper_bound_index:
-                lower_bound_index += 1
+                # Move entry to the front to ensure we follow the LRU algorithm.
+                cache.touch(upper_bound_index)
 
             if lower_bound_index >= 0:
                 min_position = data[GAS_APERTURE, lower_bound_index]
-                # Call shuffle function to ensure we follow the LRU algorithm.
-                self.shuffle(data, lower_bound_index)
+                # Move entry to the front to ensure we follow the LRU algorithm.
+                cache.touch(lower_bound_index)
 
             # We estimate the required position of actuator by assuming a linear relationship with gas aperture
             # between upper and lower bound points.
@@ -169,36 +185,129 @@ class memory_predictor:
 
         # return adjustment rounded to two decimal places (required return result same in either case)
         adjustment = req_position - gas_aperture
-        print("ADJUSTMENT: " + str(adjustment))
+        event_log.record(event_log.INFO, event_log.ADJUSTMENT, a = adjustment)
         return adjustment
 
 #--------------------------------------------------------------------------------------------------------------------
 
-    # SHUFFLE: Function used to shuffle sub-arrays in data structure. It is called in actuator_predict
-    # to help implement the LRU algorithm. Given a 2-dimensional numpy array (data) and a positive index
-    # (index), it moves the element at this index to position zero in each sub-array. The elements having
-    # index lower than the provided index in each list are all "shifted to the right" to fill up the
-    # "gaps" left by the selected elements that have been moved out in each sub-array.
+    # BATCH ACTUATOR PREDICTOR: performs the same prediction as actuator_predict for K burners in one call, using numpy
+    # array operations over all the burners at once. It receives:
+    #   - contexts: 4xK numpy array with the gas aperture, supply pressure, air aperture and current output of each burner
+    #               (one column per burner, rows in the same order as the cache).
+    #   - req_outputs: numpy array of the K required output values.
+    #   - caches: list of the K memory_cache objects of the burners, or a single memory_cache object shared by all of them.
+    # Returns a numpy array of the K adjustments, each the same as actuator_predict would return for that burner. The LRU
+    # order of the caches is updated in the same way too (burner by burner, in column order).
+    def batch_actuator_predict(self, contexts, req_outputs, caches):
+        GAS_APERTURE, PRESSURE, AIR_APERTURE, OUTPUT = 0, 1, 2, 3
+        FUEL_ACCURACY = self.FUEL_ACCURACY
+        READING_ACCURACY = self.READING_ACCURACY
+
+        contexts = np.asarray(contexts, dtype = float)
+        req_outputs = np.asarray(req_outputs, dtype = float)
+        K = contexts.shape[1]
+
+        # Stack the cache slots into a (K or 1) x 4 x N array. Caches with fewer than N slots are padded with NaN, which
+        # (like unused slots) never compares as similar to a reading. N is at least 1 so that argmin/argmax below work.
+        shared = isinstance(caches, memory_cache)
+        if shared and len(caches.data[OUTPUT]) > 0:
+            data = caches.data[np.newaxis]
+        elif shared:
+            data = np.full((1, 4, 1), np.nan)
+        else:
+            N = max([len(cache.data[OUTPUT]) for cache in caches] + [1])
+            data = np.full((K, 4, N), np.nan)
+            for k, cache in enumerate(caches):
+                data[k, :, :len(cache.data[OUTPUT])] = cache.data
+
+        # same bounds on the output as in actuator_predict.
+        output_upper_bound, output_lower_bound = 1000000, 0
 
-    def shuffle(self, data, index):
-        #terminate function in case of invalid index
-        if index >= len(data[0]):
-            return -1
+        req = req_outputs[:, np.newaxis]
+        outputs = data[:, OUTPUT]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            similar = ((np.abs(data[:, PRESSURE] - contexts[PRESSURE, :, np.newaxis])/contexts[PRESSURE, :, np.newaxis] < READING_ACCURACY) &
+                       (np.abs(data[:, AIR_APERTURE] - contexts[AIR_APERTURE, :, np.newaxis])/contexts[AIR_APERTURE, :, np.newaxis] < READING_ACCURACY))
+            above = similar & (outputs > req) & (outputs < output_upper_bound)
+            below = similar & (outputs < req) & (outputs > output_lower_bound)
+
+        # indices of the upper and lower bounds of each burner (ties resolved to the lowest slot, as in actuator_predict)
+        has_upper, has_lower = above.any(axis = 1), below.any(axis = 1)
+        upper_bound_index = np.argmin(np.where(above, outputs, np.inf), axis = 1)
+        lower_bound_index = np.argmax(np.where(below, outputs, -np.inf), axis = 1)
+
+        # gather output and gas aperture at the bounds (a burner using a shared cache reads from its only layer)
+        layer = np.zeros(K, dtype = int) if shared else np.arange(K)
+        upper_output, upper_position = data[layer, OUTPUT, upper_bound_index], data[layer, GAS_APERTURE, upper_bound_index]
+        lower_output, lower_position = data[layer, OUTPUT, lower_bound_index], data[layer, GAS_APERTURE, lower_bound_index]
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            # in case there is no bound, the error is ridiculously large so that we go into case 3.
+            upper_bound_error = np.where(has_upper, np.abs(upper_output - req_outputs), 100000)
+            lower_bound_error = np.where(has_lower, np.abs(lower_output - req_outputs), 100000)
+
+            # CASE 1 & 2: the cache has a "close enough" estimate, upper or lower bound being closest.
+            case1 = (upper_bound_error/req_outputs < FUEL_ACCURACY) & (upper_bound_error < lower_bound_error)
+            case2 = ~case1 & (lower_bound_error/req_outputs < FUEL_ACCURACY)
+
+            # CASE 3: linear interpolation between the bounds, or the average of the limit positions if one is missing.
+            max_position = np.where(has_upper, upper_position, 100)
+            min_position = np.where(has_lower, lower_position, 0)
+            interpolated = (lower_bound_error*max_position + upper_bound_error*min_position)/(upper_bound_error + lower_bound_error)
+            case3 = np.where(has_upper & has_lower, interpolated, (max_position + min_position)/2)
+
+            req_position = np.where(case1, upper_position, np.where(case2, lower_position, case3))
+            adjustments = req_position - contexts[GAS_APERTURE]
+
+            # burners whose output already falls in the required range need no adjustment.
+            found = np.abs(contexts[OUTPUT] - req_outputs)/req_outputs < FUEL_ACCURACY
+        adjustments[found] = 0
+
+        self.searches += int(np.count_nonzero(~found))
+        self.hits += int(np.count_nonzero((case1 | case2) & ~found))
+
+        # Update the LRU order of the caches, touching the same entries as actuator_predict would.
+        for k in range(K):
+            if found[k]:
+                continue
+            cache = caches if shared else caches[k]
+            if case1[k]:
+                cache.touch(int(upper_bound_index[k]))
+            elif case2[k]:
+                cache.touch(int(lower_bound_index[k]))
+            else:
+                if has_upper[k]:
+                    cache.touch(int(upper_bound_index[k]))
+                if has_lower[k]:
+                    cache.touch(int(lower_bound_index[k]))
 
-        # Shuffle each list, one by one
-        for subarray in data:
-            # Temporarily store element at the provided index
-            selected_element = subarray[index]
+        return adjustments
 
-            #shuffle elements before index in the list along one step to the right
-            for i in range(index-1, -1, -1):
-                subarray[i+1] = subarray[i]
+#--------------------------------------------------------------------------------------------------------------------
 
-            #replace first element with required values (so that most recently used comes first)
-            subarray[0] = selected_element
+    # VECTOR BOUNDS (private): Finds the upper and lower bounds for actuator_predict by checking all the cache slots (data)
+    # at once with numpy array operations. Returns the indices (upper, lower), with -1 in case there is no such entry. Like
+    # a scan from the first slot with strict comparisons, the lowest index wins in case of a tie (argmin/argmax return the
+    # first occurrence).
+    def __vector_bounds(self, data, P, A, req_output, accuracy, output_upper_bound, output_lower_bound):
+        GAS_APERTURE, PRESSURE, AIR_APERTURE, OUTPUT = 0, 1, 2, 3
+
+        # mask of entries with similar measured conditions. Unused slots are NaN, and comparisons with NaN are false so
+        # they never make it into the mask.
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            similar = (np.abs(data[PRESSURE] - P)/P < accuracy) & (np.abs(data[AIR_APERTURE] - A)/A < accuracy)
+
+        outputs = data[OUTPUT]
+        above = similar & (outputs > req_output) & (outputs < output_upper_bound)
+        below = similar & (outputs < req_output) & (outputs > output_lower_bound)
+
+        upper_bound_index, lower_bound_index = -1, -1
+        if above.any():
+            upper_bound_index = int(np.argmin(np.where(above, outputs, np.inf)))
+        if below.any():
+            lower_bound_index = int(np.argmax(np.where(below, outputs, -np.inf)))
 
-        # return zero means the shuffle was successful
-        return 0
+        return upper_bound_index, lower_bound_index
 
 #-----------------------------------------------------------------------------------------------------------------
 # END OF CLASS #
@@ -0,0 +1,42 @@
+from math import sqrt
+
+# MR_MODEL: This class evaluates a copy of the multiple regression model trained on the remote server
+# (Remote/ML/multiple_regression.py) on the local device. The server sends the parameters of the model when it is
+# trained (see external_interface.train_models), so a prediction is a few multiplications instead of an HTTP request
+# to /MR_predict. It has 2 functions:
+
+#   - __init__(self, parameters): (public) Constructor. parameters is the dictionary returned by MR_predictor.parameters.
+#   - predict(self, P, A, output): (public) Returns the predicted gas aperture, like external_interface.predict.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - The server's model is the authority. version is the version of the model this copy was made from, and a new
+#          copy is received every time the models are trained.
+#
+#        - The inputs are standardised and combined in the same order of operations as on the server, and like the
+#          server, 0.0 is returned if the model did not pass its accuracy test.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class mr_model:
+
+    def __init__(self, parameters):
+        self.version = parameters['version']
+        self.available = parameters['available']
+        self.__mean = [float(value) for value in parameters['mean']]
+        self.__std = [sqrt(float(value)) for value in parameters['var']]
+        self.__coef = [float(value) for value in parameters['coef']]
+        self.__intercept = float(parameters['intercept'])
+
+    # PREDICT: Returns the gas aperture predicted for the supply pressure (P), air aperture (A) and required output.
+    def predict(self, P, A, output):
+        if not self.available:
+            return 0.0
+
+        prediction = 0.0
+        for value, mean, std, coef in zip((P, A, output), self.__mean, self.__std, self.__coef):
+            prediction += coef*((value - mean)/std)
+        return prediction + self.__intercept
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
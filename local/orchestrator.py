@@ -0,0 +1,169 @@
+from memory_prediction.memory_predictor import memory_predictor
+from memory_prediction.memory_cache import memory_cache
+from controller import controller
+from scheduler import deadline_scheduler
+from external_intf_async import async_external_interface, shared_client
+import testing.reading_generator as r_g
+import event_log
+
+import asyncio
+
+# ORCHESTRATOR: This class runs the control loops of several burners in one process. Each burner has its own controller
+# (so its own memory cache, required output history and miss counter), its own sensors and its own deadlines, and runs
+# as an asyncio task - the event loop is the scheduler shared by all the burners. Each burner talks to the remote server
+# through its own async_external_interface (external_intf_async.py), but they all share one client: one HTTP session,
+# one worker thread for requests and one uploader for the readings.
+# The loop of each burner is the one in main_async.py. It has 4 functions:
+
+#   - __init__(self, server_url, ...): (public) Constructor.
+#   - add_burner(self, name, read_sensors, ...): (public) Adds a burner and returns its controller.
+#   - run(self, count): (public, async) Runs count iterations of every burner. Returns once they have all finished.
+#   - report(self): (public) Returns the timing statistics of every burner as lines of text.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - The start of each burner's loop is offset by a fraction of its period (the i-th of N burners starts i/N of a
+#          period later), so that the burners do not all wake up at the same instant.
+#
+#        - An iteration of one burner never waits on the network (see main_async.py), so a slow server does not make
+#          the other burners miss their deadlines. The iterations themselves run one at a time in the event loop thread.
+#
+#        - Each burner is a device of its own for the server, with the ID '<device_id>-<name>' (just its name if there
+#          is no device_id), so names may only use letters, digits, '_' and '-'. The server keeps one data stream and
+#          one set of models (one session, see Remote/session_store.py) per burner, so the readings of different burners
+#          are never mixed up. The uploader sends the readings of each burner in batches tagged with its device ID, and
+#          keeps the readings of all the burners which cannot be sent in one spill file.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class orchestrator:
+
+    # CONSTRUCTOR: server_url is the URL of the remote server (None to run without it) and device_id the ID of the
+    # orchestrator, which the device ID of each burner on the server starts with. miss_threshold is the number of misses
+    # before a burner uses multiple regression, which is requested prefetch_margin misses earlier.
+    def __init__(self, server_url=None, miss_threshold=8, prefetch_margin=2, device_id=None):
+        self.__server_url = server_url
+        self.__device_id = device_id
+        self.__miss_threshold = miss_threshold
+        self.__prefetch_margin = prefetch_margin
+
+        # burners in the order they were added: (name, controller, read_sensors, period).
+        self.__burners = []
+        # deadline scheduler of each burner, by name (set by run()).
+        self.__schedulers = {}
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # ADD_BURNER: Adds a burner. read_sensors takes (time, gas_aperture) and returns the readings of the burner's sensors
+    # like reading_generator.return_reading. The cache is created with the given size, snapshot file and resolution (see
+    # memory_cache.py) and the loop of the burner runs every period seconds. Returns the controller of the burner.
+    def add_burner(self, name, read_sensors, max_size=100, cache_file=None, resolution=None, period=0.5):
+        cache = memory_cache(max_size, cache_file, resolution = resolution)
+        c = controller(cache, memory_predictor(), miss_threshold = self.__miss_threshold)
+        self.__burners.append((name, c, read_sensors, period))
+        return c
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # RUN: Connects every burner to the server (if any), runs count iterations of every burner and then closes their
+    # data streams.
+    async def run(self, count):
+        e_is = [None]*len(self.__burners)
+        client = None
+        if self.__server_url is not None:
+            client = shared_client(self.__server_url)
+            e_is = await asyncio.gather(*[self.__connect(i, client) for i in range(len(self.__burners))])
+
+        await asyncio.gather(*[self.__run_burner(i, e_is[i], count) for i in range(len(self.__burners))])
+
+        for _, c, _, _ in self.__burners:
+            c.cache.flush()
+        if client is not None:
+            await client.end_uploads()
+            await asyncio.gather(*[e_i.end_data('labelled_data') for e_i in e_is if e_i is not None])
+            client.close()
+
+    # Connects the i-th burner to the server through the shared client and trains its models. Sets up the burner's
+    # controller to use them and returns its interface (None if the server cannot be reached).
+    async def __connect(self, i, client):
+        name, c, _, _ = self.__burners[i]
+        device_id = str(name) if self.__device_id is None else str(self.__device_id) + '-' + str(name)
+        e_i = async_external_interface(self.__server_url, device_id, client)
+        if not await e_i.initialise():
+            return None
+
+        use_ML, LR_m, LR_c = await e_i.use_lr(), 0, 0
+        if use_ML:
+            LR_m, LR_c, use_ML = await e_i.train_models()
+
+        # multiple regression predictions come from the local copy of the model if the server sent one, otherwise they
+        # are prefetched.
+        c.use_ML, c.LR_m, c.LR_c = use_ML, LR_m, LR_c
+        c.mr_predict = e_i.prediction if e_i.mr_model is None else e_i.mr_model.predict
+        return e_i
+
+    # Runs count iterations of the i-th burner.
+    async def __run_burner(self, i, e_i, count):
+        name, c, read_sensors, period = self.__burners[i]
+
+        await asyncio.sleep(i*period/len(self.__burners))
+        scheduler = deadline_scheduler(period)
+        self.__schedulers[name] = scheduler
+
+        for iterations in range(count):
+            sensordata = read_sensors(iterations*period, c.gas_aperture)
+
+            # An empty dictionary means the end of the testing schedule of this burner has been reached.
+            if not sensordata:
+                event_log.record(event_log.INFO, event_log.END_OF_SCHEDULE)
+                break
+
+            if sensordata['on']:
+                if e_i is not None:
+                    e_i.send_readings(G=c.gas_aperture, P=sensordata['supply_pressure'],
+                                      A=sensordata['air_aperture'], output=sensordata['current_output'])
+
+                c.step(sensordata)
+
+                if c.use_ML and e_i is not None and e_i.mr_model is None and \
+                        c.misses >= self.__miss_threshold - self.__prefetch_margin:
+                    e_i.request_prediction(sensordata['supply_pressure'], sensordata['air_aperture'], c.required_output)
+
+            await scheduler.async_wait()
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # REPORT: One line per burner with its final gas aperture and the statistics of its deadline scheduler.
+    def report(self):
+        lines = []
+        for name, c, _, _ in self.__burners:
+            if name in self.__schedulers:
+                lines.append(str(name) + " (gas_aperture: " + str(c.gas_aperture) + ") " + self.__schedulers[name].report())
+        return "\n".join(lines)
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# Runs BURNERS burners against the testing framework (all following the same schedule), from the local directory:
+#       python orchestrator.py [number of burners]
+if __name__ == "__main__":
+    import sys
+
+    BURNERS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count = 165
+    SERVER_URL = 'http://127.0.0.1:8000'
+
+    o = orchestrator(SERVER_URL, device_id = 'orchestrator')
+    for b in range(BURNERS):
+        o.add_burner('burner' + str(b), r_g.return_reading, resolution = (0.01, 10, 0.5, 0.1))
+
+    # the events of all the burners are written to the event log rather than printed.
+    events = event_log.event_log('events.log')
+    event_log.install(events)
+    asyncio.run(o.run(count))
+    event_log.install(None)
+    events.close()
+    print(o.report())
+    sys.exit(0)
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+# DEADLINE_SCHEDULER: This class times the iterations of the control loop. Rather than waiting for DELAY seconds after
+# each iteration (or busy-waiting until DELAY seconds have passed since it started), the loop sleeps until the absolute
+# deadline of the next iteration: start + n*period, measured on a monotonic clock. Time spent in the iterations and late
+# wake-ups therefore never add up to drift, the wall clock jumping does not affect the loop, and the CPU is free while
+# waiting. It has 5 functions:
+
+#   - __init__(self, period, clock, sleep): (public) Constructor.
+#   - wait(self): (public) Sleeps until the next deadline. Returns the number of deadlines missed (overrun).
+#   - async_wait(self): (public) Same as wait(), for loops running under asyncio (other tasks run while it sleeps).
+#   - stats(self): (public) Returns a dictionary of timing statistics (overruns, jitter).
+#   - report(self): (public) Returns the statistics as a line of text.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - Jitter is how late the loop wakes up after a deadline it slept until. An overrun is an iteration which did
+#          not finish before its deadline. After an overrun, the loop carries on from the next deadline still ahead of
+#          it (it does not try to catch up by running iterations back to back), so the cadence stays the same.
+#
+#        - The clock and sleep functions can be replaced, e.g. by a virtual clock for simulations (see virtual_clock
+#          below).
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class deadline_scheduler:
+
+    # CONSTRUCTOR: period is the time between deadlines in seconds. clock returns the current time in seconds and sleep
+    # sleeps for a given number of seconds. The first deadline is one period after the scheduler is created.
+    def __init__(self, period, clock=time.monotonic, sleep=time.sleep):
+        self.__period = period
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__deadline = clock() + period
+
+        # statistics
+        self.__iterations = 0
+        self.__overruns = 0
+        self.__missed = 0
+        self.__jitter_total = 0.0
+        self.__jitter_max = 0.0
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # WAIT: Called at the end of an iteration. Sleeps until the deadline for the next iteration to start.
+    def wait(self):
+        now, missed = self.__start_wait()
+
+        # sleep() may return early (e.g. interrupted by a signal), so we check the clock again.
+        while now < self.__deadline:
+            self.__sleep(self.__deadline - now)
+            now = self.__clock()
+
+        self.__end_wait(now)
+        return missed
+
+    # ASYNC_WAIT: Same as wait(), but sleeps with asyncio so that other tasks can run in the meantime. The clock should
+    # be the one asyncio uses (time.monotonic, the default); the sleep function is not used.
+    async def async_wait(self):
+        now, missed = self.__start_wait()
+
+        while now < self.__deadline:
+            await asyncio.sleep(self.__deadline - now)
+            now = self.__clock()
+
+        self.__end_wait(now)
+        return missed
+
+    # In case the iteration overran its deadline, move on to the next deadline still ahead. Returns the current time and
+    # the number of deadlines missed.
+    def __start_wait(self):
+        self.__iterations += 1
+        now = self.__clock()
+
+        missed = 0
+        if now >= self.__deadline:
+            missed = int((now - self.__deadline)//self.__period) + 1
+            self.__overruns += 1
+            self.__missed += missed
+            self.__deadline += missed*self.__period
+        return now, missed
+
+    # Records the jitter of the wake up and sets the next deadline.
+    def __end_wait(self, now):
+        jitter = now - self.__deadline
+        self.__jitter_total += jitter
+        self.__jitter_max = max(self.__jitter_max, jitter)
+
+        self.__deadline += self.__period
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # STATS: Returns the number of iterations, overruns and missed deadlines, and the mean and maximum jitter in seconds.
+    def stats(self):
+        return {
+                    'iterations': self.__iterations,
+                    'overruns': self.__overruns,
+                    'missed_deadlines': self.__missed,
+                    'jitter_mean': self.__jitter_total/self.__iterations if self.__iterations else 0.0,
+                    'jitter_max': self.__jitter_max
+        }
+
+    # REPORT: Returns the statistics as a line of text to print.
+    def report(self):
+        stats = self.stats()
+        return ("SCHEDULER: " + str(stats['iterations']) + " iterations, " + str(stats['overruns']) + " overruns (" +
+                str(stats['missed_deadlines']) + " deadlines missed), jitter mean " +
+                str(round(stats['jitter_mean']*1000, 3)) + " ms, max " + str(round(stats['jitter_max']*1000, 3)) + " ms")
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# VIRTUAL_CLOCK: A clock for simulations, which only moves when it is told to sleep. Given to a deadline_scheduler
+# (clock=vc.now, sleep=vc.sleep), the loop runs as fast as the computer allows while the scheduler (and anything else
+# reading the clock) sees time pass exactly as in real time. Time spent computing does not count, so the scheduler
+# records no overruns and no jitter.
+class virtual_clock:
+
+    # CONSTRUCTOR: start is the initial time in seconds.
+    def __init__(self, start=0.0):
+        self.__now = start
+
+    # NOW: Returns the current (virtual) time in seconds.
+    def now(self):
+        return self.__now
+
+    # SLEEP: Moves the clock forward by the given number of seconds, without waiting.
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.__now += seconds
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
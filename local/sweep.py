@@ -0,0 +1,264 @@
+from memory_prediction.memory_predictor import memory_predictor
+from memory_prediction.memory_cache import memory_cache
+from controller import controller
+from mr_model import mr_model
+from testing.scenario_generator import scenario_generator
+from testing.test_environment import test_environment
+import testing.reading_generator as r_g
+import event_log
+
+from concurrent.futures import ProcessPoolExecutor
+import ast
+import csv
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+# This script runs a sweep over the tuning parameters of the controller: every combination of the values in a parameter
+# grid is replayed against the testing framework by a simulated controller (no remote server, no waiting between
+# iterations, no events printed), and the runs are spread over a pool of processes. The parameters are:
+#
+#   - max_size: size of the memory cache.
+#   - miss_threshold: number of misses before the controller uses multiple regression.
+#   - fuel_accuracy, reading_accuracy: accuracies of the memory predictor (FUEL_ACCURACY and READING_ACCURACY).
+#   - model_no: model of the test environment.
+#   - seed: seed of the synthetic scenario (testing/scenario_generator.py) replayed for DURATION seconds, or None for
+#           the testing schedule (reading_generator.FILENAME) played CYCLES times in a row.
+#   - ml: whether the controller uses linear and multiple regression (see NOTES).
+#
+# For each run it collects into one table:
+#
+#   - convergence: the average time (s) taken to bring the output within TOLERANCE of the required output after it
+#                  changes, and the number of setpoints which were never reached.
+#   - overshoot: the average, over the setpoints, of the largest excursion past the required output (% of it) in the
+#                direction of the change.
+#   - misses: the number of iterations in which memory prediction had to make an adjustment.
+#   - mr fallbacks: the number of times the miss threshold was breached and multiple regression was used.
+#   - hit rate: the percentage of cache searches by the memory predictor which found a "close enough" estimate.
+#
+# Run from the local directory. Values of the grid can be replaced with name=value,value,... arguments, e.g.
+#       python sweep.py miss_threshold=4,8,16 fuel_accuracy=0.02,0.05 --workers 32 --csv sweep.csv
+# None, True and False are given as they are written in Python.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - There is no server in the sweep. With ml=True, the linear and multiple regression models are fitted once per
+#          run, in the same way as on the server (Remote/ML), to TRAINING_POINTS readings of the test environment at
+#          random gas apertures over the same scenario. The multiple regression model is evaluated with mr_model.py.
+#
+#        - TOLERANCE is the same for every run, so that runs with different fuel accuracies can be compared.
+#
+#        - The runs do not depend on each other, so the results are the same for any number of workers.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# default parameter grid.
+GRID = {
+    'max_size': [10, 100],
+    'miss_threshold': [4, 8, 16],
+    'fuel_accuracy': [0.02, 0.05],
+    'reading_accuracy': [0.05],
+    'model_no': [1],
+    'seed': [None],
+    'ml': [False, True],
+}
+
+# configurable parameters: length of an iteration (s), number of times the testing schedule is played, length of a
+# synthetic scenario (s), tolerance of the convergence and overshoot measurements, number of readings the models are
+# fitted to.
+DELAY = 0.5
+CYCLES = 20
+DURATION = 6*3600
+TOLERANCE = 0.05
+TRAINING_POINTS = 2000
+
+# columns of the results table: (heading, key, format).
+COLUMNS = [
+    ('MAX SIZE', 'max_size', '{}'),
+    ('MISS THR', 'miss_threshold', '{}'),
+    ('FUEL ACC', 'fuel_accuracy', '{}'),
+    ('READ ACC', 'reading_accuracy', '{}'),
+    ('MODEL', 'model_no', '{}'),
+    ('SEED', 'seed', '{}'),
+    ('ML', 'ml', '{}'),
+    ('CONV (s)', 'convergence', '{:.2f}'),
+    ('NOT REACHED', 'not_reached', '{}'),
+    ('OVERSHOOT (%)', 'overshoot', '{:.2f}'),
+    ('MISSES', 'misses', '{}'),
+    ('MR FALLBACKS', 'mr_fallbacks', '{}'),
+    ('HIT RATE (%)', 'hit_rate', '{:.1f}'),
+]
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# SCENARIO_ROWS: returns an iterable of the (required output, P, A, time) rows replayed by a run.
+def scenario_rows(seed):
+    if seed is None:
+        return np.tile(r_g.load_schedule(r_g.FILENAME).rows, (CYCLES, 1))
+    return scenario_generator(seed).rows(DURATION)
+
+# FIT_MODELS: fits the linear and multiple regression models for a run like the server would. Returns LR_m, LR_c, use_ML
+# (like external_interface.train_models) and the mr_model.
+def fit_models(model_no, seed):
+    rng = np.random.default_rng(0 if seed is None else seed)
+    # the rows of the testing schedule, or the first chunk of the scenario.
+    if seed is None:
+        rows = r_g.load_schedule(r_g.FILENAME).rows
+    else:
+        rows = next(scenario_generator(seed).chunks(DURATION))
+    rows = rows[rows[:, 0] > 20]
+    rows = rows[rng.integers(0, len(rows), TRAINING_POINTS)]
+    G = np.round(rng.uniform(0, 100, TRAINING_POINTS), 2)
+    P, A = rows[:, 1], rows[:, 2]
+    output = test_environment(model_no).retrieve_out_vals(P, A, G)
+
+    # linear regression of output on P*A*G/100000, accepted under the same conditions as in LR_predictor.find_line.
+    x_data = P*(A/100000)*G
+    LR_m, LR_c = np.polyfit(x_data, output, 1)
+    r = np.corrcoef(x_data, output)[0, 1]
+    residuals = output - (LR_m*x_data + LR_c)
+    std_error = np.sqrt(np.sum(residuals**2)/(len(x_data) - 2)/np.sum((x_data - np.mean(x_data))**2))
+    if not (r > 0.7 and std_error < 5):
+        LR_m, LR_c = 0, 0
+
+    # multiple regression of G on the standardised P, A and output, tested on the last 20% of the readings.
+    X = np.column_stack((P, A, output))
+    mean, var = np.mean(X, axis = 0), np.var(X, axis = 0)
+    # like the server, features which do not vary are not scaled.
+    var = np.where(var == 0, 1, var)
+    scaled = np.column_stack(((X - mean)/np.sqrt(var), np.ones(len(X))))
+    train = int(0.8*len(X))
+    solution = np.linalg.lstsq(scaled[:train], G[:train], rcond = None)[0]
+    prediction = scaled[train:] @ solution
+    r2 = 1 - np.sum((G[train:] - prediction)**2)/np.sum((G[train:] - np.mean(G[train:]))**2)
+
+    parameters = {
+                    'version': 1,
+                    'available': bool(r2 > 0.75),
+                    'mean': mean.tolist(),
+                    'var': var.tolist(),
+                    'coef': solution[:3].tolist(),
+                    'intercept': float(solution[3])
+    }
+    return float(LR_m), float(LR_c), bool(LR_m != 0), mr_model(parameters)
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# RUN: replays the scenario of one combination of parameters and returns its row of the results table.
+def run(params):
+    cache = memory_cache(params['max_size'])
+    m_p = memory_predictor(fuel_accuracy = params['fuel_accuracy'], reading_accuracy = params['reading_accuracy'])
+    c = controller(cache, m_p, miss_threshold = params['miss_threshold'])
+
+    mr_fallbacks = 0
+    if params['ml']:
+        c.LR_m, c.LR_c, c.use_ML, model = fit_models(params['model_no'], params['seed'])
+
+        def mr_predict(P, A, output):
+            nonlocal mr_fallbacks
+            mr_fallbacks += 1
+            return model.predict(P, A, output)
+        c.mr_predict = mr_predict
+
+    # iterations taken to converge on each setpoint, setpoints not reached before the next change and the overshoot
+    # past each setpoint.
+    convergence, overshoot = [], []
+    not_reached = 0
+    # required output we are converging on, iterations spent so far (None once reached), direction of the change and
+    # largest excursion past the required output so far.
+    target, spent, direction, excursion = None, None, 0, 0
+    misses = 0
+
+    readings = r_g.stream_readings(scenario_rows(params['seed']), DELAY, lambda: c.gas_aperture,
+                                   model_no = params['model_no'])
+    for sensordata in readings:
+        if not sensordata['on']:
+            continue
+
+        required_output = sensordata['required_output']
+        current_output = sensordata['current_output']
+        if required_output != target:
+            if target is not None:
+                overshoot.append(100*excursion/target)
+            if spent is not None:
+                not_reached += 1
+            direction = 1 if required_output > current_output else -1
+            target, spent, excursion = required_output, 0, 0
+
+        excursion = max(excursion, direction*(current_output - required_output))
+        if spent is not None:
+            if abs(current_output - required_output)/required_output < TOLERANCE:
+                convergence.append(spent)
+                spent = None
+            else:
+                spent += 1
+
+        old_misses = c.misses
+        c.step(sensordata)
+        if c.misses > old_misses:
+            misses += 1
+
+    if target is not None:
+        overshoot.append(100*excursion/target)
+
+    results = dict(params)
+    results['convergence'] = DELAY*np.mean(convergence) if convergence else float('nan')
+    results['not_reached'] = not_reached
+    results['overshoot'] = np.mean(overshoot) if overshoot else float('nan')
+    results['misses'] = misses
+    results['mr_fallbacks'] = mr_fallbacks
+    results['hit_rate'] = 100*m_p.hits/m_p.searches if m_p.searches else 0
+    return results
+
+# Run in each worker process: the events of the controllers are dropped rather than printed.
+def _quiet():
+    event_log.install(event_log.event_log(os.devnull, level = event_log.ERROR + 1, drain_period = 60))
+
+# SWEEP: runs every combination of the values in grid (a dictionary like GRID) over workers processes (default: one per
+# CPU). Returns the rows of the results table in the order of the combinations.
+def sweep(grid, workers=None):
+    names = list(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    with ProcessPoolExecutor(workers, initializer = _quiet) as executor:
+        return list(executor.map(run, combinations))
+
+# FORMAT_TABLE: returns the results table as lines of text.
+def format_table(results):
+    cells = [[heading for heading, _, _ in COLUMNS]]
+    cells += [[fmt.format(row[key]) for _, key, fmt in COLUMNS] for row in results]
+    widths = [max(len(line[i]) for line in cells) + 3 for i in range(len(COLUMNS))]
+    return "\n".join("".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in cells)
+
+#---------------------------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    grid = dict(GRID)
+    workers, csv_file = None, None
+    args = sys.argv[1:]
+    while args:
+        arg = args.pop(0)
+        if arg == '--workers':
+            workers = int(args.pop(0))
+        elif arg == '--csv':
+            csv_file = args.pop(0)
+        elif '=' in arg and arg.split('=')[0] in GRID:
+            name, values = arg.split('=', 1)
+            grid[name] = [ast.literal_eval(value) for value in values.split(',')]
+        else:
+            print("usage: python sweep.py [name=value,...] [--workers N] [--csv FILE]")
+            sys.exit(1)
+
+    start_time = time.perf_counter()
+    results = sweep(grid, workers)
+    print(format_table(results))
+    print(str(len(results)) + " runs in " + str(round(time.perf_counter() - start_time, 1)) + " s")
+
+    if csv_file is not None:
+        with open(csv_file, 'w', newline = '') as f:
+            writer = csv.DictWriter(f, fieldnames = [key for _, key, _ in COLUMNS])
+            writer.writeheader()
+            writer.writerows(results)
+    sys.exit(0)
@@ -0,0 +1,187 @@
+from collections import deque
+import os
+import threading
+import time
+
+import numpy as np
+
+# TELEMETRY_UPLOADER: This class sends the sensor readings to the remote server in batches, from a background thread.
+# Instead of one POST request per reading (external_interface.send_readings), the control loop only adds the readings
+# to a queue (enqueue), which is sent to the server (external_interface.send_batch) once batch_size readings are waiting
+# or the oldest one has waited max_age seconds. Readings which cannot be sent are kept in a spill file and sent once the
+# server can be reached again, so training data is not lost when the link drops. One uploader can send the readings of
+# several devices (see orchestrator.py): each reading is queued with the ID of its device, and a batch is sent as one
+# request per device. It has 3 functions:
+
+#   - __init__(self, e_i, ...): (public) Constructor. Starts the background thread.
+#   - enqueue(self, G, P, A, output, device_id): (public) Adds readings to the queue. Never waits on the network.
+#   - close(self): (public) Sends (or spills) the readings still queued and stops the background thread.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - The queue holds at most max_queued readings. If it is full when readings are added (the thread is stuck on a
+#          slow request), the queued readings are moved to the spill file.
+#
+#        - If a batch cannot be sent, it is added to the spill file and no requests are made for RETRY_DELAY seconds
+#          (batches due in the meantime go straight to the spill file). Before sending a batch, the spill file is sent in
+#          chunks of REPLAY_BATCH readings, so the server receives the readings in the order they were taken (except for
+#          a batch being sent when the queue overflowed, which lands in the file after the readings that overflowed).
+#
+#        - The spill file is append-only: each reading is the device ID (DEVICE_BYTES bytes of ASCII, padded with zeros,
+#          empty for the device of e_i) followed by 4 little-endian doubles (G, P, A, output). The readings of a batch
+#          are written grouped by device, so the file is sent one run of readings of the same device at a time. It is
+#          deleted once it has been sent completely. A spill file left by a previous run is sent when the server can be
+#          reached. If the program stops while the file is being sent, the part already sent is sent again next time.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class telemetry_uploader:
+
+    RETRY_DELAY = 10.0
+    REPLAY_BATCH = 500
+    DEVICE_BYTES = 64
+    READING = np.dtype([('device', 'S' + str(DEVICE_BYTES)), ('readings', '<f8', (4,))])
+    READING_BYTES = READING.itemsize
+
+    # CONSTRUCTOR: e_i is the external_interface object used to send the batches. Readings are sent once batch_size of
+    # them are queued or the oldest has been queued for max_age seconds.
+    def __init__(self, e_i, spill_file='telemetry_spill.dat', batch_size=20, max_age=5.0, max_queued=200,
+                 clock=time.monotonic):
+        self.__e_i = e_i
+        self.__spill_file = spill_file
+        self.__batch_size = batch_size
+        self.__max_age = max_age
+        self.__max_queued = max_queued
+        self.__clock = clock
+
+        # queued readings with the time they were added, and the condition the thread waits on.
+        self.__queue = deque()
+        self.__condition = threading.Condition()
+        self.__closed = False
+
+        # the spill file is written by both threads. replayed counts the readings at its start which were sent already.
+        self.__file_lock = threading.Lock()
+        self.__replayed = 0
+        # no requests are made before this time (after a failure).
+        self.__retry_at = 0
+
+        # number of readings sent, and number of readings written to the spill file.
+        self.sent = 0
+        self.spilled = 0
+
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # ENQUEUE: Adds readings of the given device (None for the device of e_i) to the queue, and wakes up the thread if a
+    # batch is ready.
+    def enqueue(self, G, P, A, output, device_id=None):
+        if device_id is not None and len(device_id) > self.DEVICE_BYTES:
+            raise ValueError("Device ID longer than " + str(self.DEVICE_BYTES) + " characters.")
+        overflow = None
+        with self.__condition:
+            if len(self.__queue) >= self.__max_queued:
+                overflow = [reading for _, reading in self.__queue]
+                self.__queue.clear()
+            self.__queue.append((self.__clock(), (device_id, (G, P, A, output))))
+            if len(self.__queue) >= self.__batch_size:
+                self.__condition.notify()
+
+        if overflow:
+            self.__spill(overflow)
+
+    # CLOSE: Stops the thread once the queued readings have been sent (or spilled).
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__thread.join()
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # Background thread: waits for a batch to be due and uploads it.
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__closed:
+                    if len(self.__queue) >= self.__batch_size:
+                        break
+                    if self.__queue:
+                        remaining = self.__queue[0][0] + self.__max_age - self.__clock()
+                        if remaining <= 0:
+                            break
+                        self.__condition.wait(remaining)
+                    else:
+                        self.__condition.wait()
+
+                batch = [reading for _, reading in self.__queue]
+                self.__queue.clear()
+                closed = self.__closed
+
+            if batch:
+                self.__upload(batch)
+            if closed:
+                return
+
+    # Sends the spill file, then the batch (one request per device). Spills what has not been sent if either fails.
+    def __upload(self, batch):
+        if self.__clock() < self.__retry_at:
+            self.__spill(batch)
+            return
+        devices = self.__by_device(batch)
+        if self.__replay():
+            while devices and self.__e_i.send_batch(devices[0][1], devices[0][0]):
+                self.sent += len(devices[0][1])
+                devices.pop(0)
+            if not devices:
+                return
+        self.__retry_at = self.__clock() + self.RETRY_DELAY
+        self.__spill([(device_id, row) for device_id, rows in devices for row in rows])
+
+    # Sends the readings in the spill file which have not been sent yet, and deletes the file once they all have.
+    # Returns False if the server could not be reached.
+    def __replay(self):
+        while True:
+            with self.__file_lock:
+                if not os.path.exists(self.__spill_file):
+                    return True
+                # (an incomplete reading at the end, if the program stopped while writing it, is not read.)
+                chunk = np.fromfile(self.__spill_file, dtype=self.READING, count=self.REPLAY_BATCH,
+                                    offset=self.READING_BYTES*self.__replayed)
+                if len(chunk) == 0:
+                    os.remove(self.__spill_file)
+                    self.__replayed = 0
+                    return True
+
+            # the readings at the start of the chunk which are from the same device.
+            device = chunk['device'][0]
+            count = int(np.argmax(chunk['device'] != device)) or len(chunk)
+            if not self.__e_i.send_batch(chunk['readings'][:count], device.decode('ascii') or None):
+                return False
+            self.__replayed += count
+            self.sent += count
+
+    # Appends readings (device ID, (G, P, A, output)) to the spill file, grouped by device.
+    def __spill(self, readings):
+        records = np.array([(device_id or '', row) for device_id, rows in self.__by_device(readings) for row in rows],
+                           dtype=self.READING)
+        with self.__file_lock:
+            with open(self.__spill_file, 'ab') as f:
+                # the file is opened at its end. Drop an incomplete reading left there by a previous run.
+                size = f.tell()
+                if size % self.READING_BYTES:
+                    f.truncate(size - size % self.READING_BYTES)
+                records.tofile(f)
+            self.spilled += len(records)
+
+    # The rows of the readings (device ID, (G, P, A, output)) of each device, as a list of (device ID, rows) in the
+    # order in which the devices first appear.
+    def __by_device(self, readings):
+        devices = {}
+        for device_id, row in readings:
+            devices.setdefault(device_id, []).append(row)
+        return list(devices.items())
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
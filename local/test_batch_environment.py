@@ -0,0 +1,54 @@
+from testing.test_environment import test_environment
+
+import time
+
+import numpy as np
+
+# This script checks that the array versions of the test environment models (test_environment.retrieve_out_vals) give
+# exactly the same outputs as the scalar ones (retrieve_out_val), for every model. Random operating points are
+# generated, together with points on the limits of the ranges of P and A of the piecewise models and points whose
+# output is a tie when rounding. The check fails if any output differs; the number of mismatches and the time taken by
+# each version are printed.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+def test_batch_environment():
+    rng = np.random.default_rng(0)
+    N = 100000
+
+    # random points, then points on or near the limits of the ranges of models 2 and 4.
+    P = np.concatenate([rng.uniform(0, 50000, N), rng.choice([0, 4999.99, 5000, 15000, 34999.99, 35000, 3000], N)])
+    A = np.concatenate([rng.uniform(0, 100, N), rng.choice([29.99, 30, 35, 40, 42, 50, 75, 77, 80, 85, 90, 100], N)])
+    G = np.concatenate([rng.uniform(0, 100, N), np.round(rng.uniform(0, 100, N), 2)])
+
+    total_mismatches = 0
+    for model_no in range(1, 6):
+        t_e = test_environment(model_no)
+
+        start_time = time.perf_counter()
+        batch = t_e.retrieve_out_vals(P, A, G)
+        batch_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        scalar = [t_e.retrieve_out_val(float(p), float(a), float(g)) for p, a, g in zip(P, A, G)]
+        scalar_time = time.perf_counter() - start_time
+
+        mismatches = int(np.sum(batch != np.array(scalar, dtype = float)))
+        total_mismatches += mismatches
+        print("MODEL " + str(model_no) + " - CHECKS: " + str(len(P)) + ", MISMATCHES: " + str(mismatches) +
+              ", scalar: " + str(round(scalar_time*1e9/len(P))) + " ns, batch: " + str(round(batch_time*1e9/len(P))) +
+              " ns per point")
+
+    # outputs on or very close to half way between hundredths (model 5 with P = A = 0 gives 0.47*G).
+    t_e = test_environment(5)
+    outputs = np.array([20.125, 20.375, 22.675, 21.005, 20.135, 100.005, 50.625, 80.115])
+    G = np.concatenate([outputs/0.47, np.nextafter(outputs/0.47, 0), np.nextafter(outputs/0.47, 200)])
+    expected = [t_e.retrieve_out_val(0, 0, float(g)) for g in G]
+    mismatches = int(np.sum(t_e.retrieve_out_vals(0, 0, G) != np.array(expected)))
+    total_mismatches += mismatches
+    print("ROUNDING - MISMATCHES: " + str(mismatches))
+
+    assert total_mismatches == 0
+
+if __name__ == "__main__":
+    test_batch_environment()
@@ -0,0 +1,148 @@
+from memory_prediction.memory_cache import memory_cache
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# This script checks that memory_cache.lookup finds the same entry as the original implementation, which went through
+# the cache array from the front (most recently used) one entry at a time. The original search function is reproduced
+# below as loop_search, along with the way main.py kept the array in recency order. Random readings are drawn from a
+# few values of each parameter, so that many entries share the same output and two of the other parameters (the keys
+# of the hash tables of the cache), and the caches are kept small so that such entries keep being evicted. The check
+# fails if the cache and the original array ever disagree. A second check covers readings which only match an entry
+# once quantised (see the resolution of memory_cache), and a third one a cache restarted from its snapshot file. Run
+# with pytest, or run the script directly to also print the time taken to restart caches of larger sizes.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# ORIGINAL IMPLEMENTATION: the 'search' function of main.py before the cache was indexed.
+def loop_search(arr, check):
+    for i in range(0, len(arr[0])):
+        if check[3] == arr[3, i]:
+            matching_parameters = 0
+            for j in range(0, 3):
+                if check[j] == arr[j, i]:
+                    matching_parameters += 1
+
+            if matching_parameters == 3:
+                return i
+            elif matching_parameters == 2:
+                arr[0, i] = check[0]
+                arr[1, i] = check[1]
+                arr[2, i] = check[2]
+                return i
+    return -1
+
+# the array after the entry at index i (or the new readings if i is -1) is moved to the front, dropping the last entry
+# when the array is longer than max_size.
+def loop_update(arr, check, i, max_size):
+    if i == -1:
+        return np.column_stack([check, arr])[:, :max_size]
+    return np.column_stack([arr[:, i], np.delete(arr, i, axis = 1)])
+
+def random_readings():
+    return (random.choice([10, 20, 30]), random.choice([2950, 3000]), random.choice([74, 75, 76]), random.choice([100, 150]))
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# LOOKUP CHECK - same entries found (or not) by the cache and by the original search, as entries come and go.
+def test_lookup():
+    random.seed(2)
+    mismatches, checks = 0, 0
+    for size in [1, 2, 5, 10, 30]:
+        for _ in range(10):
+            cache = memory_cache(size)
+            arr = np.empty((4, 0))
+            for _ in range(300):
+                readings = random_readings()
+                expected = loop_search(arr, readings)
+                slot = cache.lookup(*readings)
+
+                checks += 1
+                if (slot == -1) != (expected == -1) or (slot != -1 and list(cache.data[:, slot]) != list(arr[:, expected])):
+                    mismatches += 1
+                    print("MISMATCH: " + str(readings) + ", expected: " + str(expected) + ", slot: " + str(slot))
+
+                if slot == -1:
+                    cache.insert(*readings)
+                else:
+                    cache.touch(slot)
+                arr = loop_update(arr, readings, expected, size)
+
+    print("LOOKUP CHECKS: " + str(checks) + ", MISMATCHES: " + str(mismatches))
+    assert mismatches == 0
+
+# QUANTISED DEDUP CHECK - noisy readings matching an older entry through the only key it shares with a newer entry
+# which has been evicted are still merged into the older entry, rather than inserted as a near duplicate.
+def test_quantised_dedup():
+    cache = memory_cache(2, resolution = (1, 10, 1, 1))
+    older = cache.insert(10, 3000, 75, 100)
+    # same (output, G, P) key as the older entry.
+    newer = cache.insert(10, 3000, 80, 100)
+    cache.touch(older)
+    assert cache.insert(50, 2000, 60, 200) == newer
+
+    # the same as main.py does with new readings.
+    readings = (10.2, 3003, 90, 100.4)
+    slot = cache.lookup(*readings)
+    if slot == -1:
+        cache.insert(*readings)
+    assert slot == older
+    assert list(cache.data[:, older]) == list(readings)
+    assert len(cache) == 2
+
+# RESTART CHECK - a cache restarted from its snapshot file (with the index file saved by flush() or not) holds the same
+# entries, and its rebuilt eviction policy evicts them in the same order as the cache it was saved from.
+def test_restart():
+    random.seed(3)
+    for flushed in [True, False]:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'cache_snapshot.npy')
+            cache = memory_cache(20, filename)
+            for _ in range(60):
+                readings = random_readings()
+                slot = cache.lookup(*readings)
+                if slot == -1:
+                    cache.insert(*readings)
+                else:
+                    cache.touch(slot)
+            if flushed:
+                cache.flush()
+
+            # restart from a copy of the files, as the evictions below are written to the snapshot file straight away.
+            copy = os.path.join(directory, 'copy.npy')
+            shutil.copy(filename, copy)
+            shutil.copy(os.path.join(directory, 'cache_snapshot.index.npy'), os.path.join(directory, 'copy.index.npy'))
+            expected = [cache.evict() for _ in range(len(cache))]
+
+            restarted = memory_cache(20, copy)
+            assert [restarted.evict() for _ in range(len(restarted))] == expected
+
+# TIMING - restarting a full cache from its snapshot file, which rebuilds the eviction policy in O(n).
+def timing():
+    for size in [1000, 10000, 100000]:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'cache_snapshot.npy')
+            cache = memory_cache(size, filename)
+            for _ in range(size):
+                cache.insert(random.uniform(0, 100), random.uniform(2800, 3200), random.uniform(70, 80),
+                             random.uniform(15, 250))
+            cache.flush()
+            del cache
+
+            start_time = time.perf_counter()
+            cache = memory_cache(size, filename)
+            restart_time = time.perf_counter() - start_time
+            del cache
+
+        print("CACHE SIZE " + str(size) + " - restart: " + str(round(restart_time*1e3, 1)) + " ms")
+
+if __name__ == "__main__":
+    test_lookup()
+    test_quantised_dedup()
+    test_restart()
+    timing()
@@ -0,0 +1,188 @@
+from memory_prediction.memory_predictor import memory_predictor
+from memory_prediction.memory_cache import memory_cache
+
+import contextlib
+import io
+import random
+import time
+
+# This script checks that the ways of finding bounds in memory_predictor ('index' and 'vector') give exactly the same
+# adjustments as the original implementation, which went through the cache one slot at a time in a Python loop. The
+# original loop is reproduced below as loop_predict. Random caches and readings are generated, the adjustment from each
+# implementation is compared, and the check fails if any of them differ. The same is done for batch_actuator_predict
+# (which predicts for several burners at once) against actuator_predict. The checks run under pytest; run the script
+# directly to also print the time taken by each implementation for larger cache sizes.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# ORIGINAL IMPLEMENTATION: returns the adjustment which actuator_predict returned before the cache was indexed/vectorised.
+# The cache is not manipulated as this does not affect the adjustment.
+def loop_predict(context, req_output, data):
+    GAS_APERTURE, PRESSURE, AIR_APERTURE, OUTPUT = 0, 1, 2, 3
+    FUEL_ACCURACY = 0.05
+    READING_ACCURACY = 0.05
+
+    gas_aperture = context['gas_aperture']
+    supply_pressure = context['supply_pressure']
+    air_aperture = context['air_aperture']
+    current_output = context['current_output']
+
+    if abs(current_output - req_output)/req_output < FUEL_ACCURACY:
+        return 0
+
+    max_position, min_position = 100, 0
+    output_upper_bound, output_lower_bound = 1000000, 0
+    upper_bound_index, lower_bound_index = -1, -1
+
+    for i in range(0, len(data[OUTPUT])):
+        pressure_error = abs(data[PRESSURE, i] - supply_pressure)
+        air_error = abs(data[AIR_APERTURE, i] - air_aperture)
+
+        if pressure_error/supply_pressure < READING_ACCURACY and air_error/air_aperture < READING_ACCURACY:
+            if data[OUTPUT, i] > req_output and data[OUTPUT, i] < output_upper_bound:
+                output_upper_bound = data[OUTPUT, i]
+                upper_bound_index = i
+            elif data[OUTPUT, i] < req_output and data[OUTPUT, i] > output_lower_bound:
+                output_lower_bound = data[OUTPUT, i]
+                lower_bound_index = i
+
+    upper_bound_error, lower_bound_error = 100000, 100000
+    if upper_bound_index >= 0:
+        upper_bound_error = abs(data[OUTPUT, upper_bound_index] - req_output)
+    if lower_bound_index >= 0:
+        lower_bound_error = abs(data[OUTPUT, lower_bound_index] - req_output)
+
+    if upper_bound_error/req_output < FUEL_ACCURACY and upper_bound_error < lower_bound_error:
+        req_position = data[GAS_APERTURE, upper_bound_index]
+    elif lower_bound_error/req_output < FUEL_ACCURACY:
+        req_position = data[GAS_APERTURE, lower_bound_index]
+    else:
+        if upper_bound_index >= 0:
+            max_position = data[GAS_APERTURE, upper_bound_index]
+        if lower_bound_index >= 0:
+            min_position = data[GAS_APERTURE, lower_bound_index]
+
+        if upper_bound_index >= 0 and lower_bound_index >= 0:
+            numerator = (lower_bound_error*max_position + upper_bound_error*min_position)
+            denominator = (upper_bound_error + lower_bound_error)
+            req_position = numerator/denominator
+        else:
+            req_position = (max_position + min_position)/2
+
+    return req_position - gas_aperture
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# Fills a cache of the given size with random readings around a few operating points, the same way main.py does
+# (lookup first, insert if there is no repeat). Outputs are rounded like the test environment rounds them, so that
+# repeated outputs (and hence ties between entries) occur.
+def random_cache(size, entries):
+    cache = memory_cache(size)
+    for _ in range(entries):
+        G = round(random.uniform(0, 100), 2)
+        P = random.choice([2950, 3000, 3050, 3110]) + random.choice([0, 0, random.uniform(-200, 200)])
+        A = random.choice([74, 75, 76]) + random.choice([0, 0, random.uniform(-6, 6)])
+        output = round(random.uniform(15, 250), random.choice([0, 1, 2]))
+
+        index = cache.lookup(G, P, A, output)
+        if index == -1:
+            cache.insert(G, P, A, output)
+        else:
+            cache.touch(index)
+    return cache
+
+def random_context():
+    return {
+                'gas_aperture': round(random.uniform(0, 100), 2),
+                'supply_pressure': random.choice([2950, 3000, 3050, 3110]) + random.choice([0, random.uniform(-200, 200)]),
+                'air_aperture': random.choice([74, 75, 76]) + random.choice([0, random.uniform(-6, 6)]),
+                'current_output': round(random.uniform(15, 250), 2)
+    }
+
+#---------------------------------------------------------------------------------------------------------------------
+
+m_p_index = memory_predictor('index')
+m_p_vector = memory_predictor('vector')
+
+# actuator_predict records events (see event_log.py), which are printed as no event log is installed here. We do not
+# need them.
+quiet = contextlib.redirect_stdout(io.StringIO())
+
+# PARITY CHECK
+def test_parity():
+    random.seed(0)
+    mismatches, checks = 0, 0
+    for size in [1, 10, 100, 1000]:
+        for _ in range(20):
+            cache = random_cache(size, random.randint(0, 3*size))
+            for _ in range(50):
+                context = random_context()
+                req_output = random.choice([round(random.uniform(15, 250), 1), cache.data[3, 0] if len(cache) else 100])
+
+                expected = loop_predict(context, req_output, cache.data)
+                with quiet:
+                    index_result = m_p_index.actuator_predict(context, req_output, cache)
+                    vector_result = m_p_vector.actuator_predict(context, req_output, cache)
+
+                checks += 1
+                if index_result != expected or vector_result != expected:
+                    mismatches += 1
+                    print("MISMATCH: " + str(expected) + ", index: " + str(index_result) + ", vector: " + str(vector_result))
+
+    print("PARITY CHECKS: " + str(checks) + ", MISMATCHES: " + str(mismatches))
+    assert mismatches == 0
+
+# BATCH PARITY CHECK - one cache per burner, then one cache shared by all burners.
+def test_batch_parity():
+    random.seed(1)
+    mismatches, checks = 0, 0
+    for K in [1, 5, 50]:
+        for shared in [False, True]:
+            caches = [random_cache(size, random.randint(0, 2*size)) for size in random.choices([1, 10, 100, 1000], k = K)]
+            if shared:
+                caches = caches[0]
+            contexts = [random_context() for _ in range(K)]
+            req_outputs = [round(random.uniform(15, 250), 1) for _ in range(K)]
+
+            columns = [[context[key] for context in contexts] for key in ['gas_aperture', 'supply_pressure', 'air_aperture', 'current_output']]
+            with quiet:
+                batch_result = m_p_vector.batch_actuator_predict(columns, req_outputs, caches)
+                for k in range(K):
+                    expected = m_p_vector.actuator_predict(contexts[k], req_outputs[k], caches if shared else caches[k])
+                    checks += 1
+                    if batch_result[k] != expected:
+                        mismatches += 1
+                        print("BATCH MISMATCH: " + str(expected) + ", batch: " + str(batch_result[k]))
+
+    print("BATCH PARITY CHECKS: " + str(checks) + ", MISMATCHES: " + str(mismatches))
+    assert mismatches == 0
+
+# TIMING
+def timing():
+    for size in [1000, 10000]:
+        cache = random_cache(size, size)
+        queries = [(random_context(), round(random.uniform(15, 250), 1)) for _ in range(100)]
+
+        start_time = time.perf_counter()
+        for context, req_output in queries:
+            loop_predict(context, req_output, cache.data)
+        loop_time = (time.perf_counter() - start_time)/len(queries)
+
+        with quiet:
+            start_time = time.perf_counter()
+            for context, req_output in queries:
+                m_p_vector.actuator_predict(context, req_output, cache)
+            vector_time = (time.perf_counter() - start_time)/len(queries)
+
+            start_time = time.perf_counter()
+            for context, req_output in queries:
+                m_p_index.actuator_predict(context, req_output, cache)
+            index_time = (time.perf_counter() - start_time)/len(queries)
+
+        print("CACHE SIZE " + str(size) + " - loop: " + str(round(loop_time*1e6)) + " us, vector: " +
+              str(round(vector_time*1e6)) + " us, index: " + str(round(index_time*1e6)) + " us")
+
+if __name__ == "__main__":
+    test_parity()
+    test_batch_parity()
+    timing()
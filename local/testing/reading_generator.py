@@ -1,5 +1,7 @@
 from testing.test_environment import test_environment
 
+from itertools import islice
+
 import numpy as np
 
 # DOCUMENTATION: Based on provided values of required output value, supply pressure and air aperture size, this
@@ -7,65 +9,88 @@ import numpy as np
 # by passing these values as parameters to one of the models from the test environment and retrieving the output
 # value. In effect, this allows us to test out our predictor by creating a "mock" interactive environment.
 
-# We have two functions:
-#           - return_reading(time, gas_aperture) : reads an input file where the required output value,
-#             supply pressure and air aperture size are specified for all time instants. Assimilates this
-#             information then calls the function below to obtain the corresponding output value at the
-#             provided time. The function receives two parameters -
+# We have six functions:
+#           - return_reading(time, gas_aperture) : looks up the required output value, supply pressure and air
+#             aperture size specified for the provided time in the schedule (see load_schedule), then calls the
+#             model of the test environment to obtain the corresponding output value at the provided time.
+#
+#           - iterate_readings(period, gas_aperture, start) : generator which yields the readings for consecutive
+#             ticks (start, start + period, start + 2*period, ...) until the schedule ends.
+#
+#           - load_schedule(filename) : reads a schedule file into a schedule_index (see below), once per file.
+#
+#           - stream_readings(rows, period, gas_aperture, start) : like iterate_readings, for schedule rows provided
+#             one by one (e.g. by read_schedule_rows or testing/scenario_generator.py), without loading the schedule.
+#
+#           - read_schedule_rows(filename, chunk_rows) : generator of the rows of a schedule file, read chunk_rows at a
+#             time.
 #
 #           - retrieve_out_val(P, A, G, modelno) : passes as parameters supply pressure (P), air aperture size (A),
 #             and fuel gas aperture size (G) and the required model from the test environment. Returns the output
-#             value associated with these parameters, based on the model.
+#             value associated with these parameters, based on the model (test_environment.retrieve_out_val).
 #
 
 #---------------------------------------------------------------------------------------------------------------------------
 
 # NOTES: - The input file used in return_reading is a csv file called 'schedule.csv'. This has 4 columns -
 #          required output, supply pressure, air aperture size, and time (in seconds) for which these settings apply.
-#        - The return reading function will read the csv file into a numpy array and analyse the array to determine the parameter
-#          values for the current time instant. It then returns these parameters as a dictionary.
-#        - This is not an optimal method but will be ok for testing purposes.
+#        - The schedule is read once and kept with the cumulative time at the end of each row, so the row for a given
+#          time is found with a binary search (O(log n)) rather than by adding up the times of the rows before it.
+#          iterate_readings moves forward through the rows, so each tick costs O(1) on average.
+#        - A time after the end of the schedule gives an empty dictionary. A time <= 0 gives the readings of the
+#          last row of the schedule (this is how the original row-by-row search behaved, and is kept as is). A stream of
+#          rows has no last row until it ends, so stream_readings only accepts times > 0.
 
 #---------------------------------------------------------------------------------------------------------------------------
 
-def return_reading(time, gas_aperture):
+# configurable parameter: model number from test environment
+MODEL_NUMBER = 1
 
-    # configurable parameter: model number from test environment
-    MODEL_NUMBER = 1
+# configurable parameter: csv file from where we read testing schedule
+FILENAME = 'testing/schedule.csv'
 
-    # instantiate object of test environment
-    t_e = test_environment(MODEL_NUMBER)
+# SCHEDULE_INDEX: the rows of a schedule file, with the cumulative time at the end of each row.
+class schedule_index:
 
-    # configurable parameter: csv file from where we read testing schedule
-    FILENAME = 'testing/schedule.csv'
+    def __init__(self, filename):
+        # read csv file into numpy array (one row per line after the header, 4 columns).
+        self.rows = np.loadtxt(filename, delimiter = ',', skiprows = 1, ndmin = 2)
+        # end[i] is the time at which row i ends - the same sums the row-by-row search adds up.
+        self.end = np.cumsum(self.rows[:, 3])
+        self.total_time = self.end[-1] if len(self.end) else 0
 
-    # read csv file into numpy array
-    schedule = np.genfromtxt(FILENAME, delimiter = ',', skip_header = 1)
+    # ROW: returns the row which applies at the given time (-1, the last row, for time <= 0), None after the end.
+    def row(self, time):
+        if time <= 0:
+            return -1
+        row = int(np.searchsorted(self.end, time, side = 'left'))
+        return row if row < len(self.end) else None
 
-    # define variable to determine current time instant
-    total = 0
-    array_row = 0
 
-    while total < time:
-        # if we exhaust all rows in csv file, indicate this by returning an empty array
-        if array_row == np.shape(schedule)[0]:
-            return {}
+_schedules = {}
+_environments = {}
 
-        total += schedule[array_row, 3]
-        array_row += 1
+# LOAD_SCHEDULE: returns the schedule_index of a schedule file. Each file is only read once.
+def load_schedule(filename):
+    if filename not in _schedules:
+        _schedules[filename] = schedule_index(filename)
+    return _schedules[filename]
 
-    # when we exit the loop we have the required row of the numpy array + 1 stored in array_row.
-    # so we can therefore take the parameters from there.
-    array_row -= 1
+def _environment(model_no):
+    if model_no not in _environments:
+        _environments[model_no] = test_environment(model_no)
+    return _environments[model_no]
 
+# Returns the readings for the given row of the schedule, like the original return_reading.
+def _readings(schedule, array_row, gas_aperture, t_e):
     # first we need to determine if the controlled device is on/off, which we can tell if the
     # required output <= 20 i.e. less than or equal to room temperature.
-    required_output = schedule[array_row, 0]
+    required_output = schedule.rows[array_row, 0]
     on = required_output > 20
 
     # then other parameters.
-    P = schedule[array_row, 1]
-    A = schedule[array_row, 2]
+    P = schedule.rows[array_row, 1]
+    A = schedule.rows[array_row, 2]
     current_output = t_e.retrieve_out_val(P, A, gas_aperture)
 
     readings = {
@@ -78,4 +103,91 @@ def return_reading(time, gas_aperture):
 
     return readings
 
+#---------------------------------------------------------------------------------------------------------------------------
+
+def return_reading(time, gas_aperture):
+
+    schedule = load_schedule(FILENAME)
+
+    # if we are past the end of the schedule, indicate this by returning an empty dictionary
+    array_row = schedule.row(time)
+    if array_row is None:
+        return {}
+
+    return _readings(schedule, array_row, gas_aperture, _environment(MODEL_NUMBER))
+
+#------------------------------------------------------------------------------------------------------------------------------
+
+# ITERATE_READINGS: yields the readings at times start, start + period, start + 2*period, ... until the end of the
+# schedule. gas_aperture is a function returning the current gas aperture (e.g. lambda: c.gas_aperture), called for
+# every tick. The readings are the same as return_reading(start + k*period, gas_aperture()) for tick k.
+def iterate_readings(period, gas_aperture=lambda: 0, start=0):
+
+    schedule = load_schedule(FILENAME)
+    t_e = _environment(MODEL_NUMBER)
+    end = schedule.end
+
+    array_row = 0
+    tick = 0
+    while True:
+        time = start + tick*period
+        if time <= 0:
+            yield _readings(schedule, -1, gas_aperture(), t_e)
+        else:
+            # move forward to the row which applies at this time.
+            while array_row < len(end) and end[array_row] < time:
+                array_row += 1
+            if array_row == len(end):
+                return
+            yield _readings(schedule, array_row, gas_aperture(), t_e)
+        tick += 1
+
+#------------------------------------------------------------------------------------------------------------------------------
+
+# STREAM_READINGS: yields the readings at times start, start + period, ... (start > 0) for a schedule given as an iterable
+# of (required output, P, A, time) rows, until the rows run out. Only the current row is kept in memory.
+def stream_readings(rows, period, gas_aperture=lambda: 0, start=None, model_no=MODEL_NUMBER):
+
+    if start is None:
+        start = period
+    if start <= 0:
+        raise ValueError("stream_readings needs times > 0")
+
+    t_e = _environment(model_no)
+
+    # end is the time at which the current row ends.
+    end = 0
+    row = None
+    rows = iter(rows)
+    tick = 0
+    while True:
+        time = start + tick*period
+        while row is None or end < time:
+            row = next(rows, None)
+            if row is None:
+                return
+            end += row[3]
+
+        required_output = row[0]
+        yield {
+                    'on': required_output > 20,
+                    'supply_pressure': row[1],
+                    'air_aperture': row[2],
+                    'current_output': t_e.retrieve_out_val(row[1], row[2], gas_aperture()),
+                    'required_output': required_output
+        }
+        tick += 1
+
+# READ_SCHEDULE_ROWS: yields the rows of a schedule file (after its header) as numpy arrays, reading chunk_rows lines at
+# a time.
+def read_schedule_rows(filename, chunk_rows=100000):
+    with open(filename) as f:
+        next(f)
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                return
+            for row in np.loadtxt(lines, delimiter = ',', ndmin = 2):
+                yield row
+
 #------------------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,137 @@
+import math
+
+import numpy as np
+
+# SCENARIO_GENERATOR: This class generates long synthetic testing schedules, in the same format as schedule.csv (rows of
+# required output, supply pressure, air aperture and time in seconds), for large-scale simulations. Rather than the ten
+# hand-written rows of schedule.csv, where P and A hardly change, it simulates:
+
+#   - setpoints: the required output is held for a random time (exponential, mean_hold seconds on average), then moves
+#                to another of the setpoints (or the burner is switched off, with probability off_probability).
+#   - supply pressure: drifts around a nominal pressure (which itself moves by pressure_drift Pa a day), pulled back
+#                      towards it at rate pressure_reversion and shaken by pressure_volatility (Ornstein-Uhlenbeck).
+#   - air aperture: changes to a random value in air_range, air_changes_per_hour times an hour on average.
+#   - sensor noise: Gaussian noise (pressure_noise Pa, air_noise) on the P and A of every row.
+
+# The schedule is produced in chunks of rows, so a schedule of any length never has to fit in memory. It has 4 functions:
+
+#   - __init__(self, seed, ...): (public) Constructor. The same seed and parameters always give the same schedule.
+#   - chunks(self, duration, chunk_rows): (public) Generator of the rows covering duration seconds, as numpy arrays of
+#                                         up to chunk_rows rows (4 columns).
+#   - rows(self, duration): (public) Generator of the same rows one by one, as tuples.
+#   - write(self, filename, duration): (public) Writes the schedule to a csv file (one chunk at a time).
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# NOTES: - Every row lasts step seconds. The rows can be given to reading_generator.stream_readings (together with
+#          reading_generator.read_schedule_rows for a file), which turns them into sensor readings with the models of
+#          the test environment, or the file can be used as the schedule of reading_generator (FILENAME).
+#
+#        - A required output of 15 (below room temperature) means the burner is off, as in schedule.csv.
+
+#---------------------------------------------------------------------------------------------------------------------
+
+class scenario_generator:
+
+    HEADER = 'req output, supply pressure, air aperture, time'
+    OFF_OUTPUT = 15
+
+    def __init__(self, seed=0, step=5, setpoints=tuple(range(40, 255, 5)), mean_hold=600, off_probability=0.2,
+                 pressure=3000, pressure_drift=0, pressure_volatility=2, pressure_reversion=0.001,
+                 air_range=(60, 90), air_changes_per_hour=0.5, pressure_noise=5, air_noise=0.2):
+        self.seed = seed
+        self.step = step
+        self.setpoints = setpoints
+        self.mean_hold = mean_hold
+        self.off_probability = off_probability
+        self.pressure = pressure
+        self.pressure_drift = pressure_drift
+        self.pressure_volatility = pressure_volatility
+        self.pressure_reversion = pressure_reversion
+        self.air_range = air_range
+        self.air_changes_per_hour = air_changes_per_hour
+        self.pressure_noise = pressure_noise
+        self.air_noise = air_noise
+
+#--------------------------------------------------------------------------------------------------------------------
+
+    # CHUNKS: yields the rows covering duration seconds, in numpy arrays of up to chunk_rows rows.
+    def chunks(self, duration, chunk_rows=100000):
+        rng = np.random.default_rng(self.seed)
+        count = int(math.ceil(duration/self.step))
+
+        # state carried from one row (and chunk) to the next.
+        setpoint, hold = self.OFF_OUTPUT, 0
+        P = self.pressure
+        A = rng.uniform(*self.air_range)
+
+        # probability that the air aperture changes during a row, and pull of the nominal pressure during a row.
+        air_change = self.air_changes_per_hour*self.step/3600
+        reversion = self.pressure_reversion*self.step
+        volatility = self.pressure_volatility*math.sqrt(self.step)
+
+        for first in range(0, count, chunk_rows):
+            n = min(chunk_rows, count - first)
+            # random numbers for the whole chunk, used row by row below.
+            hold_draws = rng.exponential(self.mean_hold, n)
+            off_draws = rng.random(n)
+            setpoint_draws = rng.integers(0, len(self.setpoints), n)
+            pressure_shocks = rng.standard_normal(n)
+            air_draws = rng.random(n)
+            air_values = rng.uniform(self.air_range[0], self.air_range[1], n)
+
+            rows = np.empty((n, 4))
+            for i in range(n):
+                # new setpoint once the current one has been held long enough.
+                if hold <= 0:
+                    hold = hold_draws[i]
+                    setpoint = self.OFF_OUTPUT if off_draws[i] < self.off_probability else self.setpoints[setpoint_draws[i]]
+                hold -= self.step
+
+                nominal = self.pressure + self.pressure_drift*(first + i)*self.step/86400
+                P += reversion*(nominal - P) + volatility*pressure_shocks[i]
+
+                if air_draws[i] < air_change:
+                    A = air_values[i]
+
+                rows[i, 0], rows[i, 1], rows[i, 2] = setpoint, P, A
+
+            # sensor noise, then the same precision as a hand-written schedule.
+            if self.pressure_noise:
+                rows[:, 1] += rng.normal(0, self.pressure_noise, n)
+            if self.air_noise:
+                rows[:, 2] = np.clip(rows[:, 2] + rng.normal(0, self.air_noise, n), 0, 100)
+            rows[:, 1] = np.round(rows[:, 1], 1)
+            rows[:, 2] = np.round(rows[:, 2], 2)
+            rows[:, 3] = self.step
+            yield rows
+
+    # ROWS: yields the rows covering duration seconds one by one, as (required output, P, A, time) tuples.
+    def rows(self, duration):
+        for chunk in self.chunks(duration):
+            for row in chunk:
+                yield tuple(row)
+
+    # WRITE: writes the schedule covering duration seconds to a csv file with the same header as schedule.csv.
+    def write(self, filename, duration):
+        with open(filename, 'w') as f:
+            f.write(self.HEADER + '\n')
+            for chunk in self.chunks(duration):
+                np.savetxt(f, chunk, delimiter = ',', fmt = '%g')
+
+#--------------------------------------------------------------------------------------------------------------------
+# END OF CLASS #
+
+#---------------------------------------------------------------------------------------------------------------------
+
+# Writes a synthetic schedule, from the local directory:
+#       python testing/scenario_generator.py FILE DAYS [SEED]
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("usage: python testing/scenario_generator.py FILE DAYS [SEED]")
+        sys.exit(1)
+    generator = scenario_generator(seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    generator.write(sys.argv[1], float(sys.argv[2])*86400)
+    sys.exit(0)
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 ##### VERIFIED ######
 
 # TEST_ENVIRONMENT: This class is part of the testing system that is used to verify that the predictor works.
@@ -9,7 +11,7 @@ import math
 
 #   - __model_no (private): Used to select on instantiation of the object which model function we will use.
 
-# It has 6 member methods:
+# It has 7 member methods (and array versions of them, see below):
 
 #   - __model1(self, P, A, G): (private, line 34): Linear relationship with P*A*G of the form y = mx + c - (REALISTIC MODEL)
 #   - __model2(self, P, A, G): (private, line 41): Like 1, but coefficients of the linear relationship (m and c) vary with
@@ -19,17 +21,40 @@ import math
 #   - __model5(self, P, A, G): (private, line 206): flow rate = a*P + b*A + c*G
 #   - retrieve_out_val(self, P, A, G): (public, line 226): Function used by external programs to obtain values ot output from the
 #                                                           environment given parameters P, A and G.
+#   - retrieve_out_vals(self, P, A, G): (public): Same as retrieve_out_val for arrays of P, A and G (array in, array out),
+#                                                using the array versions of the models (__batch_model1 ... __batch_model5).
 
 # --------------------------------------------------------------------------------------------------------------
 
 # NOTES: - Each function will recieve the parameters P, A, G and return the flow rate based on the model.
 #        - Pressure in Pa, Aperture area (both) in value between 0 and 100 representing percentage of
 #          area available.
+#        - The array versions give exactly the same values as the scalar ones: the same arithmetic is done in the same
+#          order on float64 arrays, the ranges of P and A in models 2 and 4 are looked up in tables (MODEL2_TABLE,
+#          MODEL4_TABLE) rather than if-chains, and values which numpy could round differently from Python's round()
+#          (those very close to half a hundredth) are rounded with round().
 
 #--------------------------------------------------------------------------------------------------------------
 
 class test_environment:
 
+    # Lookup tables for the piecewise models 2 and 4: limits of the ranges of P, limits of the ranges of A for each range
+    # of P, and (m, c) for each range of P (rows) and A (columns). Same values as in the if-chains of __model2/__model4.
+    MODEL2_TABLE = {
+        'P_limits': [5000, 15000, 35000],
+        'A_limits': [[30, 75], [35, 77], [40, 80], [42, 85]],
+        'm': [[0.000005, 0.0000059, 0.0000073], [0.000004, 0.0000045, 0.0000055],
+              [0.0000035, 0.0000039, 0.0000044], [0.000003, 0.0000033, 0.0000037]],
+        'c': [[4.3, 3.1, 0], [3.9, 3.2, 0], [3.5, 3, 0], [3, 2.8, 0]]
+    }
+    MODEL4_TABLE = {
+        'P_limits': [5000, 15000, 35000],
+        'A_limits': [[30, 75], [35, 77], [40, 80], [50, 90]],
+        'm': [[0.0015, 0.00179, 0.0037], [0.0024, 0.0030, 0.00424],
+              [0.0035, 0.0039, 0.0048], [0.00401, 0.0046, 0.00498]],
+        'c': [[0.4, 0.31, 0], [0.39, 0.32, 0], [0.35, 0.3, 0], [0.3, 0.28, 0]]
+    }
+
 #--------------------------------------------------------------------------------------------------------------
     # CONSTRUCTOR: Class has one private member variable - model_no. This is an integer which is
     # used to determine which of the below model functions we will be using.
@@ -241,5 +266,53 @@ class test_environment:
 
         return self.__model1(P, A, G)
 
+#--------------------------------------------------------------------------------------------------------------
+
+    # RETRIEVE_OUT_VALS (public): Same as retrieve_out_val for arrays of P, A and G (or a mix of arrays and numbers,
+    # broadcast together). Returns a float64 array of outputs.
+    def retrieve_out_vals(self, P, A, G):
+        P, A, G = np.broadcast_arrays(np.asarray(P, dtype = float), np.asarray(A, dtype = float),
+                                      np.asarray(G, dtype = float))
+        if self.__model_no == 2:
+            output = self.__batch_piecewise(self.MODEL2_TABLE, P, A, G, False)
+        elif self.__model_no == 3:
+            output = 0.0037*(np.sqrt(P*G))*A + 2.3
+        elif self.__model_no == 4:
+            output = self.__batch_piecewise(self.MODEL4_TABLE, P, A, G, True)
+        elif self.__model_no == 5:
+            output = 0.005*P + 0.53*A + 0.47*G
+        else:
+            output = 0.000013*P*A*G + 0.232
+
+        # output temperature cannot be below room temperature
+        output = np.where(output < 20, 20.0, output)
+        return self.__batch_round(output)
+
+    # Array version of models 2 (output = m*P*A*G + c) and 4 (sqrt_model, output = m*sqrt(P*G)*A + c), with m and c
+    # looked up in the table for the ranges of P and A. The operations are done in the same order as in the scalar models.
+    @staticmethod
+    def __batch_piecewise(table, P, A, G, sqrt_model):
+        # range of P: 0 for P < limit 0, 1 for limit 0 <= P < limit 1 ...
+        P_range = np.searchsorted(table['P_limits'], P, side = 'right')
+        A_limits = np.asarray(table['A_limits'], dtype = float)[P_range]
+        A_range = (A >= A_limits[..., 0]).astype(int) + (A >= A_limits[..., 1])
+
+        m = np.asarray(table['m'])[P_range, A_range]
+        c = np.asarray(table['c'], dtype = float)[P_range, A_range]
+        if sqrt_model:
+            return m*(np.sqrt(P*G))*A + c
+        return m*P*A*G + c
+
+    # Rounds to 2 decimal places exactly like round(). numpy rounds x*100 to the nearest integer, which can differ from
+    # round() when x*100 is very close to a half integer, so those values are rounded one by one.
+    @staticmethod
+    def __batch_round(output):
+        rounded = np.round(output, 2)
+        scaled = output*100
+        ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-9*np.maximum(1, np.abs(scaled))
+        for i in zip(*np.nonzero(ambiguous)):
+            rounded[i] = round(float(output[i]), 2)
+        return rounded
+
 #--------------------------------------------------------------------------------------------------------------
 # END OF CLASS #